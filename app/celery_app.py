@@ -3,6 +3,7 @@ import os
 from celery import Celery
 from celery.schedules import crontab
 from django.conf import settings
+from kombu import Queue
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
@@ -10,28 +11,76 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 app = Celery("core")
 app.config_from_object("django.conf:settings")
 app.conf.broker_url = settings.CELERY_BROKER_URL
+app.conf.result_backend = settings.CELERY_RESULT_BACKEND
 app.conf.broker_connection_retry_on_startup = os.environ.get(
     "CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP", "True"
 ).lower() in ("true", "1", "yes")
 
-# Configure Celery Beat
-app.conf.beat_schedule = {
-    "delete_expired_subscriptions": {
-        "task": "subscription_service.tasks.delete_expired_subscriptions",
-        "schedule": crontab(minute=0, hour=0),
-    },
-    "notify_about_expiring_subscriptions_1_day": {
-        "task": "subscription_service.tasks.notify_about_expiring_subscriptions_1_day",
-        "schedule": crontab(minute=0, hour=0),
-    },
-    "notify_about_expiring_subscriptions_3_days": {
-        "task": "subscription_service.tasks.notify_about_expiring_subscriptions_3_days",
-        "schedule": crontab(minute=0, hour=0),
-    },
-    "notify_about_expiring_subscriptions_7_days": {
-        "task": "subscription_service.tasks.notify_about_expiring_subscriptions_7_days",
-        "schedule": crontab(minute=0, hour=0),
-    },
+# Queues: "realtime" for work a user is waiting on (payment links, access
+# after payment), "bulk" for scheduled runs and broadcasts. Each has its own
+# workers (see the compose files), so a reminder burst never delays a payment.
+REALTIME_QUEUE = "realtime"
+BULK_QUEUE = "bulk"
+
+app.conf.task_queues = (Queue(REALTIME_QUEUE), Queue(BULK_QUEUE))
+app.conf.task_default_queue = BULK_QUEUE
+app.conf.task_routes = {
+    "subscription_service.tasks.create_checkout_link": {"queue": REALTIME_QUEUE},
+    "subscription_service.tasks.fulfill_stripe_event": {"queue": REALTIME_QUEUE},
+}
+
+# Acknowledged only once done, and run again if their worker dies. Realtime
+# tasks are idempotent. The chunks of the nightly fan-out runs must finish
+# for their chord to notify the admins: an expiry chunk re-checks every row,
+# a reminder chunk redelivered after a lost worker may send its reminders
+# again, which beats a run that silently never reports.
+app.conf.task_annotations = {
+    "subscription_service.tasks.create_checkout_link": {"acks_late": True},
+    "subscription_service.tasks.fulfill_stripe_event": {"acks_late": True},
+    "subscription_service.tasks.expire_subscription_chunk": {"acks_late": True},
+    "subscription_service.tasks.send_reminder_chunk": {"acks_late": True},
+}
+app.conf.task_reject_on_worker_lost = True
+
+# Workers reserve one task at a time by default; long chunks would otherwise
+# sit in one worker's buffer while others are idle. Realtime workers raise
+# this on the command line.
+app.conf.worker_prefetch_multiplier = 1
+
+# Configure Celery Beat. Production runs the Redis scheduler (the default):
+# one tick a minute handles the few events that are due. The nightly runs
+# below scan the table and fan out into chunks; they are only scheduled with
+# SUBSCRIPTION_EVENT_SCHEDULER=False.
+if settings.SUBSCRIPTION_EVENT_SCHEDULER:
+    # Expiries and reminders are popped from the Redis schedule as they fall
+    # due. Redis does not persist the schedule, so it is rebuilt every hour
+    # (and by the tick as soon as it finds it empty).
+    app.conf.beat_schedule = {
+        "process_due_subscription_events": {
+            "task": "subscription_service.tasks.process_due_subscription_events",
+            "schedule": crontab(minute="*"),
+        },
+        "rebuild_subscription_schedule": {
+            "task": "subscription_service.tasks.rebuild_subscription_schedule",
+            "schedule": crontab(minute=30),
+        },
+    }
+else:
+    app.conf.beat_schedule = {
+        "delete_expired_subscriptions": {
+            "task": "subscription_service.tasks.delete_expired_subscriptions",
+            "schedule": crontab(minute=0, hour=0),
+        },
+        "notify_about_expiring_subscriptions": {
+            "task": "subscription_service.tasks.notify_about_expiring_subscriptions",
+            "schedule": crontab(minute=0, hour=0),
+        },
+    }
+
+# Stored Stripe events whose fulfillment never completed are queued again
+app.conf.beat_schedule["requeue_unprocessed_stripe_events"] = {
+    "task": "subscription_service.tasks.requeue_unprocessed_stripe_events",
+    "schedule": crontab(minute="*/10"),
 }
 
 app.autodiscover_tasks()
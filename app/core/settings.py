@@ -1,6 +1,9 @@
+import json
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -105,6 +108,8 @@ DATABASES = {
 }"""
 
 CELERY_BROKER_URL = "redis://redis:6379/0"
+# Chunked task runs (chords) collect the results of their chunks here
+CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://redis:6379/2")
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = os.environ.get(
     "CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP"
 )
@@ -177,4 +182,58 @@ STRIPE_PUBLISHABLE_KEY = os.environ.get("STRIPE_PUBLISHABLE_KEY")
 STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
 STRIPE_SUCCESS_URL = os.environ.get("STRIPE_SUCCESS_URL")
 STRIPE_CANCEL_URL = os.environ.get("STRIPE_CANCEL_URL")
+# Optional Payment Links by plan period, e.g. {"1 month": "https://buy.stripe.com/..."}.
+# Plans listed here are paid through the link instead of a new checkout session.
+STRIPE_PAYMENT_LINKS = json.loads(os.environ.get("STRIPE_PAYMENT_LINKS", "{}"))
+# The plan period of each Payment Link id, e.g. {"plink_1Abc...": "1 month"}.
+# Sessions paid through a link carry no plan metadata, only the link id.
+STRIPE_PAYMENT_LINK_PLANS = json.loads(os.environ.get("STRIPE_PAYMENT_LINK_PLANS", "{}"))
+
+TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_BASE_URL = os.environ.get("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+TELEGRAM_HTTP_POOL_SIZE = int(os.environ.get("TELEGRAM_HTTP_POOL_SIZE", 32))
+TELEGRAM_CONNECT_TIMEOUT = float(os.environ.get("TELEGRAM_CONNECT_TIMEOUT", 5))
+TELEGRAM_READ_TIMEOUT = float(os.environ.get("TELEGRAM_READ_TIMEOUT", 30))
+# Chats sent to in parallel by the bulk delivery tasks
+TELEGRAM_DELIVERY_CONCURRENCY = int(os.environ.get("TELEGRAM_DELIVERY_CONCURRENCY", 16))
+# Sent back by Telegram in X-Telegram-Bot-Api-Secret-Token on every webhook call
+TELEGRAM_WEBHOOK_SECRET = os.environ.get("TELEGRAM_WEBHOOK_SECRET")
+TELEGRAM_HTTP2 = os.environ.get("TELEGRAM_HTTP2", "False").lower() in ("true", "1", "yes")
+
+# Worker threads and queue limit of the poller's update dispatcher
+TELEGRAM_DISPATCH_WORKERS = int(os.environ.get("TELEGRAM_DISPATCH_WORKERS", 8))
+TELEGRAM_DISPATCH_MAX_PENDING = int(os.environ.get("TELEGRAM_DISPATCH_MAX_PENDING", 200))
+
+# Telegram allows about 30 messages/sec per bot and about 1 message/sec per chat
+TELEGRAM_RATE_LIMIT_ENABLED = os.environ.get(
+    "TELEGRAM_RATE_LIMIT_ENABLED", "True"
+).lower() in ("true", "1", "yes")
+TELEGRAM_GLOBAL_RATE_LIMIT = int(os.environ.get("TELEGRAM_GLOBAL_RATE_LIMIT", 30))
+TELEGRAM_PER_CHAT_RATE_LIMIT = int(os.environ.get("TELEGRAM_PER_CHAT_RATE_LIMIT", 1))
+TELEGRAM_MAX_RETRIES = int(os.environ.get("TELEGRAM_MAX_RETRIES", 3))
+
+# "digest" sends each admin a few summary messages per task run,
+# "per_event" sends one message per subscription event to every admin
+ADMIN_NOTIFICATION_MODE = os.environ.get("ADMIN_NOTIFICATION_MODE", "digest")
+if ADMIN_NOTIFICATION_MODE not in ("digest", "per_event"):
+    raise ImproperlyConfigured(
+        f'ADMIN_NOTIFICATION_MODE must be "digest" or "per_event", not {ADMIN_NOTIFICATION_MODE!r}'
+    )
+
+# Reminders sent before a subscription ends: days left, the word for "days"
+# that matches the number, and the image from MEDIA_ROOT sent with it
+SUBSCRIPTION_REMINDERS = [
+    {"days": 7, "syntax_word": "дней", "image": "7-days.jpg"},
+    {"days": 3, "syntax_word": "дня", "image": "3-days.jpg"},
+    {"days": 1, "syntax_word": "день", "image": "1-day.jpg"},
+]
+
+# Rows fetched per page when background tasks scan the subscriptions table
+SUBSCRIPTION_SCAN_CHUNK_SIZE = int(os.environ.get("SUBSCRIPTION_SCAN_CHUNK_SIZE", 1000))
+
+# Run expiries and reminders from the minute-precision Redis schedule instead
+# of the nightly table scans
+SUBSCRIPTION_EVENT_SCHEDULER = os.environ.get(
+    "SUBSCRIPTION_EVENT_SCHEDULER", "True"
+).lower() in ("true", "1", "yes")
 
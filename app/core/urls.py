@@ -8,6 +8,7 @@ urlpatterns = [
 
     # API routes
     path("api/", include("subscription_service.urls")),
+    path("api/telegram/", include("telegram_bot.urls")),
 
 ]
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TelegramUser, Plan, Subscription
+from .models import TelegramUser, Plan, StripeEvent, Subscription
 
 
 @admin.register(TelegramUser)
@@ -21,3 +21,9 @@ class SubscriptionAdmin(admin.ModelAdmin):
         "start_date",
         "end_date",
     )
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "type", "received_at", "processed_at")
+    search_fields = ("event_id",)
@@ -0,0 +1,138 @@
+"""
+Benchmark of the nightly expiry and reminder runs.
+
+Seeds a synthetic subscriber set, then runs each task eagerly against the
+fake Bot API (telegram_bot.fake_server) and records wall time, query count,
+messages/sec and peak RSS. Run it through `manage.py benchmark_pipeline`.
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+
+from celery_app import app
+from subscription_service.tasks import (
+    delete_expired_subscriptions,
+    notify_about_expiring_subscriptions,
+)
+from subscription_service.transport import reset_transport
+from telegram_bot.fake_server import FakeBotConfig, FakeBotServer
+from .dataset import generate_dataset
+
+BENCHMARK_TASKS = {
+    "delete_expired_subscriptions": delete_expired_subscriptions,
+    "notify_about_expiring_subscriptions": notify_about_expiring_subscriptions,
+}
+
+
+@dataclass
+class BenchmarkResult:
+    size: int
+    task: str
+    wall_time_s: float
+    queries: int
+    messages: int
+    messages_per_sec: float
+    telegram_calls: Dict[str, int]
+    # Peak of the whole process so far, not of this task alone
+    peak_rss_mb: float
+
+
+class QueryCounter:
+    """
+    Counts queries through connection.execute_wrapper, without keeping them
+    around like CaptureQueriesContext does.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+@contextmanager
+def fake_telegram(config: Optional[FakeBotConfig] = None, rate_limit: bool = False):
+    """
+    Runs the fake Bot API and points the sender at it, with placeholder
+    reminder images and Celery in eager mode.
+    """
+    eager = app.conf.task_always_eager
+
+    with tempfile.TemporaryDirectory() as media_root, FakeBotServer(config) as server:
+        for reminder in settings.SUBSCRIPTION_REMINDERS:
+            with open(os.path.join(media_root, reminder["image"]), "wb") as image:
+                image.write(b"\xff\xd8benchmark\xff\xd9")
+
+        with override_settings(
+            TELEGRAM_API_BASE_URL=server.base_url,
+            TELEGRAM_BOT_TOKEN="benchmark",
+            TELEGRAM_RATE_LIMIT_ENABLED=rate_limit,
+            MEDIA_ROOT=media_root,
+        ):
+            reset_transport()
+            app.conf.task_always_eager = True
+            try:
+                yield server
+            finally:
+                app.conf.task_always_eager = eager
+                reset_transport()
+
+
+def measure(size: int, name: str, task: Callable, server: FakeBotServer) -> BenchmarkResult:
+    queries = QueryCounter()
+    messages_before = len(server.api.messages)
+    calls_before = Counter(server.api.calls)
+
+    started = time.perf_counter()
+    with connection.execute_wrapper(queries):
+        task()
+    wall_time = time.perf_counter() - started
+
+    messages = len(server.api.messages) - messages_before
+    calls = Counter(server.api.calls) - calls_before
+
+    return BenchmarkResult(
+        size=size,
+        task=name,
+        wall_time_s=round(wall_time, 3),
+        queries=queries.count,
+        messages=messages,
+        messages_per_sec=round(messages / wall_time, 1) if wall_time else 0.0,
+        telegram_calls={f"{method} {status}": count for (method, status), count in sorted(calls.items())},
+        peak_rss_mb=peak_rss_mb(),
+    )
+
+
+def run_benchmark(
+    size: int,
+    config: Optional[FakeBotConfig] = None,
+    rate_limit: bool = False,
+) -> List[dict]:
+    """
+    Seeds `size` subscribers into the current database and runs the expiry
+    run, then the reminder run, against the fake Bot API.
+    """
+    generate_dataset(size, distribution="mixed", staff=1)
+
+    with fake_telegram(config, rate_limit=rate_limit) as server:
+        return [
+            asdict(measure(size, name, task, server))
+            for name, task in BENCHMARK_TASKS.items()
+        ]
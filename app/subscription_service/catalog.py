@@ -0,0 +1,136 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from django_redis import get_redis_connection
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from .models import Plan
+
+CATALOG_CHANNEL = "plan_catalog:invalidate"
+
+# Upper bound on how stale the catalog can get if an invalidation message
+# is lost, e.g. while the listener reconnects.
+CATALOG_TTL = 300
+
+
+@dataclass
+class CatalogEntry:
+    plans: List[dict]
+    keyboard: Optional[dict]
+    loaded_at: float
+
+
+class PlanCatalog:
+    """
+    Process-local cache of the plans and of the serialized inline keyboard
+    shown on /start.
+
+    Plan signals call invalidate(), which drops the local copy and publishes
+    on CATALOG_CHANNEL; every process listening on the channel drops its
+    copy too, and the next get() reloads it with a single query.
+    """
+
+    def __init__(self, redis=None, ttl: int = CATALOG_TTL):
+        self.redis = redis
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entry: Optional[CatalogEntry] = None
+        self._generation = 0
+        self._listener = None
+
+    def _get_redis(self):
+        if self.redis is None:
+            self.redis = get_redis_connection("default")
+        return self.redis
+
+    def get(self) -> CatalogEntry:
+        self.listen()
+
+        entry = self._entry
+        if entry is not None and time.monotonic() - entry.loaded_at < self.ttl:
+            return entry
+
+        generation = self._generation
+        entry = self._load()
+
+        with self._lock:
+            # Don't store a copy that was invalidated while it was loading.
+            if generation == self._generation:
+                self._entry = entry
+
+        return entry
+
+    def invalidate(self) -> None:
+        self._drop()
+        try:
+            self._get_redis().publish(CATALOG_CHANNEL, "1")
+        except Exception as e:
+            print(f"[CATALOG ERROR] {str(e)}")
+
+    def listen(self) -> None:
+        """
+        Starts the thread that applies invalidations from other processes.
+        """
+        if self._listener is not None:
+            return
+
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name="plan-catalog-listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self) -> None:
+        reconnecting = False
+
+        while True:
+            try:
+                pubsub = self._get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CATALOG_CHANNEL)
+                # Messages sent while we were disconnected are lost.
+                if reconnecting:
+                    self._drop()
+                reconnecting = True
+
+                for _ in pubsub.listen():
+                    self._drop()
+            except Exception as e:
+                print(f"[CATALOG ERROR] {str(e)}")
+                time.sleep(5)
+
+    def _drop(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entry = None
+
+    def _load(self) -> CatalogEntry:
+        plans = list(Plan.objects.order_by("id").values("id", "period", "price"))
+
+        keyboard = None
+        if plans:
+            keyboard = InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton(
+                        text=f"{plan['period']} — ${plan['price']}",
+                        callback_data=f"PLAN_{plan['id']}",
+                    )
+                ]
+                for plan in plans
+            ]).to_dict()
+
+        return CatalogEntry(plans=plans, keyboard=keyboard, loaded_at=time.monotonic())
+
+
+_catalog = None
+
+
+def get_plan_catalog() -> PlanCatalog:
+    global _catalog
+
+    if _catalog is None:
+        _catalog = PlanCatalog()
+
+    return _catalog
@@ -0,0 +1,231 @@
+"""
+Synthetic users, plans and subscriptions for profiling and benchmarks.
+
+Rows are built as plain values in batches, with duration and end_date
+computed up front instead of in Subscription.save(), and written with
+COPY on Postgres or an executemany INSERT elsewhere. Run it through
+`manage.py generate_dataset`.
+"""
+import csv
+import io
+import random
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from cachalot.api import invalidate
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils import timezone
+
+from .models import PERIOD_DURATIONS, Plan, Subscription, TelegramUser
+
+# Synthetic chats start here, well clear of real Telegram chat ids
+DATASET_CHAT_ID_BASE = 10 ** 12
+
+DATASET_PLAN_PRICES = {"1 month": 10, "3 months": 25, "6 months": 45, "1 year": 80}
+
+
+# -----------------------
+# END DATE DISTRIBUTIONS
+# -----------------------
+# Each returns the days from now until the i-th subscription ends.
+
+def _uniform(i: int, rng: random.Random, reminder_days: List[int]) -> float:
+    return rng.uniform(-30, 365)
+
+
+def _expired(i: int, rng: random.Random, reminder_days: List[int]) -> float:
+    return rng.uniform(-30, 0)
+
+
+def _expiring(i: int, rng: random.Random, reminder_days: List[int]) -> float:
+    return rng.uniform(0, 7)
+
+
+def _reminders(i: int, rng: random.Random, reminder_days: List[int]) -> float:
+    # Mid-window, so the reminder task sees exactly `days` days left
+    return rng.choice(reminder_days) + 0.5
+
+
+def _mixed(i: int, rng: random.Random, reminder_days: List[int]) -> float:
+    # Exact shares: 20% expired, 30% over the reminder windows, 50% active
+    bucket = i % 10
+
+    if bucket < 2:
+        return -(1 + i % 30)
+
+    if bucket < 5:
+        return reminder_days[i % len(reminder_days)] + 0.5
+
+    return 30 + i % 300
+
+
+END_DATE_DISTRIBUTIONS: Dict[str, Callable[[int, random.Random, List[int]], float]] = {
+    "uniform": _uniform,
+    "expired": _expired,
+    "expiring": _expiring,
+    "reminders": _reminders,
+    "mixed": _mixed,
+}
+
+
+def get_plans() -> List[Plan]:
+    return [
+        Plan.objects.get_or_create(period=period, defaults={"price": price})[0]
+        for period, price in DATASET_PLAN_PRICES.items()
+    ]
+
+
+def generate_dataset(
+    count: int,
+    distribution: str = "mixed",
+    staff: int = 0,
+    start_chat_id: int = DATASET_CHAT_ID_BASE,
+    batch_size: int = 10000,
+    seed: Optional[int] = None,
+    now: Optional[datetime] = None,
+    use_copy: Optional[bool] = None,
+) -> int:
+    """
+    Creates `count` users with one subscription each, plus `staff` admins
+    without one, in a single transaction. Chat ids count up from
+    start_chat_id; admins take the ids just below it.
+
+    Signals are not sent: nothing is scheduled and no status is cached
+    (run the rebuild_subscription_schedule task afterwards if that matters).
+    """
+    end_in_days = END_DATE_DISTRIBUTIONS[distribution]
+    rng = random.Random(seed)
+    now = now or timezone.now()
+    reminder_days = [reminder["days"] for reminder in settings.SUBSCRIPTION_REMINDERS] or [1]
+
+    if use_copy is None:
+        use_copy = connection.vendor == "postgresql"
+    write = _copy if use_copy else _insert
+
+    with transaction.atomic():
+        plans = [(plan.pk, PERIOD_DURATIONS[plan.period]) for plan in get_plans()]
+
+        TelegramUser.objects.bulk_create(
+            [
+                TelegramUser(
+                    chat_id=start_chat_id - n,
+                    telegram_username=f"admin_{start_chat_id - n}",
+                    is_staff=True,
+                    date_joined=now,
+                )
+                for n in range(1, staff + 1)
+            ]
+        )
+
+        for start in range(0, count, batch_size):
+            users = []
+            subscriptions = []
+
+            for i in range(start, min(start + batch_size, count)):
+                chat_id = start_chat_id + i
+                plan_id, duration = plans[i % len(plans)]
+                end_date = now + timedelta(days=end_in_days(i, rng, reminder_days))
+
+                users.append((chat_id, f"user_{chat_id}", now))
+                subscriptions.append(
+                    (chat_id, plan_id, f"synthetic_{chat_id}", end_date - duration, end_date, duration)
+                )
+
+            write(users, subscriptions)
+
+    if use_copy:
+        # cachalot only sees execute/executemany, so cached reads of these
+        # tables would survive a COPY.
+        invalidate(TelegramUser, Subscription)
+
+    return count
+
+
+def _insert(users: list, subscriptions: list) -> None:
+    # executemany with values adapted by the backend directly; bulk_create
+    # spends most of its time compiling every single value.
+    adapt_datetime = connections[DEFAULT_DB_ALIAS].ops.adapt_datetimefield_value
+    duration = Subscription._meta.get_field("duration")
+    durations = {value: duration.get_db_prep_save(value, connection) for value in PERIOD_DURATIONS.values()}
+
+    _insert_rows(
+        TelegramUser,
+        ["chat_id", "telegram_username", "date_joined", "password", "is_superuser", "is_staff", "at_private_group"],
+        [
+            (chat_id, username, adapt_datetime(date_joined), "", False, False, False)
+            for chat_id, username, date_joined in users
+        ],
+    )
+    _insert_rows(
+        Subscription,
+        ["customer", "plan", "payment_id", "start_date", "end_date", "duration"],
+        [
+            (
+                customer_id,
+                plan_id,
+                payment_id,
+                adapt_datetime(start_date),
+                adapt_datetime(end_date),
+                durations[length],
+            )
+            for customer_id, plan_id, payment_id, start_date, end_date, length in subscriptions
+        ],
+    )
+
+
+def _insert_rows(model, fields: List[str], rows: list) -> None:
+    placeholders = ", ".join(["%s"] * len(fields))
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {_table(model)} ({_columns(model, fields)}) VALUES ({placeholders})",
+            rows,
+        )
+
+
+def _copy(users: list, subscriptions: list) -> None:
+    # Columns without a database default must all be listed
+    _copy_rows(
+        TelegramUser,
+        ["chat_id", "telegram_username", "date_joined", "password", "is_superuser", "is_staff", "at_private_group"],
+        (
+            (chat_id, username, date_joined.isoformat(), "", "f", "f", "f")
+            for chat_id, username, date_joined in users
+        ),
+    )
+    _copy_rows(
+        Subscription,
+        ["customer", "plan", "payment_id", "start_date", "end_date", "duration"],
+        (
+            (
+                customer_id,
+                plan_id,
+                payment_id,
+                start_date.isoformat(),
+                end_date.isoformat(),
+                f"{int(duration.total_seconds())} seconds",
+            )
+            for customer_id, plan_id, payment_id, start_date, end_date, duration in subscriptions
+        ),
+    )
+
+
+def _copy_rows(model, fields: List[str], rows) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {_table(model)} ({_columns(model, fields)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+
+def _table(model) -> str:
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _columns(model, fields: List[str]) -> str:
+    return ", ".join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
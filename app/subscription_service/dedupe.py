@@ -0,0 +1,93 @@
+from django_redis import get_redis_connection
+
+# Stripe keeps retrying an event for up to three days
+EVENT_TTL = 60 * 60 * 24 * 3
+
+# How long a claim lasts until its event is stored and queued, so a process
+# that dies in between does not turn Stripe's retries away for days.
+CLAIM_TTL = 60
+
+
+class EventDeduplicator:
+    """
+    Claims webhook event ids in Redis (SET NX), so a redelivered event, or
+    one delivered twice at the same time, is turned away before any work is
+    done for it.
+
+    A claim is short-lived until its event is stored and queued, then kept
+    for the retry window; it is released if storing or queueing fails. This
+    is only a shortcut: the unique StripeEvent.event_id is what guarantees
+    an event is stored once. When Redis is down every event is let through.
+    """
+
+    def __init__(self, prefix: str, redis=None, ttl: int = EVENT_TTL, claim_ttl: int = CLAIM_TTL):
+        self.prefix = prefix
+        self.redis = redis
+        self.ttl = ttl
+        self.claim_ttl = claim_ttl
+
+    def _get_redis(self):
+        if self.redis is None:
+            self.redis = get_redis_connection("default")
+        return self.redis
+
+    def claim(self, event_id: str) -> bool:
+        """
+        Returns True if event_id was not claimed yet, and claims it.
+        """
+        try:
+            claimed = bool(self._get_redis().set(f"{self.prefix}:{event_id}", 1, nx=True, ex=self.claim_ttl))
+        except Exception as e:
+            print(f"[DEDUPE ERROR] {str(e)}")
+            return True
+
+        self.count(hit=not claimed)
+        return claimed
+
+    def remember(self, event_id: str) -> None:
+        """
+        Keeps the claim for the retry window, once the event is handled.
+        """
+        try:
+            self._get_redis().set(f"{self.prefix}:{event_id}", 1, ex=self.ttl)
+        except Exception as e:
+            print(f"[DEDUPE ERROR] {str(e)}")
+
+    def release(self, event_id: str) -> None:
+        try:
+            self._get_redis().delete(f"{self.prefix}:{event_id}")
+        except Exception as e:
+            print(f"[DEDUPE ERROR] {str(e)}")
+
+    def count(self, hit: bool) -> None:
+        try:
+            self._get_redis().incr(f"{self.prefix}:stats:{'hits' if hit else 'misses'}")
+        except Exception as e:
+            print(f"[DEDUPE ERROR] {str(e)}")
+
+    def stats(self) -> dict:
+        """
+        Deliveries turned away (hits) and let through to the database
+        (misses) since the counters were created.
+        """
+        try:
+            hits, misses = self._get_redis().mget(
+                f"{self.prefix}:stats:hits", f"{self.prefix}:stats:misses"
+            )
+        except Exception as e:
+            print(f"[DEDUPE ERROR] {str(e)}")
+            return {}
+
+        return {"hits": int(hits or 0), "misses": int(misses or 0)}
+
+
+_stripe_events = None
+
+
+def get_stripe_event_deduplicator() -> EventDeduplicator:
+    global _stripe_events
+
+    if _stripe_events is None:
+        _stripe_events = EventDeduplicator(prefix="stripe:event")
+
+    return _stripe_events
@@ -0,0 +1,134 @@
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Union
+
+import requests
+from django.conf import settings
+
+
+@dataclass
+class OutgoingMessage:
+    """
+    A single Telegram message: a text message, or a photo when photo_path is set.
+    """
+
+    chat_id: Union[int, str]
+    text: str
+    photo_path: Optional[str] = None
+    reply_markup: Optional[object] = None
+
+    def to_dict(self) -> dict:
+        reply_markup = self.reply_markup
+        if reply_markup is not None and not isinstance(reply_markup, dict):
+            reply_markup = reply_markup.to_dict()
+
+        return {
+            "chat_id": self.chat_id,
+            "text": self.text,
+            "photo_path": self.photo_path,
+            "reply_markup": reply_markup,
+        }
+
+
+@dataclass
+class DeliveryJob:
+    """
+    Messages for one recipient, sent in order. The job stops at the first failure.
+    """
+
+    key: Hashable
+    chat_id: Union[int, str]
+    messages: List[OutgoingMessage]
+
+
+@dataclass
+class DeliveryResult:
+    key: Hashable
+    chat_id: Union[int, str]
+    ok: bool = False
+    responses: List[requests.Response] = field(default_factory=list)
+    error: Optional[str] = None
+    rescheduled: bool = False
+
+
+class DeliveryEngine:
+    """
+    Sends batches of jobs concurrently on top of a blocking send function.
+
+    Jobs for the same chat share a lane and are sent one after another, so the
+    order of messages within a chat is preserved. At most `concurrency` lanes
+    are in flight at any time.
+
+    When a message is still rate limited (HTTP 429) after the sender's own
+    retries, it and the rest of its job are passed to `reschedule` instead
+    of being dropped.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[OutgoingMessage], requests.Response],
+        concurrency: Optional[int] = None,
+        reschedule: Optional[Callable[[List[OutgoingMessage], requests.Response], None]] = None,
+    ):
+        self.send = send
+        self.concurrency = max(1, concurrency or settings.TELEGRAM_DELIVERY_CONCURRENCY)
+        self.reschedule = reschedule
+
+    def deliver(self, jobs: Iterable[DeliveryJob]) -> Dict[Hashable, DeliveryResult]:
+        jobs = list(jobs)
+        if not jobs:
+            return {}
+        return asyncio.run(self._deliver(jobs))
+
+    async def _deliver(self, jobs: List[DeliveryJob]) -> Dict[Hashable, DeliveryResult]:
+        lanes = defaultdict(list)
+        for job in jobs:
+            lanes[job.chat_id].append(job)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            lane_results = await asyncio.gather(
+                *(self._run_lane(lane, semaphore, executor) for lane in lanes.values())
+            )
+
+        return {result.key: result for results in lane_results for result in results}
+
+    async def _run_lane(
+        self,
+        jobs: List[DeliveryJob],
+        semaphore: asyncio.Semaphore,
+        executor: ThreadPoolExecutor,
+    ) -> List[DeliveryResult]:
+        async with semaphore:
+            return [await self._run_job(job, executor) for job in jobs]
+
+    async def _run_job(self, job: DeliveryJob, executor: ThreadPoolExecutor) -> DeliveryResult:
+        loop = asyncio.get_running_loop()
+        result = DeliveryResult(key=job.key, chat_id=job.chat_id)
+
+        for index, message in enumerate(job.messages):
+            try:
+                response = await loop.run_in_executor(executor, self.send, message)
+            except Exception as e:
+                result.error = str(e)
+                return result
+
+            result.responses.append(response)
+
+            if response.status_code == 429 and self.reschedule:
+                try:
+                    self.reschedule(job.messages[index:], response)
+                    result.rescheduled = True
+                except Exception as e:
+                    result.error = f"HTTP 429, reschedule failed: {str(e)}"
+                    return result
+
+            if response.status_code != 200:
+                result.error = f"HTTP {response.status_code}"
+                return result
+
+        result.ok = True
+        return result
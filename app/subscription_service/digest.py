@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+from typing import Callable, Hashable, Iterable, List, Optional
+
+from django.conf import settings
+
+from .delivery import DeliveryJob, OutgoingMessage
+from .models import TelegramUser
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Room kept in every chunk for the "(part i/n)" suffix of the header
+PART_SUFFIX_RESERVE = 24
+
+PER_EVENT = "per_event"
+DIGEST = "digest"
+NOTIFICATION_MODES = (DIGEST, PER_EVENT)
+
+
+def chunk_lines(lines: Iterable[str], header: str = "", limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """
+    Packs lines into as few messages as possible, each starting with header
+    and no longer than limit. Lines that do not fit on their own are split.
+    """
+    budget = limit - len(header) - PART_SUFFIX_RESERVE
+    if budget <= 0:
+        raise ValueError("header does not fit into a single message")
+
+    chunks = []
+    current = []
+    current_size = 0
+
+    for line in lines:
+        pieces = [line[i:i + budget] for i in range(0, len(line), budget)] or [""]
+
+        for piece in pieces:
+            size = len(piece) + 1
+            if current and current_size + size > budget:
+                chunks.append("\n".join(current))
+                current, current_size = [], 0
+            current.append(piece)
+            current_size += size
+
+    if current:
+        chunks.append("\n".join(current))
+
+    return [header + chunk for chunk in chunks]
+
+
+@dataclass
+class AdminEvent:
+    """
+    One thing admins should hear about: a line for the digest, and the full
+    message used when notifications are sent per event.
+    """
+
+    key: Hashable
+    summary: str
+    render: Callable[[TelegramUser], str]
+
+
+class AdminNotifier:
+    """
+    Collects the admin-facing events of a task run and turns them into
+    delivery jobs: one message per event and admin, or a few digest
+    messages per admin when ADMIN_NOTIFICATION_MODE is "digest".
+    """
+
+    def __init__(self, title: str, mode: Optional[str] = None):
+        self.title = title
+        self.mode = mode or settings.ADMIN_NOTIFICATION_MODE
+        if self.mode not in NOTIFICATION_MODES:
+            raise ValueError(f"Unknown admin notification mode {self.mode!r}, expected one of {NOTIFICATION_MODES}")
+        self.events: List[AdminEvent] = []
+
+    def add(self, event: AdminEvent) -> None:
+        self.events.append(event)
+
+    def build_jobs(self, admins: Iterable[TelegramUser]) -> List[DeliveryJob]:
+        if not self.events:
+            return []
+
+        if self.mode == PER_EVENT:
+            return [
+                DeliveryJob(
+                    key=(event.key, admin.chat_id),
+                    chat_id=admin.chat_id,
+                    messages=[OutgoingMessage(chat_id=admin.chat_id, text=event.render(admin))],
+                )
+                for event in self.events
+                for admin in admins
+            ]
+
+        return [
+            DeliveryJob(
+                key=(DIGEST, admin.chat_id),
+                chat_id=admin.chat_id,
+                messages=[
+                    OutgoingMessage(chat_id=admin.chat_id, text=text)
+                    for text in self._digest_messages(admin)
+                ],
+            )
+            for admin in admins
+        ]
+
+    def _digest_messages(self, admin: TelegramUser) -> List[str]:
+        header = f"Hi, {admin.telegram_username}!\n\n{self.title} ({len(self.events)})\n\n"
+        chunks = chunk_lines((event.summary for event in self.events), header=header)
+
+        if len(chunks) == 1:
+            return chunks
+
+        return [
+            chunk.replace(header, f"{header.rstrip()} (part {i}/{len(chunks)})\n\n", 1)
+            for i, chunk in enumerate(chunks, start=1)
+        ]
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from subscription_service.benchmarks import run_benchmark
+from telegram_bot.fake_server import FakeBotConfig
+
+
+def _current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the nightly expiry and reminder runs on synthetic data in a "
+        "throwaway database, against a local fake Bot API, and saves the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+        parser.add_argument("--output", help="JSON file (default: benchmarks/pipeline-<commit>.json)")
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds per fake Bot API call")
+        parser.add_argument("--per-chat-rate", type=float, default=None)
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument(
+            "--rate-limit",
+            action="store_true",
+            help="Keep the bot's own rate limiter on (caps throughput at Telegram's limits)",
+        )
+
+    def handle(self, *args, **options):
+        commit = _current_commit()
+        config = FakeBotConfig(
+            latency=options["latency"],
+            per_chat_rate=options["per_chat_rate"],
+            error_rate=options["error_rate"],
+            seed=0,
+        )
+
+        results = []
+        # Same as the test runner: a fresh database that is dropped afterwards
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for size in options["sizes"]:
+                call_command("flush", interactive=False, verbosity=0)
+
+                for result in run_benchmark(size, config, rate_limit=options["rate_limit"]):
+                    results.append(result)
+                    self.stdout.write(
+                        f"{size:>7} {result['task']:<36} {result['wall_time_s']:>8.2f}s "
+                        f"{result['queries']:>6} queries {result['messages_per_sec']:>8.1f} msg/s "
+                        f"{result['peak_rss_mb']:>7.1f} MB"
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = options["output"] or os.path.join("benchmarks", f"pipeline-{commit}.json")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+        with open(output, "w") as f:
+            json.dump(
+                {
+                    "commit": commit,
+                    "created_at": timezone.now().isoformat(),
+                    "database": connection.vendor,
+                    "rate_limit": options["rate_limit"],
+                    "fake_bot_api": vars(config),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Saved results to {output}"))
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from subscription_service.dataset import (
+    DATASET_CHAT_ID_BASE,
+    END_DATE_DISTRIBUTIONS,
+    generate_dataset,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates synthetic users with one subscription each, in bulk, for "
+        "profiling. Signals are bypassed; the rebuild_subscription_schedule "
+        "task schedules the subscriptions afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("count", type=int, help="Number of users/subscriptions")
+        parser.add_argument(
+            "--distribution",
+            choices=sorted(END_DATE_DISTRIBUTIONS),
+            default="mixed",
+            help=(
+                "End dates: uniform (-30..365 days), expired, expiring (next 7 days), "
+                "reminders (in the reminder windows) or mixed (20%% expired, "
+                "30%% reminders, 50%% active)"
+            ),
+        )
+        parser.add_argument("--staff", type=int, default=1, help="Admins to create as well")
+        parser.add_argument("--start-chat-id", type=int, default=DATASET_CHAT_ID_BASE)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Use INSERT even on Postgres instead of COPY",
+        )
+
+    def handle(self, *args, **options):
+        if options["count"] < 0 or options["batch_size"] < 1:
+            raise CommandError("count must be >= 0 and --batch-size >= 1")
+
+        use_copy = connection.vendor == "postgresql" and not options["no_copy"]
+
+        started = time.perf_counter()
+        count = generate_dataset(
+            options["count"],
+            distribution=options["distribution"],
+            staff=options["staff"],
+            start_chat_id=options["start_chat_id"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+            use_copy=use_copy,
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {count} users and subscriptions ({options['distribution']}) "
+                f"in {elapsed:.1f}s with {'COPY' if use_copy else 'INSERT'}"
+            )
+        )
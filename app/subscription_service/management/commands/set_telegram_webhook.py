@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from subscription_service.transport import get_transport
+
+
+class Command(BaseCommand):
+    help = "Switches the bot to webhook mode (or back to polling with --delete)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", nargs="?", help="Public URL of /api/telegram/webhook/")
+        parser.add_argument("--max-connections", type=int, default=40)
+        parser.add_argument("--delete", action="store_true", help="Remove the webhook")
+
+    def handle(self, *args, **options):
+        if options["delete"]:
+            response = get_transport().post("deleteWebhook")
+        else:
+            if not options["url"]:
+                raise CommandError("url is required unless --delete is given")
+            if not settings.TELEGRAM_WEBHOOK_SECRET:
+                raise CommandError("TELEGRAM_WEBHOOK_SECRET must be set")
+
+            response = get_transport().post(
+                "setWebhook",
+                json={
+                    "url": options["url"],
+                    "secret_token": settings.TELEGRAM_WEBHOOK_SECRET,
+                    "max_connections": options["max_connections"],
+                    "allowed_updates": ["message", "callback_query"],
+                },
+            )
+
+        if response.status_code != 200:
+            raise CommandError(f"Telegram rejected the request: {response.text}")
+
+        self.stdout.write(self.style.SUCCESS(response.text))
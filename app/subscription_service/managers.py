@@ -1,4 +1,10 @@
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
 from django.contrib.auth.models import BaseUserManager
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 
 class TelegramUserManager(BaseUserManager):
@@ -39,3 +45,180 @@ class TelegramUserManager(BaseUserManager):
         user.is_superuser = True
         user.save(using=self._db)
         return user
+
+
+class SubscriptionQuerySet(models.QuerySet):
+    def expired(self, now):
+        return self.filter(end_date__lt=now)
+
+    def keyset_chunks(
+        self,
+        chunk_size: int = 1000,
+        after: Optional[Tuple[datetime, int]] = None,
+    ) -> Iterator[List]:
+        """
+        Yields the queryset in chunks ordered by (end_date, id). Each chunk is
+        fetched with a keyset condition instead of an OFFSET, so every page
+        is an index range scan and only one chunk is held in memory.
+        `after` is the (end_date, id) key of the last row already processed.
+        """
+        queryset = self.order_by("end_date", "id")
+
+        while True:
+            page = queryset
+            if after is not None:
+                end_date, pk = after
+                page = page.filter(end_date__gte=end_date).filter(
+                    models.Q(end_date__gt=end_date) | models.Q(end_date=end_date, pk__gt=pk)
+                )
+
+            chunk = list(page[:chunk_size].iterator(chunk_size=chunk_size))
+            if not chunk:
+                return
+
+            yield chunk
+
+            if len(chunk) < chunk_size:
+                return
+
+            after = (chunk[-1].end_date, chunk[-1].pk)
+
+    def id_ranges(self, chunk_size: int = 1000) -> Iterator[Tuple[Optional[int], Optional[int]]]:
+        """
+        Splits the queryset into (after, until) primary key ranges of about
+        chunk_size rows each: after is exclusive, until inclusive, None means
+        unbounded. Each boundary is read from the primary key index.
+        """
+        after = None
+
+        while True:
+            page = self.order_by("pk")
+            if after is not None:
+                page = page.filter(pk__gt=after)
+
+            until = page.values_list("pk", flat=True)[chunk_size - 1:chunk_size].first()
+            if until is None:
+                yield after, None
+                return
+
+            yield after, until
+            after = until
+
+    def in_id_range(self, after: Optional[int], until: Optional[int]):
+        queryset = self
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        if until is not None:
+            queryset = queryset.filter(pk__lte=until)
+        return queryset
+
+    def expire(self) -> List:
+        """
+        Deletes every subscription in the queryset and takes their customers
+        out of the private group in three queries, inside one transaction.
+        No delete signals are sent. Returns the deleted subscriptions with
+        customer and plan loaded, so callers can notify about them afterwards.
+        """
+        customer_model = self.model._meta.get_field("customer").related_model
+
+        with transaction.atomic():
+            subscriptions = list(
+                self.select_related("customer", "plan").select_for_update(of=("self",))
+            )
+            if not subscriptions:
+                return []
+
+            customer_model.objects.filter(
+                pk__in=[subscription.customer_id for subscription in subscriptions]
+            ).update(at_private_group=False)
+
+            # A plain DELETE rather than QuerySet.delete(), which collects
+            # the rows again and sends a post_delete signal for each one.
+            # Nothing references subscriptions, and callers unschedule and
+            # update the status cache for all rows at once.
+            connection = connections[self.db]
+            pks = [subscription.pk for subscription in subscriptions]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {connection.ops.quote_name(self.model._meta.db_table)} "
+                    f"WHERE {connection.ops.quote_name(self.model._meta.pk.column)} "
+                    f"IN ({', '.join(['%s'] * len(pks))})",
+                    pks,
+                )
+
+        return subscriptions
+
+    def extend_or_create(self, customer, plan, payment_id: str, now: Optional[datetime] = None) -> Tuple:
+        """
+        Adds plan.duration to the customer's subscription, counting from its
+        end_date or from now if it already ran out, or creates the
+        subscription if there is none. Done in one statement, so concurrent
+        payments for the same customer are all counted.
+
+        Returns (subscription, created). Signals are not sent when the
+        subscription is extended.
+        """
+        now = now or timezone.now()
+
+        if connections[self.db].vendor == "postgresql":
+            pk, created = self._upsert(customer, plan, payment_id, now)
+        else:
+            pk, created = self._update_or_insert(customer, plan, payment_id, now)
+
+        subscription = self.model.objects.select_related("customer", "plan").get(pk=pk)
+        return subscription, created
+
+    def _upsert(self, customer, plan, payment_id: str, now: datetime) -> Tuple[int, bool]:
+        table = self.model._meta.db_table
+
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} AS s
+                    (customer_id, plan_id, payment_id, start_date, end_date, duration)
+                VALUES (%(customer_id)s, %(plan_id)s, %(payment_id)s, %(now)s,
+                        %(now)s + %(duration)s, %(duration)s)
+                ON CONFLICT (customer_id) DO UPDATE SET
+                    plan_id = EXCLUDED.plan_id,
+                    payment_id = EXCLUDED.payment_id,
+                    end_date = GREATEST(s.end_date, EXCLUDED.start_date) + EXCLUDED.duration,
+                    duration = GREATEST(s.end_date, EXCLUDED.start_date) + EXCLUDED.duration - s.start_date
+                RETURNING id, (xmax = 0)
+                """,
+                {
+                    "customer_id": customer.pk,
+                    "plan_id": plan.pk,
+                    "payment_id": payment_id,
+                    "now": now,
+                    "duration": plan.duration,
+                },
+            )
+            return cursor.fetchone()
+
+    def _update_or_insert(self, customer, plan, payment_id: str, now: datetime) -> Tuple[int, bool]:
+        # Other databases: the UPDATE computes the new end_date from the row
+        # it locks; a concurrent first payment is caught by the unique
+        # customer and retried as an update.
+        new_end_date = Greatest(models.F("end_date"), models.Value(now)) + models.Value(plan.duration)
+
+        for _ in range(2):
+            with transaction.atomic(using=self.db):
+                updated = self.model.objects.filter(customer=customer).update(
+                    plan=plan,
+                    payment_id=payment_id,
+                    end_date=new_end_date,
+                    duration=new_end_date - models.F("start_date"),
+                )
+                if updated:
+                    return self.model.objects.get(customer=customer).pk, False
+
+            try:
+                with transaction.atomic(using=self.db):
+                    subscription = self.model.objects.create(
+                        customer=customer, plan=plan, payment_id=payment_id, start_date=now
+                    )
+                    return subscription.pk, True
+            except IntegrityError:
+                continue
+
+        raise IntegrityError(f"could not extend the subscription of customer {customer.pk}")
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import threading
+from typing import Optional
+
+from django.core.cache import cache
+
+FILE_ID_TTL = 60 * 60 * 24 * 30
+
+
+class TelegramFileIdCache:
+    """
+    Maps a local file (path + content hash) to the file_id Telegram returned
+    for it, so the same image is uploaded only once.
+
+    Entries live in the shared Django cache (Redis). Editing the file changes
+    its hash, which makes the old entry unreachable and forces a re-upload.
+    """
+
+    _hashes = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def content_hash(cls, path: str) -> str:
+        stat = os.stat(path)
+        fingerprint = (stat.st_mtime_ns, stat.st_size)
+
+        with cls._lock:
+            cached = cls._hashes.get(path)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(65536), b""):
+                digest.update(block)
+
+        with cls._lock:
+            cls._hashes[path] = (fingerprint, digest.hexdigest())
+        return digest.hexdigest()
+
+    @classmethod
+    def cache_key(cls, path: str) -> str:
+        path_hash = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+        return f"tg:file_id:{path_hash}:{cls.content_hash(path)}"
+
+    # A cache outage only costs re-uploads: lookups miss and writes are
+    # skipped, so photos are still sent.
+
+    @classmethod
+    def get(cls, path: str) -> Optional[str]:
+        key = cls.cache_key(path)
+        try:
+            return cache.get(key)
+        except Exception as e:
+            print(f"[MEDIA CACHE ERROR] {str(e)}")
+            return None
+
+    @classmethod
+    def set(cls, path: str, file_id: str) -> None:
+        key = cls.cache_key(path)
+        try:
+            cache.set(key, file_id, timeout=FILE_ID_TTL)
+        except Exception as e:
+            print(f"[MEDIA CACHE ERROR] {str(e)}")
+
+    @classmethod
+    def invalidate(cls, path: str) -> None:
+        key = cls.cache_key(path)
+        try:
+            cache.delete(key)
+        except Exception as e:
+            print(f"[MEDIA CACHE ERROR] {str(e)}")
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.2 on 2026-10-18 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("subscription_service", "0002_remove_subscription_transaction_hash_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                fields=["end_date", "id"],
+                include=("customer", "plan"),
+                name="subscription_end_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="telegramuser",
+            index=models.Index(
+                condition=models.Q(("is_staff", True)),
+                fields=["chat_id"],
+                name="telegramuser_staff_idx",
+            ),
+        ),
+    ]
@@ -4,7 +4,7 @@ from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.db import models
 from django.utils import timezone
 
-from .managers import TelegramUserManager
+from .managers import SubscriptionQuerySet, TelegramUserManager
 
 
 class TelegramUser(AbstractBaseUser, PermissionsMixin):
@@ -23,6 +23,16 @@ class TelegramUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "telegram_username"
     REQUIRED_FIELDS = ["chat_id"]
 
+    class Meta:
+        indexes = [
+            # Every notification task looks up the admins of the group
+            models.Index(
+                fields=["chat_id"],
+                condition=models.Q(is_staff=True),
+                name="telegramuser_staff_idx",
+            ),
+        ]
+
     def __str__(self) -> str:
         return self.telegram_username
 
@@ -35,6 +45,14 @@ class TelegramUser(AbstractBaseUser, PermissionsMixin):
         self.save(update_fields=["at_private_group"])
 
 
+PERIOD_DURATIONS = {
+    "1 month": timedelta(days=30),
+    "3 months": timedelta(days=90),
+    "6 months": timedelta(days=180),
+    "1 year": timedelta(days=365),
+}
+
+
 class Plan(models.Model):
     PERIOD_CHOICES = [
         ("1 month", "1 month"),
@@ -49,6 +67,10 @@ class Plan(models.Model):
     def __str__(self) -> str:
         return f"{self.period} Plan - ${self.price}"
 
+    @property
+    def duration(self) -> timedelta:
+        return PERIOD_DURATIONS[self.period]
+
 
 class Subscription(models.Model):
     customer = models.OneToOneField(
@@ -64,20 +86,47 @@ class Subscription(models.Model):
     end_date = models.DateTimeField()
     duration = models.DurationField()
 
+    objects = SubscriptionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Expiry and reminder scans filter by end_date ranges and page
+            # through them by (end_date, id); INCLUDE is applied on Postgres only.
+            models.Index(
+                fields=["end_date", "id"],
+                include=["customer", "plan"],
+                name="subscription_end_date_idx",
+            ),
+        ]
+
     def save(self, *args, **kwargs):
-        self.set_duration()
-        self.set_end_date()
+        # Only new subscriptions are derived from the plan; later payments
+        # extend end_date and duration (extend_or_create), and a save must
+        # not undo that.
+        if self._state.adding:
+            self.set_duration()
+            self.set_end_date()
         super().save(*args, **kwargs)
 
     def set_duration(self):
-        if self.plan.period == "1 month":
-            self.duration = timedelta(days=30)
-        elif self.plan.period == "3 months":
-            self.duration = timedelta(days=90)
-        elif self.plan.period == "6 months":
-            self.duration = timedelta(days=180)
-        elif self.plan.period == "1 year":
-            self.duration = timedelta(days=365)
+        if self.plan.period in PERIOD_DURATIONS:
+            self.duration = self.plan.duration
 
     def set_end_date(self):
         self.end_date = self.start_date + self.duration
+
+
+class StripeEvent(models.Model):
+    """
+    A Stripe webhook event as received. The webhook only stores it; the
+    fulfillment task processes it and sets processed_at.
+    """
+
+    event_id = models.CharField(unique=True, max_length=255)
+    type = models.CharField(max_length=255)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.type} ({self.event_id})"
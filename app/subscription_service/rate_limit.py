@@ -0,0 +1,133 @@
+import time
+from typing import Optional, Union
+
+import requests
+from django.conf import settings
+from django_redis import get_redis_connection
+
+# Checks the chat's 429 pause, then the global and per-chat budgets of the
+# current one-second window (taken from the Redis clock so every worker
+# agrees). Takes a slot from both budgets only when both have room.
+# Returns 0 on success, otherwise the number of milliseconds to wait.
+ACQUIRE_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local window = math.floor(now_ms / 1000)
+local wait_ms = 1000 - (now_ms % 1000)
+
+local paused_ms = redis.call('PTTL', KEYS[1])
+if paused_ms > 0 then
+    return paused_ms
+end
+
+local global_key = KEYS[2] .. ':' .. window
+local chat_key = KEYS[3] .. ':' .. window
+
+if tonumber(redis.call('GET', global_key) or '0') >= tonumber(ARGV[1]) then
+    return wait_ms
+end
+if tonumber(redis.call('GET', chat_key) or '0') >= tonumber(ARGV[2]) then
+    return wait_ms
+end
+
+redis.call('INCR', global_key)
+redis.call('PEXPIRE', global_key, 2000)
+redis.call('INCR', chat_key)
+redis.call('PEXPIRE', chat_key, 2000)
+return 0
+"""
+
+
+def get_retry_after(response: requests.Response, default: int = 1) -> int:
+    """
+    Reads parameters.retry_after from a Bot API 429 response.
+    """
+    try:
+        return int(response.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return default
+
+
+class TelegramRateLimiter:
+    """
+    Cluster-wide limiter for outgoing Bot API calls, backed by Redis.
+
+    Enforces a global messages-per-second budget and a per-chat budget, and
+    pauses a chat for retry_after seconds after Telegram answers with 429.
+    """
+
+    def __init__(self, redis=None, global_rate: int = 30, per_chat_rate: int = 1):
+        self.redis = redis
+        self.global_rate = global_rate
+        self.per_chat_rate = per_chat_rate
+        self._acquire_script = None
+
+    def _get_redis(self):
+        if self.redis is None:
+            self.redis = get_redis_connection("default")
+        return self.redis
+
+    def _script(self):
+        if self._acquire_script is None:
+            self._acquire_script = self._get_redis().register_script(ACQUIRE_SCRIPT)
+        return self._acquire_script
+
+    def try_acquire(self, chat_id: Union[int, str]) -> float:
+        """
+        Takes a slot for chat_id. Returns 0 on success, otherwise the number
+        of seconds to wait before trying again.
+        """
+        wait_ms = self._script()(
+            keys=[
+                f"tg:rl:pause:{chat_id}",
+                "tg:rl:global",
+                f"tg:rl:chat:{chat_id}",
+            ],
+            args=[self.global_rate, self.per_chat_rate],
+        )
+        return int(wait_ms) / 1000
+
+    def acquire(self, chat_id: Union[int, str], timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until chat_id may send. Returns False if timeout ran out first.
+        If Redis is unavailable the limiter lets the message through.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            try:
+                wait = self.try_acquire(chat_id)
+            except Exception as e:
+                print(f"[RATE LIMIT ERROR] {str(e)}")
+                return True
+
+            if not wait:
+                return True
+
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+
+            time.sleep(wait)
+
+    def pause_chat(self, chat_id: Union[int, str], retry_after: float) -> None:
+        try:
+            self._get_redis().set(
+                f"tg:rl:pause:{chat_id}", 1, px=max(1, int(retry_after * 1000))
+            )
+        except Exception as e:
+            print(f"[RATE LIMIT ERROR] {str(e)}")
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter() -> TelegramRateLimiter:
+    global _rate_limiter
+
+    if _rate_limiter is None:
+        _rate_limiter = TelegramRateLimiter(
+            global_rate=settings.TELEGRAM_GLOBAL_RATE_LIMIT,
+            per_chat_rate=settings.TELEGRAM_PER_CHAT_RATE_LIMIT,
+        )
+
+    return _rate_limiter
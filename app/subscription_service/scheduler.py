@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+SCHEDULE_KEY = "subscription_events"
+# Reminders already popped, scored by when they were due, so a rebuild does
+# not schedule a reminder again that was sent in its grace period.
+POPPED_REMINDERS_KEY = "subscription_events:popped_reminders"
+
+EXPIRE = "expire"
+REMIND = "remind"
+
+# A reminder is still sent this long after its time (a late tick, a rebuild
+# after Redis lost the schedule); after that the next reminder applies.
+REMINDER_GRACE = timedelta(days=1)
+
+# Takes the due members off the set in the same step that reads them, so
+# two ticks running at once never handle the same event twice. Reminders
+# are recorded in the popped set, which is trimmed past the grace period.
+POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+local members = {}
+for i = 1, #due, 2 do
+    members[#members + 1] = due[i]
+    if string.sub(due[i], 1, 7) == 'remind:' then
+        redis.call('ZADD', KEYS[2], due[i + 1], due[i])
+    end
+end
+if #members > 0 then
+    redis.call('ZREM', KEYS[1], unpack(members))
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3])
+return members
+"""
+
+
+class DueEvents:
+    def __init__(self, members: Iterable[str]):
+        self.members = list(members)
+        self.expire: List[int] = []
+        self.remind: Dict[int, List[int]] = {}
+        self.handled: Set[str] = set()
+
+        for member in self.members:
+            kind, *rest = member.split(":")
+            if kind == EXPIRE:
+                self.expire.append(int(rest[0]))
+            elif kind == REMIND:
+                self.remind.setdefault(int(rest[0]), []).append(int(rest[1]))
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def expire_handled(self) -> None:
+        self.handled.update(f"{EXPIRE}:{pk}" for pk in self.expire)
+
+    def remind_handled(self, days: int) -> None:
+        self.handled.update(f"{REMIND}:{days}:{pk}" for pk in self.remind.get(days, []))
+
+    @property
+    def pending(self) -> List[str]:
+        return [member for member in self.members if member not in self.handled]
+
+
+class SubscriptionScheduler:
+    """
+    Keeps upcoming subscription events in a Redis sorted set scored by the
+    time they are due: the expiry itself and one reminder per configured
+    offset. A periodic tick pops only the events that are due, so expiry
+    and reminders happen within a minute of their time without a table scan.
+
+    Redis does not persist the set, so it is rebuilt from the database
+    (rebuild_subscription_schedule) whenever the tick finds it empty and
+    every hour. Reminders less than REMINDER_GRACE overdue are scheduled
+    then too, unless they were popped already; if Redis lost the popped set
+    as well, those may be sent twice rather than not at all.
+    """
+
+    def __init__(self, redis=None, reminder_days: Optional[Iterable[int]] = None):
+        self.redis = redis
+        self.reminder_days = (
+            list(reminder_days)
+            if reminder_days is not None
+            else [reminder["days"] for reminder in settings.SUBSCRIPTION_REMINDERS]
+        )
+        self._pop_due_script = None
+
+    def _get_redis(self):
+        if self.redis is None:
+            self.redis = get_redis_connection("default")
+        return self.redis
+
+    def events_for(self, pk: int, end_date: datetime) -> List[Tuple[str, float]]:
+        events = [(f"{EXPIRE}:{pk}", end_date.timestamp())]
+        for days in self.reminder_days:
+            events.append((f"{REMIND}:{days}:{pk}", (end_date - timedelta(days=days)).timestamp()))
+        return events
+
+    def schedule(self, pk: int, end_date: datetime, now: Optional[datetime] = None) -> None:
+        """
+        (Re)schedules the events of one subscription. Overdue reminders are
+        kept for REMINDER_GRACE unless already popped, so the next tick
+        sends them; the expiry is always kept so an overdue subscription is
+        handled on the next tick.
+        """
+        self.schedule_many([(pk, end_date)], now=now)
+
+    def schedule_many(self, subscriptions: Iterable[Tuple[int, datetime]], now: Optional[datetime] = None) -> None:
+        now_ts = (now or timezone.now()).timestamp()
+        grace_ts = now_ts - REMINDER_GRACE.total_seconds()
+        redis = self._get_redis()
+
+        events = [self.events_for(pk, end_date) for pk, end_date in subscriptions]
+
+        overdue = [
+            member
+            for subscription_events in events
+            for member, score in subscription_events
+            if member.startswith(REMIND) and grace_ts < score <= now_ts
+        ]
+        popped = dict(zip(overdue, redis.zmscore(POPPED_REMINDERS_KEY, overdue))) if overdue else {}
+
+        pipe = redis.pipeline(transaction=False)
+
+        for subscription_events in events:
+            pipe.zrem(SCHEDULE_KEY, *[member for member, _ in subscription_events])
+
+            mapping = {
+                member: score
+                for member, score in subscription_events
+                if member.startswith(EXPIRE)
+                or score > now_ts
+                # Popped at or after this due time means it was handled
+                or (score > grace_ts and (popped.get(member) or 0) < score)
+            }
+            pipe.zadd(SCHEDULE_KEY, mapping)
+
+        pipe.execute()
+
+    def is_empty(self) -> bool:
+        return not self._get_redis().exists(SCHEDULE_KEY)
+
+    def unschedule_many(self, pks: Iterable[int]) -> None:
+        members = [
+            member
+            for pk in pks
+            for member, _ in self.events_for(pk, timezone.now())
+        ]
+        if members:
+            self._get_redis().zrem(SCHEDULE_KEY, *members)
+
+    def pop_due(self, now: Optional[datetime] = None, limit: int = 1000) -> DueEvents:
+        if self._pop_due_script is None:
+            self._pop_due_script = self._get_redis().register_script(POP_DUE_SCRIPT)
+
+        now = now or timezone.now()
+        members = self._pop_due_script(
+            keys=[SCHEDULE_KEY, POPPED_REMINDERS_KEY],
+            args=[now.timestamp(), limit, (now - 2 * REMINDER_GRACE).timestamp()],
+        )
+        return DueEvents(
+            member.decode() if isinstance(member, bytes) else member
+            for member in members
+        )
+
+    def retry_later(self, events: DueEvents, delay: int = 60) -> None:
+        """
+        Puts back the events not handled yet when handling them failed, due
+        again after delay seconds. Handled ones are not repeated.
+        """
+        pending = events.pending
+        if pending:
+            due = timezone.now().timestamp() + delay
+            self._get_redis().zadd(SCHEDULE_KEY, {member: due for member in pending})
+
+
+_scheduler = None
+
+
+def get_scheduler() -> SubscriptionScheduler:
+    global _scheduler
+
+    if _scheduler is None:
+        _scheduler = SubscriptionScheduler()
+
+    return _scheduler
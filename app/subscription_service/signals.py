@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import get_plan_catalog
+from .models import Plan, Subscription, TelegramUser
+from .scheduler import get_scheduler
+from .status_cache import SubscriptionStatus, SubscriptionStatusCache
+
+
+def _run_on_commit(func, *args, log_prefix: str = "SCHEDULER") -> None:
+    def run():
+        try:
+            func(*args)
+        except Exception as e:
+            # The hourly rebuild_subscription_schedule task repairs anything
+            # missed by the scheduler; status cache entries expire in a day.
+            print(f"[{log_prefix} ERROR] {str(e)}")
+
+    transaction.on_commit(run)
+
+
+@receiver(post_save, sender=Subscription)
+def schedule_subscription_events(sender, instance: Subscription, **kwargs) -> None:
+    _run_on_commit(get_scheduler().schedule, instance.pk, instance.end_date)
+
+
+@receiver(post_delete, sender=Subscription)
+def unschedule_subscription_events(sender, instance: Subscription, **kwargs) -> None:
+    _run_on_commit(get_scheduler().unschedule_many, [instance.pk])
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def invalidate_plan_catalog(sender, instance: Plan, **kwargs) -> None:
+    transaction.on_commit(get_plan_catalog().invalidate)
+
+
+# Subscription status of /verify, written through on every change. The
+# customer's primary key is its chat_id.
+
+@receiver(post_save, sender=Subscription)
+def cache_subscription_status(sender, instance: Subscription, **kwargs) -> None:
+    _run_on_commit(
+        SubscriptionStatusCache.set,
+        instance.customer_id,
+        SubscriptionStatusCache.status_of(instance),
+        log_prefix="STATUS CACHE",
+    )
+
+
+@receiver(post_delete, sender=Subscription)
+def cache_removed_subscription_status(sender, instance: Subscription, **kwargs) -> None:
+    _run_on_commit(
+        SubscriptionStatusCache.set,
+        instance.customer_id,
+        SubscriptionStatus(registered=True),
+        log_prefix="STATUS CACHE",
+    )
+
+
+@receiver(post_save, sender=TelegramUser)
+def cache_new_user_status(sender, instance: TelegramUser, created: bool, **kwargs) -> None:
+    if created:
+        _run_on_commit(
+            SubscriptionStatusCache.set,
+            instance.chat_id,
+            SubscriptionStatus(registered=True),
+            log_prefix="STATUS CACHE",
+        )
+
+
+@receiver(post_delete, sender=TelegramUser)
+def forget_user_status(sender, instance: TelegramUser, **kwargs) -> None:
+    _run_on_commit(SubscriptionStatusCache.forget, instance.chat_id, log_prefix="STATUS CACHE")
@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+from django.core.cache import cache
+
+from .models import Subscription, TelegramUser
+
+STATUS_TTL = 60 * 60 * 24
+
+
+@dataclass
+class SubscriptionStatus:
+    """
+    What /verify needs to know about a chat. `registered` is False for chats
+    that never bought anything; `end_date` is None when there is no
+    subscription.
+    """
+
+    registered: bool
+    plan: Optional[str] = None
+    end_date: Optional[datetime] = None
+
+
+class SubscriptionStatusCache:
+    """
+    Write-through cache of every chat's subscription status.
+
+    Entries are written by the Subscription and TelegramUser signals and by
+    the expiry task, so they stay current; a miss costs one joined query.
+    """
+
+    @classmethod
+    def cache_key(cls, chat_id: int) -> str:
+        return f"subscription_status:{chat_id}"
+
+    @classmethod
+    def get(cls, chat_id: int) -> SubscriptionStatus:
+        status = cache.get(cls.cache_key(chat_id))
+        if status is None:
+            status = cls.lookup(chat_id)
+            # add, not set: a write-through that landed since the lookup
+            # (e.g. a payment) is newer and must win.
+            cache.add(cls.cache_key(chat_id), status, timeout=STATUS_TTL)
+        return status
+
+    @classmethod
+    def lookup(cls, chat_id: int) -> SubscriptionStatus:
+        row = (
+            TelegramUser.objects
+            .filter(chat_id=chat_id)
+            .values("subscription__end_date", "subscription__plan__period")
+            .first()
+        )
+
+        if row is None:
+            return SubscriptionStatus(registered=False)
+
+        return SubscriptionStatus(
+            registered=True,
+            plan=row["subscription__plan__period"],
+            end_date=row["subscription__end_date"],
+        )
+
+    @classmethod
+    def status_of(cls, subscription: Subscription) -> SubscriptionStatus:
+        return SubscriptionStatus(
+            registered=True,
+            plan=subscription.plan.period,
+            end_date=subscription.end_date,
+        )
+
+    @classmethod
+    def set(cls, chat_id: int, status: SubscriptionStatus) -> None:
+        cache.set(cls.cache_key(chat_id), status, timeout=STATUS_TTL)
+
+    @classmethod
+    def set_many(cls, statuses: Dict[int, SubscriptionStatus]) -> None:
+        cache.set_many(
+            {cls.cache_key(chat_id): status for chat_id, status in statuses.items()},
+            timeout=STATUS_TTL,
+        )
+
+    @classmethod
+    def forget(cls, chat_id: int) -> None:
+        cache.delete(cls.cache_key(chat_id))
@@ -1,8 +1,97 @@
+import time
+from typing import Optional
+from urllib.parse import urlencode
+
 import stripe
 from django.conf import settings
+from django.core.cache import cache
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+# Stripe accepts 30 minutes to 24 hours; stay clear of the upper bound
+CHECKOUT_SESSION_LIFETIME = 60 * 60 * 23
+
+# How long a tap waits for the checkout link being prepared before another
+# tap may request a new one
+CHECKOUT_PENDING_TTL = 60
+
+# A cached session is not handed out when it expires sooner than this, so
+# the user has time to actually pay.
+CHECKOUT_SESSION_MIN_REMAINING = 60 * 10
+
+
+class CheckoutSessionCache:
+    """
+    Keeps the open checkout session of each (chat, plan), so tapping the
+    same plan again returns the same URL instead of creating a new session.
+    Entries expire together with the session.
+    """
+
+    @classmethod
+    def cache_key(cls, chat_id: int, plan_id: int) -> str:
+        return f"stripe:checkout:{chat_id}:{plan_id}"
+
+    @classmethod
+    def get(cls, chat_id: int, plan_id: int) -> Optional[str]:
+        return cache.get(cls.cache_key(chat_id, plan_id))
+
+    @classmethod
+    def set(cls, chat_id: int, plan_id: int, url: str, expires_at: int) -> None:
+        timeout = expires_at - int(time.time()) - CHECKOUT_SESSION_MIN_REMAINING
+        if timeout > 0:
+            cache.set(cls.cache_key(chat_id, plan_id), url, timeout=timeout)
+
+    @classmethod
+    def forget(cls, chat_id: int, plan_id: int) -> None:
+        cache.delete(cls.cache_key(chat_id, plan_id))
+
+    @classmethod
+    def claim_pending(cls, chat_id: int, plan_id: int) -> bool:
+        """
+        Marks a session for (chat, plan) as being created. Returns False if
+        one already is, so repeated taps don't queue more work.
+        """
+        return cache.add(f"{cls.cache_key(chat_id, plan_id)}:pending", 1, timeout=CHECKOUT_PENDING_TTL)
+
+    @classmethod
+    def release_pending(cls, chat_id: int, plan_id: int) -> None:
+        cache.delete(f"{cls.cache_key(chat_id, plan_id)}:pending")
+
+
+def get_payment_link(plan, chat_id) -> Optional[str]:
+    """
+    Returns the preconfigured Payment Link of the plan (STRIPE_PAYMENT_LINKS),
+    with the chat carried in client_reference_id, or None if there is none.
+    """
+    link = settings.STRIPE_PAYMENT_LINKS.get(plan.period)
+    if not link:
+        return None
+
+    return f"{link}?{urlencode({'client_reference_id': chat_id})}"
+
+
+def get_ready_checkout_url(plan, chat_id) -> Optional[str]:
+    """
+    Returns the plan's Payment Link or the chat's open checkout session,
+    whichever exists, without calling Stripe.
+    """
+    return get_payment_link(plan, chat_id) or CheckoutSessionCache.get(chat_id, plan.id)
+
+
+def get_checkout_url(plan, chat_id) -> str:
+    """
+    Returns a payment URL for the plan: its Payment Link, the chat's open
+    checkout session, or a new session. Only the last one calls Stripe.
+    """
+    url = get_ready_checkout_url(plan, chat_id)
+    if url:
+        return url
+
+    session = create_checkout_session(plan, chat_id)
+    CheckoutSessionCache.set(chat_id, plan.id, session.url, session.expires_at)
+
+    return session.url
+
 
 def create_checkout_session(plan, chat_id):
     session = stripe.checkout.Session.create(
@@ -22,6 +111,8 @@ def create_checkout_session(plan, chat_id):
         ],
         success_url="https://t.me/hesahne_subs_bot?start=payment_success",
         cancel_url="https://t.me/hesahne_subs_bot?start=payment_cancelled",
+        client_reference_id=str(chat_id),
+        expires_at=int(time.time()) + CHECKOUT_SESSION_LIFETIME,
 
         # 🔥 THIS IS THE KEY FIX
         metadata={
@@ -30,4 +121,4 @@ def create_checkout_session(plan, chat_id):
         },
     )
 
-    return session.url
+    return session
@@ -1,151 +1,625 @@
 import os
-from datetime import timedelta
+from datetime import datetime, timedelta
+from typing import List, Tuple
 
 import pytz
-from celery import shared_task
+from celery import chord, shared_task
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 
+from subscription_service.dedupe import get_stripe_event_deduplicator
+from subscription_service.delivery import DeliveryJob, OutgoingMessage
+from subscription_service.digest import AdminEvent, AdminNotifier
+from subscription_service.scheduler import REMINDER_GRACE, get_scheduler
+from subscription_service.status_cache import SubscriptionStatus, SubscriptionStatusCache
+from subscription_service.stripe_service import CheckoutSessionCache, get_checkout_url
+from subscription_service.transport import get_transport
 from subscription_service.utils import TelegramMessageSender
-from .models import Subscription, TelegramUser
+from .models import Plan, StripeEvent, Subscription, TelegramUser
 
 
 MOSCOW_TZ = pytz.timezone("Europe/Moscow")
 
+# fulfill_stripe_event gives up after about five minutes of retries; events
+# still unprocessed after this are queued again by the sweeper.
+STRIPE_EVENT_STALE_AFTER = timedelta(minutes=15)
+
+# Stripe stops redelivering after three days; older unprocessed events are
+# left for an admin to look at.
+STRIPE_EVENT_REQUEUE_WINDOW = timedelta(days=3)
+
 
 @shared_task
-def delete_expired_subscriptions() -> None:
-    admins_of_group = TelegramUser.objects.filter(is_staff=True)
+def send_telegram_messages(messages: list) -> None:
+    """
+    Sends messages that were rescheduled after a 429, in their original order.
+    """
+    outgoing = [OutgoingMessage(**message) for message in messages]
+
+    TelegramMessageSender.send_batch(
+        [DeliveryJob(key=0, chat_id=outgoing[0].chat_id, messages=outgoing)]
+    )
 
-    now = timezone.now()
 
-    expired_subscriptions = (
-        Subscription.objects
-        .select_related("customer", "plan")
-        .filter(end_date__lt=now)
+@shared_task(bind=True, max_retries=3)
+def create_checkout_link(self, chat_id: int, plan_id: int) -> None:
+    """
+    Creates (or reuses) the checkout session for a plan the user picked and
+    sends them the link.
+    """
+    plan = Plan.objects.get(id=plan_id)
+
+    try:
+        checkout_url = get_checkout_url(plan, chat_id)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=2 ** self.request.retries)
+
+        print(f"[CHECKOUT ERROR] Chat {chat_id}, plan {plan_id}: {str(e)}")
+        CheckoutSessionCache.release_pending(chat_id, plan_id)
+        TelegramMessageSender.send_message_to_chat(
+            chat_id=chat_id,
+            message="⚠️ Could not prepare your payment link. Please choose the plan again.",
+        )
+        return
+
+    CheckoutSessionCache.release_pending(chat_id, plan_id)
+    TelegramMessageSender.send_message_to_chat(
+        chat_id=chat_id,
+        message=TelegramMessageSender.create_message_with_checkout_link(
+            subscription_plan=plan.period,
+            subscription_price=plan.price,
+            checkout_url=checkout_url,
+        ),
     )
 
-    for subscription in expired_subscriptions:
-        customer = subscription.customer
 
-        subscription_start_date = subscription.start_date.astimezone(
-            MOSCOW_TZ
-        ).strftime("%d/%m/%Y %H:%M:%S")
+@shared_task(bind=True, max_retries=5)
+def fulfill_stripe_event(self, event_pk: int) -> None:
+    """
+    Processes a stored Stripe webhook event. Paid checkouts create or extend
+    the customer's subscription; other event types are only marked processed.
+    """
+    notifier = AdminNotifier(title="🟢 Payments received")
 
-        subscription_end_date = subscription.end_date.astimezone(
-            MOSCOW_TZ
-        ).strftime("%d/%m/%Y %H:%M:%S")
-
-        for admin in admins_of_group:
-            try:
-                message = TelegramMessageSender.create_message_about_delete_user(
-                    admin_of_group=admin.telegram_username,
-                    telegram_username=customer.telegram_username,
-                    subscription_start_date=subscription_start_date,
-                    subscription_end_date=subscription_end_date,
-                    subscription_plan=subscription.plan.period,
-                    subscription_price=subscription.plan.price,
-                    payment_id=subscription.payment_id,
-                )
+    try:
+        with transaction.atomic():
+            event = StripeEvent.objects.select_for_update().get(pk=event_pk)
+            if event.processed_at is not None:
+                return
 
-                response = TelegramMessageSender.send_message_to_chat(
-                    chat_id=admin.chat_id,
-                    message=message,
-                )
+            if event.type == "checkout.session.completed":
+                _fulfill_checkout(event.payload["data"]["object"], notifier)
 
-                if response.status_code == 200:
-                    subscription.delete()
-                    customer.delete_from_private_group()
+            event.processed_at = timezone.now()
+            event.save(update_fields=["processed_at"])
+    except Exception as e:
+        print(f"[PAYMENT TASK ERROR] Event {event_pk}: {str(e)}")
+        raise self.retry(exc=e, countdown=2 ** self.request.retries * 10)
 
-            except Exception as e:
-                print(
-                    f"[DELETE TASK ERROR] User @{customer.telegram_username}: {str(e)}"
-                )
+    _notify_admins(notifier, "PAYMENT TASK")
 
 
-def _get_subscriptions_expiring_in_days(days: int):
+@shared_task
+def requeue_unprocessed_stripe_events() -> None:
+    """
+    Queues fulfillment again for stored events that were never processed:
+    the task could not be queued, or it ran out of retries.
+    """
     now = timezone.now()
-    start = now + timedelta(days=days)
-    end = start + timedelta(days=1)
+    pks = list(
+        StripeEvent.objects.filter(
+            processed_at__isnull=True,
+            received_at__lt=now - STRIPE_EVENT_STALE_AFTER,
+            received_at__gte=now - STRIPE_EVENT_REQUEUE_WINDOW,
+        ).values_list("pk", flat=True)
+    )
 
-    return (
-        Subscription.objects
-        .select_related("customer", "plan")
-        .filter(end_date__gte=start, end_date__lt=end)
+    for pk in pks:
+        fulfill_stripe_event.delay(pk)
+
+    print(
+        f"[PAYMENT TASK] Re-queued {len(pks)} unprocessed Stripe events. "
+        f"Webhook dedupe: {get_stripe_event_deduplicator().stats()}"
     )
 
 
-@shared_task
-def notify_about_expiring_subscriptions_1_day() -> None:
-    _notify(days=1, syntax_word="день", image="1-day.jpg")
+def _checkout_plan(session: dict) -> Plan:
+    plan_id = (session.get("metadata") or {}).get("plan_id")
+    if plan_id:
+        return Plan.objects.get(id=plan_id)
+
+    # Payment Links don't pass per-customer metadata; the session names the
+    # link it was paid through.
+    period = settings.STRIPE_PAYMENT_LINK_PLANS.get(session.get("payment_link"))
+    if period is None:
+        # Left unprocessed, so it is fulfilled once the link is configured
+        raise ValueError(f"No plan for session {session['id']} (payment link {session.get('payment_link')})")
+
+    return Plan.objects.get(period=period)
+
+
+def _fulfill_checkout(session: dict, notifier: AdminNotifier) -> None:
+    if session.get("payment_status") != "paid":
+        return
+
+    metadata = session.get("metadata") or {}
+    chat_id = int(metadata.get("chat_id") or session["client_reference_id"])
+    plan = _checkout_plan(session)
+    payment_id = session.get("payment_intent") or session["id"]
+    now = timezone.now()
+
+    customer, _ = TelegramUser.objects.get_or_create(
+        chat_id=chat_id,
+        # The user is created with their username when they pick a plan;
+        # Stripe does not know it, so a payment made without the bot (a
+        # shared Payment Link) shows the chat id instead.
+        defaults={"telegram_username": str(chat_id)},
+    )
+
+    # Extended in one statement, so two payments processed at the same time
+    # both count.
+    subscription, created = Subscription.objects.extend_or_create(
+        customer, plan, payment_id, now=now
+    )
+
+    # The upsert may bypass the model signals, so do what they would have done.
+    # Robust, so a Redis error is only logged: the payment is committed, and
+    # the schedule rebuild and the cache timeout repair what was missed.
+    transaction.on_commit(
+        lambda: get_scheduler().schedule(subscription.pk, subscription.end_date),
+        robust=True,
+    )
+    transaction.on_commit(
+        lambda: SubscriptionStatusCache.set(chat_id, SubscriptionStatusCache.status_of(subscription)),
+        robust=True,
+    )
+
+    render_message = (
+        TelegramMessageSender.create_message_about_add_user
+        if created
+        else TelegramMessageSender.create_message_about_keep_user
+    )
+
+    if not customer.at_private_group:
+        customer.add_to_private_group()
+
+    # The session is paid, so it must not be handed out again. Robust, like
+    # the hooks above: a Redis error must not cost the admin notification.
+    transaction.on_commit(lambda: CheckoutSessionCache.forget(chat_id, plan.id), robust=True)
+
+    notifier.add(_payment_event(subscription, render_message, paid_at=now))
+
+
+def _payment_event(subscription: Subscription, render_message, paid_at) -> AdminEvent:
+    telegram_username = subscription.customer.telegram_username
+    subscription_plan = subscription.plan.period
+    subscription_price = subscription.plan.price
+    payment_id = subscription.payment_id
+
+    # "Purchased on" for new subscriptions, "Extended on" for renewals
+    subscription_start_date = paid_at.astimezone(
+        MOSCOW_TZ
+    ).strftime("%d/%m/%Y %H:%M:%S")
+
+    subscription_end_date = subscription.end_date.astimezone(
+        MOSCOW_TZ
+    ).strftime("%d/%m/%Y %H:%M:%S")
+
+    def render(admin: TelegramUser) -> str:
+        return render_message(
+            admin_of_group=admin.telegram_username,
+            telegram_username=telegram_username,
+            subscription_start_date=subscription_start_date,
+            subscription_end_date=subscription_end_date,
+            subscription_plan=subscription_plan,
+            subscription_price=subscription_price,
+            payment_id=payment_id,
+        )
+
+    return AdminEvent(
+        key=subscription.pk,
+        summary=(
+            f"@{telegram_username} — {subscription_plan}, "
+            f"{subscription_price} USD, until {subscription_end_date}, "
+            f"payment {payment_id}"
+        ),
+        render=render,
+    )
+
+
+def _fan_out(candidates, chunk_task, callback, now) -> int:
+    """
+    Splits the candidate subscriptions into id ranges and runs chunk_task on
+    each of them in parallel, then callback with the list of their results.
+    """
+    ranges = list(candidates.id_ranges(settings.SUBSCRIPTION_SCAN_CHUNK_SIZE))
+
+    chord(
+        chunk_task.s(now.isoformat(), after, until) for after, until in ranges
+    )(callback.s(now.isoformat()))
+
+    return len(ranges)
+
+
+def _chunk_failed(task, e: Exception, log_prefix: str, after, until) -> dict:
+    # Retried on its own; once retries run out the range is reported to the
+    # callback instead of failing the whole run.
+    if task.request.retries < task.max_retries:
+        raise task.retry(exc=e, countdown=30 * 2 ** task.request.retries)
+
+    print(f"[{log_prefix} ERROR] Chunk ({after}, {until}]: {str(e)}")
+    return {"total": 0, "events": [], "failed": [after, until]}
 
 
 @shared_task
-def notify_about_expiring_subscriptions_3_days() -> None:
-    _notify(days=3, syntax_word="дня", image="3-days.jpg")
+def delete_expired_subscriptions() -> None:
+    """
+    Splits the expired subscriptions into chunks that workers remove in
+    parallel; finish_expiry_run notifies the admins once all are done.
+    """
+    now = timezone.now()
+    chunks = _fan_out(
+        Subscription.objects.expired(now),
+        expire_subscription_chunk,
+        finish_expiry_run,
+        now,
+    )
+    print(f"[DELETE TASK] Queued {chunks} chunks")
+
+
+@shared_task(bind=True, max_retries=3)
+def expire_subscription_chunk(self, now: str, after, until) -> dict:
+    now = datetime.fromisoformat(now)
+
+    try:
+        pks = list(
+            Subscription.objects.expired(now).in_id_range(after, until).values_list("pk", flat=True)
+        )
+        events = _expire_subscriptions(now, pks)
+    except Exception as e:
+        return _chunk_failed(self, e, "DELETE TASK", after, until)
+
+    return {"total": len(events), "events": events}
 
 
 @shared_task
-def notify_about_expiring_subscriptions_7_days() -> None:
-    _notify(days=7, syntax_word="дней", image="7-days.jpg")
+def finish_expiry_run(results: List[dict], now: str) -> None:
+    notifier = AdminNotifier(title="🔴 Delete from private group")
+    for result in results:
+        for values in result["events"]:
+            notifier.add(_delete_event(values))
+
+    # Admins are told afterwards; whether they get the message no longer
+    # decides whether the subscription is removed.
+    _notify_admins(notifier, "DELETE TASK")
+
+    failed = [result["failed"] for result in results if result.get("failed")]
+    print(
+        f"[DELETE TASK] Expired {len(notifier.events)} subscriptions in "
+        f"{len(results)} chunks, failed chunks: {failed}. "
+        f"Telegram transport: {get_transport().stats.as_dict()}"
+    )
 
 
-def _notify(days: int, syntax_word: str, image: str) -> None:
-    admins_of_group = TelegramUser.objects.filter(is_staff=True)
+def _expire_subscriptions(now, pks: List[int]) -> List[dict]:
+    """
+    Removes the subscriptions among pks that are still expired. Returns the
+    values admins are notified with (see _delete_event).
+    """
+    # Re-checked under the row lock, so a subscription renewed since it was
+    # picked up is left alone.
+    expired_subscriptions = Subscription.objects.expired(now).filter(pk__in=pks).expire()
 
-    subscriptions = _get_subscriptions_expiring_in_days(days)
+    if expired_subscriptions:
+        # expire() sends no delete signals, so do what they would have done,
+        # once for all rows.
+        get_scheduler().unschedule_many(subscription.pk for subscription in expired_subscriptions)
+        SubscriptionStatusCache.set_many({
+            subscription.customer_id: SubscriptionStatus(registered=True)
+            for subscription in expired_subscriptions
+        })
 
-    for subscription in subscriptions:
-        customer = subscription.customer
+    return [_delete_event_values(subscription) for subscription in expired_subscriptions]
 
-        subscription_start_date = subscription.start_date.astimezone(
-            MOSCOW_TZ
-        ).strftime("%d/%m/%Y %H:%M:%S")
 
-        subscription_end_date = subscription.end_date.astimezone(
+def _notify_admins(notifier: AdminNotifier, log_prefix: str) -> None:
+    if not notifier.events:
+        return
+
+    admins_of_group = list(TelegramUser.objects.filter(is_staff=True))
+
+    results = TelegramMessageSender.send_batch(notifier.build_jobs(admins_of_group))
+
+    for result in results.values():
+        if not result.ok:
+            print(f"[{log_prefix} ERROR] Admin {result.chat_id}: {result.error}")
+
+
+def _delete_event_values(subscription: Subscription) -> dict:
+    # Only plain values are kept, so they can be passed between tasks and
+    # don't pin model instances in memory.
+    return {
+        "subscription_pk": subscription.pk,
+        "telegram_username": subscription.customer.telegram_username,
+        "subscription_plan": subscription.plan.period,
+        "subscription_price": subscription.plan.price,
+        "payment_id": subscription.payment_id,
+        "subscription_start_date": subscription.start_date.astimezone(
             MOSCOW_TZ
-        ).strftime("%d/%m/%Y %H:%M:%S")
+        ).strftime("%d/%m/%Y %H:%M:%S"),
+        "subscription_end_date": subscription.end_date.astimezone(
+            MOSCOW_TZ
+        ).strftime("%d/%m/%Y %H:%M:%S"),
+    }
+
+
+def _delete_event(values: dict) -> AdminEvent:
+    def render(admin: TelegramUser) -> str:
+        return TelegramMessageSender.create_message_about_delete_user(
+            admin_of_group=admin.telegram_username,
+            telegram_username=values["telegram_username"],
+            subscription_start_date=values["subscription_start_date"],
+            subscription_end_date=values["subscription_end_date"],
+            subscription_plan=values["subscription_plan"],
+            subscription_price=values["subscription_price"],
+            payment_id=values["payment_id"],
+        )
+
+    return AdminEvent(
+        key=values["subscription_pk"],
+        summary=(
+            f"@{values['telegram_username']} — {values['subscription_plan']}, "
+            f"{values['subscription_price']} USD, expired {values['subscription_end_date']}, "
+            f"payment {values['payment_id']}"
+        ),
+        render=render,
+    )
 
-        try:
-            reminder_message = TelegramMessageSender.create_message_about_reminder(
-                telegram_username=customer.telegram_username,
-                day=days,
-                syntax_word=syntax_word,
-            )
 
-            subscription_data_message = (
-                TelegramMessageSender.create_message_with_subscription_data(
-                    telegram_username=customer.telegram_username,
-                    subscription_plan=subscription.plan.period,
-                    subscription_start_date=subscription_start_date,
-                    subscription_end_date=subscription_end_date,
-                    subscription_price=subscription.plan.price,
-                )
-            )
+def _reminder_window(now, reminders: dict) -> Q:
+    window = Q()
+    for days in reminders:
+        start = now + timedelta(days=days)
+        window |= Q(end_date__gte=start, end_date__lt=start + timedelta(days=1))
+    return window
 
-            photo_response = TelegramMessageSender.send_message_with_photo_to_chat(
-                chat_id=customer.chat_id,
-                message=reminder_message,
-                photo_path=os.path.join(settings.MEDIA_ROOT, image),
+
+def _configured_reminders() -> dict:
+    return {reminder["days"]: reminder for reminder in settings.SUBSCRIPTION_REMINDERS}
+
+
+@shared_task
+def notify_about_expiring_subscriptions() -> None:
+    """
+    Sends every configured reminder (SUBSCRIPTION_REMINDERS). The
+    subscriptions in any reminder window are split into chunks that workers
+    handle in parallel; finish_reminder_run notifies the admins.
+    """
+    reminders = _configured_reminders()
+    if not reminders:
+        return
+
+    now = timezone.now()
+    chunks = _fan_out(
+        Subscription.objects.filter(_reminder_window(now, reminders)),
+        send_reminder_chunk,
+        finish_reminder_run,
+        now,
+    )
+    print(f"[REMINDER TASK] Queued {chunks} chunks")
+
+
+@shared_task(bind=True, max_retries=3)
+def send_reminder_chunk(self, now: str, after, until) -> dict:
+    now = datetime.fromisoformat(now)
+    reminders = _configured_reminders()
+
+    try:
+        subscriptions = (
+            Subscription.objects
+            .select_related("customer", "plan")
+            .filter(_reminder_window(now, reminders))
+            .in_id_range(after, until)
+        )
+
+        due = []
+        for subscription in subscriptions:
+            reminder = reminders.get((subscription.end_date - now).days)
+            if reminder is not None:
+                due.append((subscription, reminder))
+    except Exception as e:
+        return _chunk_failed(self, e, "REMINDER TASK", after, until)
+
+    # Not retried past this point, so nobody gets the same reminder twice.
+    return {"total": len(due), "events": _send_reminders(due)}
+
+
+@shared_task
+def finish_reminder_run(results: List[dict], now: str) -> None:
+    notifier = AdminNotifier(title="🔔 Reminders sent")
+    for result in results:
+        for values in result["events"]:
+            notifier.add(_reminder_event(**values))
+
+    _notify_admins(notifier, "REMINDER TASK")
+
+    total = sum(result["total"] for result in results)
+    failed = [result["failed"] for result in results if result.get("failed")]
+    print(
+        f"[REMINDER TASK] Sent {len(notifier.events)}/{total} reminders in "
+        f"{len(results)} chunks, failed chunks: {failed}. "
+        f"Telegram transport: {get_transport().stats.as_dict()}"
+    )
+
+
+def _send_reminders(due: List[Tuple[Subscription, dict]]) -> List[dict]:
+    """
+    Sends the reminders and returns the values of the ones delivered (see
+    _reminder_event).
+    """
+    buckets = {}
+    jobs = []
+
+    for subscription, reminder in due:
+        buckets[subscription.pk] = (subscription.customer.telegram_username, reminder["days"])
+        jobs.append(_reminder_job(subscription, reminder))
+
+    results = TelegramMessageSender.send_batch(jobs)
+    sent = []
+
+    for subscription_pk, result in results.items():
+        telegram_username, days = buckets[subscription_pk]
+
+        if not result.ok:
+            print(
+                f"[REMINDER {days}D ERROR] User @{telegram_username}: {result.error}"
             )
+            continue
+
+        sent.append({
+            "subscription_pk": subscription_pk,
+            "telegram_username": telegram_username,
+            "days": days,
+        })
+
+    return sent
+
 
-            text_response = TelegramMessageSender.send_message_to_chat(
+def _reminder_job(subscription: Subscription, reminder: dict) -> DeliveryJob:
+    customer = subscription.customer
+
+    subscription_start_date = subscription.start_date.astimezone(
+        MOSCOW_TZ
+    ).strftime("%d/%m/%Y %H:%M:%S")
+
+    subscription_end_date = subscription.end_date.astimezone(
+        MOSCOW_TZ
+    ).strftime("%d/%m/%Y %H:%M:%S")
+
+    reminder_message = TelegramMessageSender.create_message_about_reminder(
+        telegram_username=customer.telegram_username,
+        day=reminder["days"],
+        syntax_word=reminder["syntax_word"],
+    )
+
+    subscription_data_message = (
+        TelegramMessageSender.create_message_with_subscription_data(
+            telegram_username=customer.telegram_username,
+            subscription_plan=subscription.plan.period,
+            subscription_start_date=subscription_start_date,
+            subscription_end_date=subscription_end_date,
+            subscription_price=subscription.plan.price,
+        )
+    )
+
+    # The photo and the details go out in one job so they stay in order.
+    return DeliveryJob(
+        key=subscription.pk,
+        chat_id=customer.chat_id,
+        messages=[
+            OutgoingMessage(
                 chat_id=customer.chat_id,
-                message=subscription_data_message,
-            )
+                text=reminder_message,
+                photo_path=os.path.join(settings.MEDIA_ROOT, reminder["image"]),
+            ),
+            OutgoingMessage(
+                chat_id=customer.chat_id,
+                text=subscription_data_message,
+            ),
+        ],
+    )
+
+
+def _reminder_event(subscription_pk: int, telegram_username: str, days: int) -> AdminEvent:
+    return AdminEvent(
+        key=subscription_pk,
+        summary=f"@{telegram_username} — {days} days left",
+        render=lambda admin: (
+            f"Hi, {admin.telegram_username}!\n\n"
+            f"Reminder ({days} days) sent to "
+            f"@{telegram_username}"
+        ),
+    )
+
 
-            if photo_response.status_code == 200 and text_response.status_code == 200:
-                for admin in admins_of_group:
-                    TelegramMessageSender.send_message_to_chat(
-                        chat_id=admin.chat_id,
-                        message=(
-                            f"Hi, {admin.telegram_username}!\n\n"
-                            f"Reminder ({days} days) sent to "
-                            f"@{customer.telegram_username}"
-                        ),
-                    )
+@shared_task
+def process_due_subscription_events() -> None:
+    """
+    Scheduler tick: handles the expiries and reminders whose time has come,
+    as recorded in the subscription_events sorted set.
+    """
+    scheduler = get_scheduler()
+    reminders = _configured_reminders()
+
+    if scheduler.is_empty():
+        # First deploy, or Redis lost the set (it is not persisted). An
+        # active subscription always has its expiry in the set, so an empty
+        # set is only right when there are no subscriptions.
+        rebuild_subscription_schedule()
+
+    expiry_notifier = AdminNotifier(title="🔴 Delete from private group")
+    reminder_notifier = AdminNotifier(title="🔔 Reminders sent")
+
+    while True:
+        now = timezone.now()
+        events = scheduler.pop_due(now, limit=settings.SUBSCRIPTION_SCAN_CHUNK_SIZE)
+        if not events:
+            break
 
+        try:
+            if events.expire:
+                for values in _expire_subscriptions(now, events.expire):
+                    expiry_notifier.add(_delete_event(values))
+            events.expire_handled()
+
+            for days, pks in events.remind.items():
+                reminder = reminders.get(days)
+                if reminder is None:
+                    events.remind_handled(days)
+                    continue
+
+                # Skip events that went stale: the subscription was renewed,
+                # or the tick ran so late that a later reminder applies instead.
+                subscriptions = Subscription.objects.select_related("customer", "plan").filter(
+                    pk__in=pks,
+                    end_date__gt=now + timedelta(days=days) - REMINDER_GRACE,
+                    end_date__lte=now + timedelta(days=days, minutes=5),
+                )
+                due = [(subscription, reminder) for subscription in subscriptions]
+                for values in _send_reminders(due):
+                    reminder_notifier.add(_reminder_event(**values))
+                # Sent reminders must not be put back if a later bucket fails
+                events.remind_handled(days)
         except Exception as e:
-            print(
-                f"[REMINDER {days}D ERROR] User @{customer.telegram_username}: {str(e)}"
-            )
+            print(f"[SCHEDULER ERROR] {str(e)}")
+            scheduler.retry_later(events)
+            break
+
+        if len(events) < settings.SUBSCRIPTION_SCAN_CHUNK_SIZE:
+            break
+
+    _notify_admins(expiry_notifier, "DELETE TASK")
+    _notify_admins(reminder_notifier, "REMINDER TASK")
+
+
+@shared_task
+def rebuild_subscription_schedule() -> None:
+    """
+    Re-adds the events of every subscription to the scheduler. Safe to run at
+    any time; it repairs events missed by bulk updates or a Redis outage.
+    Runs hourly, and from the tick whenever the schedule is empty.
+    """
+    scheduler = get_scheduler()
+    now = timezone.now()
+    total = 0
+
+    subscriptions = Subscription.objects.only("id", "end_date")
+
+    for chunk in subscriptions.keyset_chunks(settings.SUBSCRIPTION_SCAN_CHUNK_SIZE):
+        scheduler.schedule_many(((s.pk, s.end_date) for s in chunk), now=now)
+        total += len(chunk)
+
+    print(f"[SCHEDULER] Rebuilt events for {total} subscriptions")
@@ -0,0 +1,165 @@
+import threading
+from typing import Optional, Tuple
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import httpx
+except ImportError:  # HTTP/2 support is optional
+    httpx = None
+
+
+class TransportStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def request_sent(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def connection_opened(self) -> None:
+        with self._lock:
+            self.connections_opened += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": max(0, self.requests - self.connections_opened),
+            }
+
+
+def _counting_pool(base, stats: TransportStats):
+    class CountingConnectionPool(base):
+        def _new_conn(self):
+            stats.connection_opened()
+            return super()._new_conn()
+
+    return CountingConnectionPool
+
+
+class TelegramTransport:
+    """
+    Keep-alive HTTP client for the Bot API, shared by everything in a process.
+
+    Uses a pooled requests.Session by default, or an HTTP/2 httpx client when
+    http2 is enabled and httpx is installed.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str],
+        base_url: str = "https://api.telegram.org",
+        pool_size: int = 32,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        http2: bool = False,
+    ):
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.stats = TransportStats()
+        self.http2 = bool(http2 and httpx is not None)
+
+        if self.http2:
+            self._client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                ),
+            )
+        else:
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=pool_size,
+                pool_block=True,
+            )
+            adapter.poolmanager.pool_classes_by_scheme = {
+                "http": _counting_pool(HTTPConnectionPool, self.stats),
+                "https": _counting_pool(HTTPSConnectionPool, self.stats),
+            }
+            self._client = requests.Session()
+            self._client.mount("http://", adapter)
+            self._client.mount("https://", adapter)
+
+    def url(self, method: str) -> str:
+        return f"{self.base_url}/bot{self.token}/{method}"
+
+    def post(self, method: str, timeout: Optional[Tuple[float, float]] = None, **kwargs):
+        return self._request("POST", method, timeout, **kwargs)
+
+    def get(self, method: str, timeout: Optional[Tuple[float, float]] = None, **kwargs):
+        return self._request("GET", method, timeout, **kwargs)
+
+    def _request(self, http_method: str, method: str, timeout, **kwargs):
+        connect_timeout, read_timeout = timeout or self.timeout
+        self.stats.request_sent()
+
+        if self.http2:
+            return self._client.request(
+                http_method,
+                self.url(method),
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                extensions={"trace": self._trace},
+                **kwargs,
+            )
+
+        return self._client.request(
+            http_method,
+            self.url(method),
+            timeout=(connect_timeout, read_timeout),
+            **kwargs,
+        )
+
+    def _trace(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.connection_opened()
+
+    def close(self) -> None:
+        self._client.close()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> TelegramTransport:
+    """
+    Returns the process-wide transport, creating it on first use so that
+    forked Celery workers each open their own connections.
+    """
+    global _transport
+
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = TelegramTransport(
+                    token=settings.TELEGRAM_BOT_TOKEN,
+                    base_url=settings.TELEGRAM_API_BASE_URL,
+                    pool_size=settings.TELEGRAM_HTTP_POOL_SIZE,
+                    connect_timeout=settings.TELEGRAM_CONNECT_TIMEOUT,
+                    read_timeout=settings.TELEGRAM_READ_TIMEOUT,
+                    http2=settings.TELEGRAM_HTTP2,
+                )
+
+    return _transport
+
+
+def reset_transport() -> None:
+    """
+    Closes the process-wide transport, so the next get_transport() picks up
+    changed settings (e.g. TELEGRAM_API_BASE_URL pointing at a fake server).
+    """
+    global _transport
+
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = None
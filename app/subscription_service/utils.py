@@ -1,13 +1,17 @@
 import os
-from typing import Union
+import time
+from typing import Dict, Hashable, Iterable, List, Optional, Union
 import requests
+from django.conf import settings
 
+from .delivery import DeliveryEngine, DeliveryJob, DeliveryResult, OutgoingMessage
+from .media_cache import TelegramFileIdCache
 from .models import TelegramUser
+from .rate_limit import get_rate_limiter, get_retry_after
+from .transport import get_transport
 
 
 class TelegramMessageSender:
-    TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
-
     # =========================
     # TELEGRAM SENDERS
     # =========================
@@ -18,23 +22,28 @@ class TelegramMessageSender:
         message: str,
         chat_id: Union[int, str],
         reply_markup=None,
+        reschedule: bool = True,
     ) -> requests.Response:
         """
-        Sends a text message (supports inline keyboards).
+        Sends a text message (supports inline keyboards). If it is still
+        rate limited after the retries, it is rescheduled (see _reschedule)
+        and the 429 response is returned.
         """
-        url = f"https://api.telegram.org/bot{cls.TELEGRAM_BOT_TOKEN}/sendMessage"
-
         payload = {
             "chat_id": chat_id,
             "text": message,
         }
 
         if reply_markup:
-            payload["reply_markup"] = reply_markup.to_dict()
+            payload["reply_markup"] = (
+                reply_markup if isinstance(reply_markup, dict) else reply_markup.to_dict()
+            )
 
-        response = requests.post(url, json=payload)
+        response = cls._post("sendMessage", chat_id, json=payload)
 
-        if response.status_code != 200:
+        if response.status_code == 429 and reschedule:
+            cls._send_later(OutgoingMessage(chat_id=chat_id, text=message, reply_markup=reply_markup), response)
+        elif response.status_code != 200:
             print("Failed to send message:", response.text)
 
         return response
@@ -45,25 +54,160 @@ class TelegramMessageSender:
         message: str,
         photo_path: str,
         chat_id: Union[int, str],
+        reschedule: bool = True,
     ) -> requests.Response:
         """
         Sends a message with a photo attachment.
+        Reuses the Telegram file_id of an earlier upload of the same file.
+        Rescheduled like send_message_to_chat when still rate limited.
         """
-        url = f"https://api.telegram.org/bot{cls.TELEGRAM_BOT_TOKEN}/sendPhoto"
+        response = cls._send_photo(message, photo_path, chat_id)
+
+        if response.status_code == 429 and reschedule:
+            cls._send_later(OutgoingMessage(chat_id=chat_id, text=message, photo_path=photo_path), response)
+
+        return response
+
+    @classmethod
+    def _send_photo(cls, message: str, photo_path: str, chat_id: Union[int, str]) -> requests.Response:
+        params = {
+            "chat_id": chat_id,
+            "caption": message,
+        }
+
+        file_id = TelegramFileIdCache.get(photo_path)
+
+        if file_id:
+            response = cls._post("sendPhoto", chat_id, json={**params, "photo": file_id})
+
+            if response.status_code == 200:
+                return response
+
+            if not cls._is_file_id_rejected(response):
+                print("Failed to send message with photo:", response.text)
+                return response
+
+            TelegramFileIdCache.invalidate(photo_path)
 
         with open(photo_path, "rb") as photo:
-            files = {"photo": photo}
-            params = {
-                "chat_id": chat_id,
-                "caption": message,
-            }
-            response = requests.post(url, params=params, files=files)
+            files = {"photo": (os.path.basename(photo_path), photo.read())}
+
+        response = cls._post("sendPhoto", chat_id, params=params, files=files)
 
         if response.status_code != 200:
             print("Failed to send message with photo:", response.text)
+            return response
+
+        file_id = cls._extract_photo_file_id(response)
+        if file_id:
+            TelegramFileIdCache.set(photo_path, file_id)
 
         return response
 
+    @classmethod
+    def _post(cls, method: str, chat_id: Union[int, str], **kwargs) -> requests.Response:
+        """
+        Posts to the Bot API within the shared rate limits, waiting out
+        429 responses up to TELEGRAM_MAX_RETRIES times.
+        """
+        limiter = get_rate_limiter() if settings.TELEGRAM_RATE_LIMIT_ENABLED else None
+
+        for _ in range(settings.TELEGRAM_MAX_RETRIES + 1):
+            if limiter:
+                limiter.acquire(chat_id)
+
+            response = get_transport().post(method, **kwargs)
+
+            if response.status_code != 429:
+                return response
+
+            retry_after = get_retry_after(response)
+            print(f"Rate limited by Telegram in chat {chat_id}, retry after {retry_after}s")
+
+            if limiter:
+                limiter.pause_chat(chat_id, retry_after)
+            else:
+                time.sleep(retry_after)
+
+        return response
+
+    @staticmethod
+    def _is_file_id_rejected(response: requests.Response) -> bool:
+        return response.status_code == 400 and "file" in response.text.lower()
+
+    @staticmethod
+    def _extract_photo_file_id(response: requests.Response) -> Optional[str]:
+        try:
+            # Telegram returns every generated size; the last one is the original.
+            return response.json()["result"]["photo"][-1]["file_id"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return None
+
+    @classmethod
+    def send_message(cls, message: OutgoingMessage) -> requests.Response:
+        """
+        Sends an OutgoingMessage with the matching Bot API method. A 429 is
+        left to the caller; the delivery engine reschedules the whole job.
+        """
+        if message.photo_path:
+            return cls.send_message_with_photo_to_chat(
+                chat_id=message.chat_id,
+                message=message.text,
+                photo_path=message.photo_path,
+                reschedule=False,
+            )
+
+        return cls.send_message_to_chat(
+            chat_id=message.chat_id,
+            message=message.text,
+            reply_markup=message.reply_markup,
+            reschedule=False,
+        )
+
+    @classmethod
+    def send_batch(
+        cls,
+        jobs: Iterable[DeliveryJob],
+        concurrency: Optional[int] = None,
+    ) -> Dict[Hashable, DeliveryResult]:
+        """
+        Sends jobs concurrently, keeping message order within each chat.
+        Returns a DeliveryResult per job key.
+        """
+        engine = DeliveryEngine(
+            send=cls.send_message,
+            concurrency=concurrency,
+            reschedule=cls._reschedule,
+        )
+        return engine.deliver(jobs)
+
+    @classmethod
+    def _reschedule(
+        cls,
+        messages: List[OutgoingMessage],
+        response: requests.Response,
+    ) -> None:
+        """
+        Hands messages that are still rate limited after all retries to a
+        Celery task that sends them once retry_after has passed.
+        """
+        from .tasks import send_telegram_messages
+
+        send_telegram_messages.apply_async(
+            args=[[message.to_dict() for message in messages]],
+            countdown=get_retry_after(response),
+        )
+
+    @classmethod
+    def _send_later(cls, message: OutgoingMessage, response: requests.Response) -> None:
+        try:
+            cls._reschedule([message], response)
+        except Exception as e:
+            print(f"Failed to reschedule rate limited message to chat {message.chat_id}: {str(e)}")
+            return
+
+        print(f"Still rate limited in chat {message.chat_id}, rescheduled")
+
     # =========================
     # MESSAGE BUILDERS
     # =========================
@@ -211,3 +355,22 @@ class TelegramMessageSender:
             )
 
         return ""
+
+    @classmethod
+    def create_message_with_checkout_link(
+        cls,
+        subscription_plan: str,
+        subscription_price: int,
+        checkout_url: str,
+    ) -> str:
+        return (
+            "✅ You selected:\n\n"
+            f"📦 Plan: {subscription_plan}\n"
+            f"💰 Price: ${subscription_price}\n\n"
+            "👉 Click below to pay securely:\n"
+            f"{checkout_url}\n\n"
+            "💳 Test card:\n"
+            "4242 4242 4242 4242\n"
+            "Any future expiry • Any CVC\n\n"
+            "⏳ After payment, use /verify to confirm access."
+        )
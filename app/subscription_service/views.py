@@ -1,11 +1,14 @@
+import json
+
 import stripe
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
 
-from subscription_service.models import Plan, Subscription, TelegramUser
-from subscription_service.utils import TelegramMessageSender
+from subscription_service.dedupe import get_stripe_event_deduplicator
+from subscription_service.models import StripeEvent
+from subscription_service.tasks import fulfill_stripe_event
 
 # ✅ REQUIRED
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -24,6 +27,46 @@ def stripe_webhook(request):
         print("❌ SIGNATURE FAILED:", str(e))
         return HttpResponse(status=400)
 
-    print("🔥 STRIPE WEBHOOK HIT 🔥", event["type"])
+    # Stripe delivers at least once and retries slow responses; repeats of
+    # events already claimed are answered here without touching the
+    # database.
+    deduplicator = get_stripe_event_deduplicator()
+    if not deduplicator.claim(event["id"]):
+        return HttpResponse(status=200)
+
+    # Only store the event here and answer right away; the fulfillment task
+    # does the actual work.
+    try:
+        with transaction.atomic():
+            stripe_event = StripeEvent.objects.create(
+                event_id=event["id"],
+                type=event["type"],
+                payload=json.loads(payload),
+            )
+    except IntegrityError:
+        # Stored before, but Redis doesn't know: it was down, or the claim
+        # was released or expired. If it was never fulfilled (queueing
+        # failed or the task gave up), queue it again.
+        deduplicator.count(hit=True)
+        stored = StripeEvent.objects.filter(event_id=event["id"], processed_at__isnull=True).first()
+        if stored is not None:
+            fulfill_stripe_event.delay(stored.pk)
+        deduplicator.remember(event["id"])
+        return HttpResponse(status=200)
+    except Exception:
+        # Let Stripe's retry through
+        deduplicator.release(event["id"])
+        raise
+
+    def queue_fulfillment():
+        try:
+            fulfill_stripe_event.delay(stripe_event.pk)
+        except Exception:
+            # Stored but not queued: Stripe's retry, or the sweeper, queues it
+            deduplicator.release(event["id"])
+            raise
+        deduplicator.remember(event["id"])
+
+    transaction.on_commit(queue_fulfillment)
 
-    return HttpResponse(status=200)
\ No newline at end of file
+    return HttpResponse(status=200)
@@ -0,0 +1,121 @@
+import time
+from typing import Callable, Optional
+
+from django.core.cache import cache
+
+OFFSET_KEY = "telegram:update_offset"
+
+# How long a claim on an update lasts. Longer than any handler should run,
+# so a claim left behind by a crashed process expires and the update is
+# handled again.
+PROCESSING_TTL = 60
+
+# How long handled update_ids are remembered. Telegram keeps unconfirmed
+# updates for 24 hours, so nothing older can come back.
+DONE_TTL = 60 * 60 * 24
+
+PROCESSING = "processing"
+DONE = "done"
+
+HANDLED = "handled"
+DUPLICATE = "duplicate"
+IN_PROGRESS = "in_progress"
+
+
+class OffsetCheckpoint:
+    """
+    Keeps the poller's getUpdates offset in the cache, so a restarted bot
+    resumes where the previous process stopped.
+
+    The offset is written in batches, every `every` updates or `interval`
+    seconds. After a crash the updates since the last write are fetched
+    again; the per-update claims below make handling them a no-op.
+    """
+
+    def __init__(self, key: str = OFFSET_KEY, every: int = 50, interval: float = 5):
+        self.key = key
+        self.every = every
+        self.interval = interval
+        self._saved = None
+        self._saved_at = 0.0
+
+    def load(self) -> int:
+        self._saved = cache.get(self.key) or 0
+        self._saved_at = time.monotonic()
+        return self._saved
+
+    def save(self, offset: int, force: bool = False) -> bool:
+        """
+        Stores offset if the batch is full, the interval passed or force is
+        set. Returns whether it was written.
+        """
+        if offset == self._saved:
+            return False
+
+        due = (
+            force
+            or self._saved is None
+            or offset - self._saved >= self.every
+            or time.monotonic() - self._saved_at >= self.interval
+        )
+        if not due:
+            return False
+
+        cache.set(self.key, offset, timeout=None)
+        self._saved = offset
+        self._saved_at = time.monotonic()
+        return True
+
+
+class UpdateLedger:
+    """
+    Idempotency keys per update_id: an update is claimed before it is
+    handled and marked done afterwards, so an update delivered twice (a
+    resumed poller, a webhook redelivery) is only handled once.
+    """
+
+    def key(self, update_id: int) -> str:
+        return f"telegram:update:{update_id}"
+
+    def claim(self, update_id: int) -> bool:
+        return cache.add(self.key(update_id), PROCESSING, timeout=PROCESSING_TTL)
+
+    def state(self, update_id: int) -> Optional[str]:
+        return cache.get(self.key(update_id))
+
+    def done(self, update_id: int) -> None:
+        cache.set(self.key(update_id), DONE, timeout=DONE_TTL)
+
+    def release(self, update_id: int) -> None:
+        cache.delete(self.key(update_id))
+
+
+ledger = UpdateLedger()
+
+
+def handle_once(update: dict, handler: Callable[[dict], None], wait: float = 0) -> str:
+    """
+    Runs handler for the update unless it was handled already.
+
+    If another process holds the claim, waits up to `wait` seconds for it
+    to finish or expire, then returns IN_PROGRESS. A failing handler gives
+    up its claim so the update can be handled again.
+    """
+    update_id = update["update_id"]
+    deadline = time.monotonic() + wait
+
+    while not ledger.claim(update_id):
+        if ledger.state(update_id) == DONE:
+            return DUPLICATE
+        if time.monotonic() >= deadline:
+            return IN_PROGRESS
+        time.sleep(0.5)
+
+    try:
+        handler(update)
+    except Exception:
+        ledger.release(update_id)
+        raise
+
+    ledger.done(update_id)
+    return HANDLED
@@ -0,0 +1,197 @@
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+
+def get_chat_id(update: dict):
+    if "message" in update:
+        return update["message"]["chat"]["id"]
+    if "callback_query" in update:
+        return update["callback_query"]["message"]["chat"]["id"]
+    return None
+
+
+class UpdateDispatcher:
+    """
+    Runs update handlers on a pool of worker threads.
+
+    Updates from the same chat are handled one at a time, in the order they
+    arrived; different chats run in parallel. At most `max_pending` updates
+    are held at once, and submit() blocks while the dispatcher is full.
+
+    `committed_offset` only moves past an update once it and every update
+    before it are done, so it is always safe to confirm to Telegram. An
+    update whose handler raises is parked instead: the offset stays in
+    front of it, Telegram returns it on the next getUpdates, and submit()
+    takes it again once its retry delay (doubling per attempt, up to
+    `max_retry_delay`) has passed.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[dict], None],
+        workers: int = 8,
+        max_pending: int = 200,
+        offset: int = 0,
+        retry_delay: float = 1,
+        max_retry_delay: float = 60,
+    ):
+        self.handler = handler
+        self.max_pending = max_pending
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._condition = threading.Condition()
+        # update_id -> done; insertion order is update_id order
+        self._pending = {}
+        # update_id -> failed attempts, and when parked updates may run again
+        self._attempts = {}
+        self._retry_at = {}
+        self._lanes = {}
+        self._ready = queue.Queue()
+        self._committed_offset = offset
+        self._progress = 0
+
+        self._handled = 0
+        self._failed = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._latencies = deque(maxlen=1000)
+
+        self._threads = [
+            threading.Thread(target=self._work, name=f"update-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def committed_offset(self) -> int:
+        with self._condition:
+            return self._committed_offset
+
+    def submit(self, update: dict, timeout: Optional[float] = None) -> bool:
+        """
+        Queues an update. Returns False if it is already queued or done, or
+        parked and not due for another attempt yet.
+        """
+        update_id = update["update_id"]
+
+        with self._condition:
+            if update_id < self._committed_offset:
+                return False
+
+            if update_id in self._pending:
+                retry_at = self._retry_at.get(update_id)
+                if retry_at is None or time.monotonic() < retry_at:
+                    return False
+
+                del self._retry_at[update_id]
+                self._enqueue(update)
+                return True
+
+            if not self._condition.wait_for(
+                lambda: len(self._pending) < self.max_pending, timeout=timeout
+            ):
+                raise TimeoutError("update dispatcher is full")
+
+            self._pending[update_id] = False
+            self._enqueue(update)
+
+        return True
+
+    def wait_for_progress(self, timeout: float) -> None:
+        """
+        Blocks until some update finishes or timeout passes.
+        """
+        with self._condition:
+            progress = self._progress
+            self._condition.wait_for(lambda: self._progress != progress, timeout=timeout)
+
+    def stats(self) -> dict:
+        with self._condition:
+            latencies = sorted(self._latencies)
+            return {
+                "queue_depth": sum(1 for done in self._pending.values() if not done),
+                "parked": len(self._retry_at),
+                "committed_offset": self._committed_offset,
+                "handled": self._handled,
+                "failed": self._failed,
+                "latency_avg_ms": round(1000 * self._latency_total / self._handled, 1) if self._handled else 0,
+                "latency_p95_ms": round(1000 * latencies[int(len(latencies) * 0.95)], 1) if latencies else 0,
+                "latency_max_ms": round(1000 * self._latency_max, 1),
+            }
+
+    def stop(self) -> None:
+        for _ in self._threads:
+            self._ready.put(StopIteration)
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self) -> None:
+        while True:
+            chat_id = self._ready.get()
+            if chat_id is StopIteration:
+                return
+
+            with self._condition:
+                update = self._lanes[chat_id].popleft()
+
+            started = time.monotonic()
+            failed = False
+            try:
+                self.handler(update)
+            except Exception as e:
+                failed = True
+                print(f"⚠️ Update {update['update_id']} failed, parked for a retry: {e}")
+            latency = time.monotonic() - started
+
+            with self._condition:
+                self._finish(update["update_id"], latency, failed)
+
+                # Hand the chat back to the queue instead of draining it here,
+                # so one busy chat cannot hold a worker forever.
+                if self._lanes[chat_id]:
+                    self._ready.put(chat_id)
+                else:
+                    del self._lanes[chat_id]
+
+                self._condition.notify_all()
+
+    def _enqueue(self, update: dict) -> None:
+        chat_id = get_chat_id(update)
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            self._lanes[chat_id] = deque([update])
+            self._ready.put(chat_id)
+        else:
+            lane.append(update)
+
+    def _finish(self, update_id: int, latency: float, failed: bool) -> None:
+        self._progress += 1
+        self._handled += 1
+        self._failed += int(failed)
+        self._latency_total += latency
+        self._latency_max = max(self._latency_max, latency)
+        self._latencies.append(latency)
+
+        if failed:
+            # Leave it pending, so the offset stops in front of it
+            attempts = self._attempts.get(update_id, 0) + 1
+            self._attempts[update_id] = attempts
+            self._retry_at[update_id] = time.monotonic() + min(
+                self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay
+            )
+            return
+
+        self._pending[update_id] = True
+        self._attempts.pop(update_id, None)
+
+        while self._pending:
+            first_id = next(iter(self._pending))
+            if not self._pending[first_id]:
+                break
+            del self._pending[first_id]
+            self._committed_offset = first_id + 1
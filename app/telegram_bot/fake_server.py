@@ -0,0 +1,412 @@
+"""
+A fake Telegram Bot API server for load and integration tests.
+
+Implements sendMessage, sendPhoto, getUpdates and answerCallbackQuery over
+plain HTTP/1.1 with keep-alive, with configurable latency, error rate,
+random 429s and per-chat / global rate limits. Point TELEGRAM_API_BASE_URL
+at it:
+
+    python -m telegram_bot.fake_server --port 8081 --latency 0.05 --per-chat-rate 1
+
+Besides the Bot API it serves GET /_fake/stats (counters) and
+POST /_fake/updates (queue an update for getUpdates).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from dataclasses import asdict, dataclass
+from email.parser import BytesParser
+from email.policy import HTTP
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+# Longest a getUpdates call may wait for updates, whatever timeout it asks for
+MAX_POLL_TIMEOUT = 50
+
+
+@dataclass
+class FakeBotConfig:
+    latency: float = 0.0  # seconds added to every Bot API call
+    jitter: float = 0.0  # up to this many seconds added on top, at random
+    error_rate: float = 0.0  # share of calls answered with 500
+    flood_rate: float = 0.0  # share of sends answered with 429 at random
+    retry_after: int = 1  # retry_after of random 429s
+    per_chat_rate: Optional[float] = None  # sends per second and chat before 429
+    global_rate: Optional[float] = None  # sends per second overall before 429
+    seed: Optional[int] = None
+
+
+def _error(status: int, description: str, retry_after: Optional[int] = None) -> Tuple[int, dict]:
+    body = {"ok": False, "error_code": status, "description": description}
+    if retry_after is not None:
+        body["parameters"] = {"retry_after": retry_after}
+    return status, body
+
+
+class FakeBotAPI:
+    """
+    The server itself. Every accepted message is kept in `messages`, every
+    answered call is counted in `calls` by (method, status).
+    """
+
+    SEND_METHODS = ("sendMessage", "sendPhoto")
+
+    def __init__(self, config: Optional[FakeBotConfig] = None):
+        self.config = config or FakeBotConfig()
+        self.random = random.Random(self.config.seed)
+
+        self.messages: List[dict] = []
+        self.calls: Counter = Counter()
+        self.latencies: List[float] = []
+
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._file_id_set = set()
+
+        self._updates: List[dict] = []
+        self._new_updates: Optional[asyncio.Condition] = None
+
+        self._chat_sends: Dict[str, deque] = defaultdict(deque)
+        self._global_sends: deque = deque()
+        self._blocked_until: Dict[str, float] = {}
+
+        self._server = None
+        self.port = None
+
+    # -----------------------
+    # LIFECYCLE
+    # -----------------------
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self._new_updates = asyncio.Condition()
+        self._server = await asyncio.start_server(self._serve_connection, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def push_update(self, update: dict) -> dict:
+        """
+        Queues an update for getUpdates; update_id is assigned if missing.
+        """
+        update = {"update_id": next(self._update_ids), **update}
+        async with self._new_updates:
+            self._updates.append(update)
+            self._new_updates.notify_all()
+        return update
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "messages": len(self.messages),
+            "calls": {f"{method} {status}": count for (method, status), count in sorted(self.calls.items())},
+            "latency_p50_ms": round(1000 * latencies[len(latencies) // 2], 2) if latencies else 0,
+            "pending_updates": len(self._updates),
+            "config": asdict(self.config),
+        }
+
+    # -----------------------
+    # HTTP
+    # -----------------------
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+
+                http_method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self._handle(http_method, target, headers, body)
+
+                data = json.dumps(payload).encode()
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(data)}\r\n"
+                        "\r\n"
+                    ).encode() + data
+                )
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, http_method: str, target: str, headers: dict, body: bytes) -> Tuple[int, dict]:
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        params.update(self._parse_body(headers.get("content-type", ""), body))
+
+        if url.path == "/_fake/stats":
+            return 200, self.stats()
+        if url.path == "/_fake/updates" and http_method == "POST":
+            return 200, {"ok": True, "result": await self.push_update(params)}
+
+        # /bot<token>/<method>
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            return _error(404, "Not Found")
+        method = parts[1]
+
+        started = time.monotonic()
+        status, payload = await self._call(method, params)
+        self.latencies.append(time.monotonic() - started)
+        self.calls[(method, status)] += 1
+
+        return status, payload
+
+    @staticmethod
+    def _parse_body(content_type: str, body: bytes) -> dict:
+        if not body:
+            return {}
+
+        if content_type.startswith("application/json"):
+            return json.loads(body)
+
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return dict(parse_qsl(body.decode()))
+
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + body
+            )
+            fields = {}
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if part.get_filename() is not None:
+                    fields[name] = {"filename": part.get_filename(), "size": len(part.get_payload(decode=True))}
+                else:
+                    fields[name] = part.get_content().strip()
+            return fields
+
+        return {}
+
+    # -----------------------
+    # BOT API
+    # -----------------------
+    async def _call(self, method: str, params: dict) -> Tuple[int, dict]:
+        if method == "getUpdates":
+            return await self._get_updates(params)
+
+        delay = self.config.latency + self.random.uniform(0, self.config.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.random.random() < self.config.error_rate:
+            return _error(500, "Internal Server Error")
+
+        if method == "answerCallbackQuery":
+            return 200, {"ok": True, "result": True}
+
+        if method not in self.SEND_METHODS:
+            return _error(404, "Not Found")
+
+        if "chat_id" not in params:
+            return _error(400, "Bad Request: chat_id is empty")
+
+        chat_id = str(params["chat_id"])
+        retry_after = self._throttle(chat_id)
+        if retry_after:
+            return _error(429, f"Too Many Requests: retry after {retry_after}", retry_after)
+
+        if method == "sendPhoto":
+            return self._send_photo(chat_id, params)
+        return self._send_message(chat_id, params)
+
+    def _throttle(self, chat_id: str) -> int:
+        """
+        Returns retry_after if the send must be refused, otherwise records it.
+        """
+        now = time.monotonic()
+
+        blocked_until = self._blocked_until.get(chat_id, 0)
+        if blocked_until > now:
+            return math.ceil(blocked_until - now)
+
+        if self.random.random() < self.config.flood_rate:
+            return self._block(chat_id, now, self.config.retry_after)
+
+        chat_sends = self._chat_sends[chat_id]
+        for sends in (chat_sends, self._global_sends):
+            while sends and sends[0] <= now - 1:
+                sends.popleft()
+
+        if self.config.per_chat_rate is not None and len(chat_sends) >= self.config.per_chat_rate:
+            return self._block(chat_id, now, math.ceil(chat_sends[0] + 1 - now))
+
+        if self.config.global_rate is not None and len(self._global_sends) >= self.config.global_rate:
+            return max(1, math.ceil(self._global_sends[0] + 1 - now))
+
+        chat_sends.append(now)
+        self._global_sends.append(now)
+        return 0
+
+    def _block(self, chat_id: str, now: float, retry_after: int) -> int:
+        # Like Telegram, a chat that got a 429 is refused until retry_after passes.
+        retry_after = max(1, retry_after)
+        self._blocked_until[chat_id] = now + retry_after
+        return retry_after
+
+    def _message(self, chat_id: str, **fields) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id) if chat_id.lstrip("-").isdigit() else chat_id},
+            **fields,
+        }
+        self.messages.append(message)
+        return message
+
+    def _send_message(self, chat_id: str, params: dict) -> Tuple[int, dict]:
+        if not params.get("text"):
+            return _error(400, "Bad Request: message text is empty")
+
+        fields = {"text": params["text"]}
+        if params.get("reply_markup"):
+            fields["reply_markup"] = params["reply_markup"]
+
+        return 200, {"ok": True, "result": self._message(chat_id, **fields)}
+
+    def _send_photo(self, chat_id: str, params: dict) -> Tuple[int, dict]:
+        photo = params.get("photo")
+
+        if isinstance(photo, dict):
+            file_id = f"fake-photo-{next(self._file_ids)}"
+            self._file_id_set.add(file_id)
+        elif photo in self._file_id_set:
+            file_id = photo
+        else:
+            return _error(400, "Bad Request: wrong file identifier/HTTP URL specified")
+
+        sizes = [
+            {"file_id": f"{file_id}-{size}", "file_unique_id": f"{file_id}-{size}", "width": size, "height": size}
+            for size in (90, 320)
+        ] + [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 800}]
+
+        return 200, {
+            "ok": True,
+            "result": self._message(chat_id, photo=sizes, caption=params.get("caption", "")),
+        }
+
+    async def _get_updates(self, params: dict) -> Tuple[int, dict]:
+        offset = int(params.get("offset", 0))
+        timeout = min(float(params.get("timeout", 0)), MAX_POLL_TIMEOUT)
+
+        async with self._new_updates:
+            # Passing an offset confirms every update before it
+            self._updates = [update for update in self._updates if update["update_id"] >= offset]
+
+            if not self._updates and timeout:
+                try:
+                    await asyncio.wait_for(self._new_updates.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            limit = int(params.get("limit", 100))
+            return 200, {"ok": True, "result": self._updates[:limit]}
+
+
+class FakeBotServer:
+    """
+    Runs a FakeBotAPI on its own event loop in a background thread, for use
+    from synchronous code:
+
+        with FakeBotServer(FakeBotConfig(per_chat_rate=1)) as server:
+            settings.TELEGRAM_API_BASE_URL = server.base_url
+    """
+
+    def __init__(self, config: Optional[FakeBotConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.api = FakeBotAPI(config)
+        self.host = host
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fake-bot-api", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.api.port}"
+
+    def start(self) -> "FakeBotServer":
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.api.start(self.host, self.port), self._loop).result()
+        return self
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.api.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def push_update(self, update: dict) -> dict:
+        return asyncio.run_coroutine_threadsafe(self.api.push_update(update), self._loop).result()
+
+    def __enter__(self) -> "FakeBotServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--flood-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--per-chat-rate", type=float, default=None)
+    parser.add_argument("--global-rate", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeBotConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        flood_rate=args.flood_rate,
+        retry_after=args.retry_after,
+        per_chat_rate=args.per_chat_rate,
+        global_rate=args.global_rate,
+        seed=args.seed,
+    )
+
+    async def serve():
+        api = FakeBotAPI(config)
+        await api.start(args.host, args.port)
+        print(f"🤖 Fake Bot API on http://{args.host}:{api.port} — set TELEGRAM_API_BASE_URL to it")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
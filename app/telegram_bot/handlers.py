@@ -1,8 +1,11 @@
+from django.db import IntegrityError
 from django.utils import timezone
-from subscription_service.models import Plan, Subscription, TelegramUser
+from subscription_service.catalog import get_plan_catalog
+from subscription_service.models import Plan, TelegramUser
+from subscription_service.status_cache import SubscriptionStatusCache
 from subscription_service.utils import TelegramMessageSender
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from subscription_service.stripe_service import create_checkout_session
+from subscription_service.stripe_service import CheckoutSessionCache, get_ready_checkout_url
+from subscription_service.tasks import create_checkout_link
 
 
 def handle_start(chat_id, text=None):
@@ -20,31 +23,21 @@ def handle_start(chat_id, text=None):
             )
         )
 
-    plans = Plan.objects.all()
+    # Plans and the keyboard come from the in-process catalog, so a /start
+    # normally costs no database query.
+    catalog = get_plan_catalog().get()
 
-    if not plans.exists():
+    if not catalog.plans:
         TelegramMessageSender.send_message_to_chat(
             chat_id=chat_id,
             message="⚠️ No subscription plans available right now."
         )
         return
 
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                text=f"{plan.period} — ${plan.price}",
-                callback_data=f"PLAN_{plan.id}",
-            )
-        ]
-        for plan in plans
-    ]
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     TelegramMessageSender.send_message_to_chat(
         chat_id=chat_id,
         message="💳 Available subscription plans:",
-        reply_markup=reply_markup,
+        reply_markup=catalog.keyboard,
     )
 
 
@@ -53,18 +46,17 @@ def handle_verify(chat_id):
     /verify command
     """
 
-    try:
-        user = TelegramUser.objects.get(chat_id=chat_id)
-    except TelegramUser.DoesNotExist:
+    # Served from the status cache; a miss costs one joined query.
+    status = SubscriptionStatusCache.get(chat_id)
+
+    if not status.registered:
         TelegramMessageSender.send_message_to_chat(
             chat_id=chat_id,
             message="⚠️ You have never purchased a subscription."
         )
         return
 
-    try:
-        subscription = Subscription.objects.get(customer=user)
-    except Subscription.DoesNotExist:
+    if status.end_date is None:
         TelegramMessageSender.send_message_to_chat(
             chat_id=chat_id,
             message="⚠️ No active subscription found."
@@ -73,13 +65,13 @@ def handle_verify(chat_id):
 
     now = timezone.now()
 
-    if subscription.end_date >= now:
+    if status.end_date >= now:
         TelegramMessageSender.send_message_to_chat(
             chat_id=chat_id,
             message=(
                 "✅ Subscription ACTIVE\n\n"
-                f"📦 Plan: {subscription.plan.period}\n"
-                f"⏳ Valid till: {subscription.end_date.strftime('%d %b %Y, %H:%M')}\n\n"
+                f"📦 Plan: {status.plan}\n"
+                f"⏳ Valid till: {status.end_date.strftime('%d %b %Y, %H:%M')}\n\n"
                 "You have full access 🎉"
             )
         )
@@ -88,30 +80,57 @@ def handle_verify(chat_id):
             chat_id=chat_id,
             message=(
                 "❌ Subscription EXPIRED\n\n"
-                f"📦 Plan: {subscription.plan.period}\n"
-                f"⏰ Expired on: {subscription.end_date.strftime('%d %b %Y, %H:%M')}\n\n"
+                f"📦 Plan: {status.plan}\n"
+                f"⏰ Expired on: {status.end_date.strftime('%d %b %Y, %H:%M')}\n\n"
                 "Please renew your subscription."
             )
         )
 
 
-def handle_plan_selected(chat_id, plan_id):
+def remember_customer(chat_id, username=None):
+    """
+    Creates the user, or updates their username, before they pay: Stripe
+    only hands back the chat id, and admins are told the @username.
+    """
+    telegram_username = username or str(chat_id)
+
+    try:
+        customer, created = TelegramUser.objects.get_or_create(
+            chat_id=chat_id,
+            defaults={"telegram_username": telegram_username},
+        )
+        if not created and username and customer.telegram_username != username:
+            customer.telegram_username = username
+            customer.save(update_fields=["telegram_username"])
+    except IntegrityError as e:
+        # Usernames are unique; one taken over from another account must not
+        # stop the payment link.
+        print(f"[CUSTOMER ERROR] Chat {chat_id}, @{telegram_username}: {str(e)}")
+
+
+def handle_plan_selected(chat_id, plan_id, username=None):
     plan = Plan.objects.get(id=plan_id)
-    checkout_url = create_checkout_session(plan, chat_id)
-
-    message = (
-        "✅ You selected:\n\n"
-        f"📦 Plan: {plan.period}\n"
-        f"💰 Price: ${plan.price}\n\n"
-        "👉 Click below to pay securely:\n"
-        f"{checkout_url}\n\n"
-        "💳 Test card:\n"
-        "4242 4242 4242 4242\n"
-        "Any future expiry • Any CVC\n\n"
-        "⏳ After payment, use /verify to confirm access."
-    )
+    remember_customer(chat_id, username)
+    checkout_url = get_ready_checkout_url(plan, chat_id)
+
+    if checkout_url:
+        TelegramMessageSender.send_message_to_chat(
+            chat_id=chat_id,
+            message=TelegramMessageSender.create_message_with_checkout_link(
+                subscription_plan=plan.period,
+                subscription_price=plan.price,
+                checkout_url=checkout_url,
+            ),
+        )
+        return
 
+    # Creating a session means a round-trip to Stripe; a worker does it and
+    # sends the link, so this update doesn't hold up everyone else's. The
+    # placeholder goes out first so it can't arrive after the link.
     TelegramMessageSender.send_message_to_chat(
         chat_id=chat_id,
-        message=message,
+        message="⏳ Preparing your payment link...",
     )
+
+    if CheckoutSessionCache.claim_pending(chat_id, plan.id):
+        create_checkout_link.delay(chat_id, plan.id)
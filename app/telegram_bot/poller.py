@@ -1,71 +1,90 @@
 import os
+import signal
 import time
 import django
-import requests
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 django.setup()
 
-from telegram_bot.handlers import (
-    handle_start,
-    handle_plan_selected,
-    handle_verify,
-)
+from django.conf import settings
+from django.db import close_old_connections
+from subscription_service.transport import get_transport
+from telegram_bot.checkpoints import IN_PROGRESS, PROCESSING_TTL, OffsetCheckpoint, handle_once
+from telegram_bot.dispatcher import UpdateDispatcher
+from telegram_bot.router import handle_update
 
-TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
-BASE_URL = f"https://api.telegram.org/bot{TOKEN}"
+STATS_INTERVAL = 60
+
+
+def handle_update_in_worker(update):
+    # Worker threads are long-lived, so treat every update like a request.
+    close_old_connections()
+    try:
+        # A claim left by a process that died mid-update expires after
+        # PROCESSING_TTL; wait that long rather than dropping the update.
+        if handle_once(update, handle_update, wait=PROCESSING_TTL) == IN_PROGRESS:
+            # Not confirmed yet: the dispatcher parks it and Telegram returns
+            # it again, in case the other process never finishes it.
+            raise RuntimeError("still claimed elsewhere")
+    finally:
+        close_old_connections()
+
+
+def stop_on_sigterm(signum, frame):
+    # Turn SIGTERM (rolling deploys) into SystemExit so the offset is saved.
+    raise SystemExit(0)
 
 
 def poll():
-    offset = 0
-
-    while True:
-        try:
-            resp = requests.get(
-                f"{BASE_URL}/getUpdates",
-                params={
-                    "offset": offset,
-                    "timeout": 50,   # Telegram long polling
-                },
-                timeout=70          # Requests timeout MUST be higher
-            )
-
-            data = resp.json()
-
-            for update in data.get("result", []):
-                offset = update["update_id"] + 1
-
-                # -----------------------
-                # MESSAGE HANDLING
-                # -----------------------
-                if "message" in update:
-                    msg = update["message"]
-                    chat_id = msg["chat"]["id"]
-                    text = msg.get("text", "").strip()
-
-                    if text.startswith("/start"):
-                        handle_start(chat_id, text)
-
-                    elif text == "/verify":
-                        handle_verify(chat_id)
-
-                # -----------------------
-                # CALLBACK HANDLING
-                # -----------------------
-                elif "callback_query" in update:
-                    cb = update["callback_query"]
-                    chat_id = cb["message"]["chat"]["id"]
-                    data = cb["data"]
-
-                    if data.startswith("PLAN_"):
-                        plan_id = int(data.split("_")[1])
-                        handle_plan_selected(chat_id, plan_id)
-
-        except Exception as e:
-            print(f"⚠️ Telegram poll error: {e}")
-            time.sleep(3)   # IMPORTANT backoff
-
-        time.sleep(1)
+    checkpoint = OffsetCheckpoint()
+    dispatcher = UpdateDispatcher(
+        handle_update_in_worker,
+        workers=settings.TELEGRAM_DISPATCH_WORKERS,
+        max_pending=settings.TELEGRAM_DISPATCH_MAX_PENDING,
+        offset=checkpoint.load(),
+    )
+    stats_logged_at = time.monotonic()
+
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+
+    try:
+        while True:
+            try:
+                # Only updates whose predecessors are all handled are confirmed;
+                # the rest come back and are skipped by the dispatcher, or
+                # retried if their handler failed.
+                resp = get_transport().get(
+                    "getUpdates",
+                    params={
+                        "offset": dispatcher.committed_offset,
+                        "timeout": 50,   # Telegram long polling
+                    },
+                    # Read timeout MUST be higher than the long polling timeout
+                    timeout=(settings.TELEGRAM_CONNECT_TIMEOUT, 70),
+                )
+
+                data = resp.json()
+
+                submitted = 0
+                for update in data.get("result", []):
+                    submitted += dispatcher.submit(update)
+
+                if data.get("result") and not submitted:
+                    # Everything returned is still in flight; wait for a handler
+                    # to finish instead of spinning on getUpdates.
+                    dispatcher.wait_for_progress(timeout=1)
+
+                checkpoint.save(dispatcher.committed_offset)
+
+            except Exception as e:
+                print(f"⚠️ Telegram poll error: {e}")
+                time.sleep(3)   # IMPORTANT backoff
+
+            if time.monotonic() - stats_logged_at >= STATS_INTERVAL:
+                print(f"📊 Dispatcher: {dispatcher.stats()}")
+                stats_logged_at = time.monotonic()
+    finally:
+        checkpoint.save(dispatcher.committed_offset, force=True)
 
 
 if __name__ == "__main__":
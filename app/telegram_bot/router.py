@@ -0,0 +1,38 @@
+from telegram_bot.handlers import (
+    handle_start,
+    handle_plan_selected,
+    handle_verify,
+)
+
+
+def handle_update(update: dict) -> None:
+    """
+    Routes one Telegram update to its handler. Shared by the long-polling
+    loop and the webhook endpoint.
+    """
+
+    # -----------------------
+    # MESSAGE HANDLING
+    # -----------------------
+    if "message" in update:
+        msg = update["message"]
+        chat_id = msg["chat"]["id"]
+        text = msg.get("text", "").strip()
+
+        if text.startswith("/start"):
+            handle_start(chat_id, text)
+
+        elif text == "/verify":
+            handle_verify(chat_id)
+
+    # -----------------------
+    # CALLBACK HANDLING
+    # -----------------------
+    elif "callback_query" in update:
+        cb = update["callback_query"]
+        chat_id = cb["message"]["chat"]["id"]
+        data = cb["data"]
+
+        if data.startswith("PLAN_"):
+            plan_id = int(data.split("_")[1])
+            handle_plan_selected(chat_id, plan_id, cb.get("from", {}).get("username"))
@@ -0,0 +1,42 @@
+import hmac
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from telegram_bot.checkpoints import IN_PROGRESS, handle_once
+from telegram_bot.router import handle_update
+
+
+@csrf_exempt
+@require_POST
+def telegram_webhook(request):
+    """
+    Receives updates pushed by Telegram (setWebhook) and hands them to the
+    same handlers the poller uses.
+    """
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+
+    if not secret or not hmac.compare_digest(token, secret):
+        return HttpResponse(status=403)
+
+    try:
+        update = json.loads(request.body)
+    except ValueError:
+        return HttpResponse(status=400)
+
+    try:
+        if handle_once(update, handle_update) == IN_PROGRESS:
+            # Another request is handling this update right now. Ask
+            # Telegram to retry, in case that request never finishes.
+            return HttpResponse(status=503)
+    except Exception as e:
+        # The claim was released; a non-2xx response makes Telegram deliver
+        # the update again, with its own backoff.
+        print(f"⚠️ Telegram webhook error: {e}")
+        return HttpResponse(status=500)
+
+    return HttpResponse(status=200)
@@ -0,0 +1,28 @@
+import pytest
+
+from subscription_service.benchmarks import run_benchmark
+from subscription_service.models import Subscription
+from telegram_bot.fake_server import FakeBotConfig
+
+
+@pytest.mark.django_db
+def test_benchmark_runs_both_tasks_against_fake_bot_api():
+    results = run_benchmark(30, FakeBotConfig(seed=0))
+
+    expiry, reminders = results
+
+    assert expiry["task"] == "delete_expired_subscriptions"
+    assert reminders["task"] == "notify_about_expiring_subscriptions"
+
+    # 6 of 30 seeded subscriptions are expired, 9 are in reminder windows
+    assert Subscription.objects.count() == 24
+    # Each reminder is a photo and the subscription details; admins get digests
+    assert reminders["telegram_calls"]["sendPhoto 200"] == 9
+    assert reminders["messages"] > 18
+    assert expiry["messages"] >= 1
+
+    for result in results:
+        assert result["size"] == 30
+        assert result["queries"] > 0
+        assert result["wall_time_s"] > 0
+        assert result["peak_rss_mb"] > 0
@@ -0,0 +1,84 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from django_redis import get_redis_connection
+
+from subscription_service.catalog import CATALOG_CHANNEL, PlanCatalog
+from subscription_service.models import Plan
+from telegram_bot.handlers import handle_start
+
+
+@pytest.fixture
+def catalog():
+    catalog = PlanCatalog(redis=get_redis_connection("default"))
+    with patch("subscription_service.signals.get_plan_catalog", return_value=catalog), \
+            patch("telegram_bot.handlers.get_plan_catalog", return_value=catalog):
+        yield catalog
+
+
+def _wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.django_db
+def test_catalog_serves_keyboard_from_memory(catalog, django_assert_num_queries):
+    plan = Plan.objects.create(period="1 month", price=100)
+
+    with django_assert_num_queries(1):
+        entry = catalog.get()
+    with django_assert_num_queries(0):
+        assert catalog.get() is entry
+
+    assert entry.keyboard == {
+        "inline_keyboard": [[{"text": "1 month — $100", "callback_data": f"PLAN_{plan.id}"}]]
+    }
+
+
+@pytest.mark.django_db
+def test_plan_changes_invalidate_catalog(catalog, django_capture_on_commit_callbacks):
+    Plan.objects.create(period="1 month", price=100)
+    assert len(catalog.get().plans) == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Plan.objects.create(period="3 months", price=250)
+
+    assert len(catalog.get().plans) == 2
+
+
+@pytest.mark.django_db
+def test_invalidation_reaches_other_processes(catalog):
+    redis = get_redis_connection("default")
+
+    def subscribers():
+        return redis.pubsub_numsub(CATALOG_CHANNEL)[0][1]
+
+    before = subscribers()
+
+    other = PlanCatalog(redis=redis)
+    other.get()
+    # Give the listener time to subscribe before publishing
+    _wait_until(lambda: subscribers() > before)
+
+    catalog.invalidate()
+
+    _wait_until(lambda: other._entry is None)
+
+
+@pytest.mark.django_db
+@patch("telegram_bot.handlers.TelegramMessageSender.send_message_to_chat")
+def test_start_uses_cached_keyboard(mock_send_message, catalog, django_assert_num_queries):
+    Plan.objects.create(period="1 month", price=100)
+    catalog.get()
+
+    with django_assert_num_queries(0):
+        handle_start(42)
+
+    mock_send_message.assert_called_once_with(
+        chat_id=42,
+        message="💳 Available subscription plans:",
+        reply_markup=catalog.get().keyboard,
+    )
@@ -0,0 +1,100 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from subscription_service.dataset import DATASET_CHAT_ID_BASE, generate_dataset
+from subscription_service.models import Subscription, TelegramUser
+
+postgres_only = pytest.mark.skipif(
+    connection.vendor != "postgresql",
+    reason="COPY is only available on PostgreSQL",
+)
+
+
+def _assert_consistent(subscriptions):
+    for subscription in subscriptions:
+        assert subscription.duration == subscription.plan.duration
+        assert subscription.end_date == subscription.start_date + subscription.duration
+
+
+@pytest.mark.django_db
+def test_generates_users_with_one_subscription_each():
+    now = timezone.now()
+
+    generate_dataset(50, staff=2, batch_size=20, now=now)
+
+    assert TelegramUser.objects.filter(is_staff=False).count() == 50
+    assert TelegramUser.objects.filter(is_staff=True, subscription__isnull=True).count() == 2
+    assert Subscription.objects.count() == 50
+    # "mixed": 20% expired, 30% in the reminder windows
+    assert Subscription.objects.expired(now).count() == 10
+    assert Subscription.objects.filter(end_date__gt=now, end_date__lt=now + timedelta(days=8)).count() == 15
+    _assert_consistent(Subscription.objects.select_related("plan"))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "distribution, low, high",
+    [
+        ("expired", -30, 0),
+        ("expiring", 0, 7),
+        ("uniform", -30, 365),
+    ],
+)
+def test_end_date_distributions(distribution, low, high):
+    now = timezone.now()
+
+    generate_dataset(40, distribution=distribution, seed=1, now=now)
+
+    end_dates = Subscription.objects.values_list("end_date", flat=True)
+    assert all(now + timedelta(days=low) <= end_date <= now + timedelta(days=high) for end_date in end_dates)
+
+
+@pytest.mark.django_db
+def test_generate_dataset_command_continues_after_existing_chats(capsys):
+    call_command("generate_dataset", "10", "--staff", "0", "--distribution", "reminders")
+    call_command("generate_dataset", "10", "--staff", "0", "--start-chat-id", str(DATASET_CHAT_ID_BASE + 10))
+
+    assert Subscription.objects.count() == 20
+    assert "Created 10 users and subscriptions" in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+def test_copy_invalidates_cached_queries():
+    with patch("subscription_service.dataset._copy") as mock_copy, \
+            patch("subscription_service.dataset.invalidate") as mock_invalidate:
+        generate_dataset(5, use_copy=True)
+
+    mock_copy.assert_called_once()
+    mock_invalidate.assert_called_once_with(TelegramUser, Subscription)
+
+
+@postgres_only
+@pytest.mark.django_db
+def test_copied_rows_are_not_hidden_by_the_query_cache():
+    generate_dataset(5, use_copy=True)
+    assert Subscription.objects.count() == 5
+
+    generate_dataset(5, use_copy=True, start_chat_id=DATASET_CHAT_ID_BASE + 5)
+    assert Subscription.objects.count() == 10
+
+
+@postgres_only
+@pytest.mark.django_db
+def test_copy_matches_insert():
+    now = timezone.now()
+
+    generate_dataset(20, now=now, use_copy=True)
+    generate_dataset(20, now=now, use_copy=False, start_chat_id=DATASET_CHAT_ID_BASE + 20)
+
+    copied = Subscription.objects.filter(customer_id__lt=DATASET_CHAT_ID_BASE + 20).order_by("customer_id")
+    created = Subscription.objects.filter(customer_id__gte=DATASET_CHAT_ID_BASE + 20).order_by("customer_id")
+
+    assert [(s.end_date, s.duration, s.plan_id) for s in copied] == [
+        (s.end_date, s.duration, s.plan_id) for s in created
+    ]
+    _assert_consistent(copied.select_related("plan"))
@@ -0,0 +1,93 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+from subscription_service.delivery import DeliveryEngine, DeliveryJob, OutgoingMessage
+
+
+def _response(status_code=200):
+    response = MagicMock()
+    response.status_code = status_code
+    return response
+
+
+def test_delivery_engine_keeps_order_within_chat():
+    sent = []
+
+    def send(message):
+        # Later messages finish faster, so only lane ordering keeps them in order.
+        time.sleep(0.02 if message.photo_path else 0)
+        sent.append((message.chat_id, message.text))
+        return _response()
+
+    jobs = [
+        DeliveryJob(
+            key=chat_id,
+            chat_id=chat_id,
+            messages=[
+                OutgoingMessage(chat_id=chat_id, text="photo", photo_path="1-day.jpg"),
+                OutgoingMessage(chat_id=chat_id, text="details"),
+            ],
+        )
+        for chat_id in range(10)
+    ]
+
+    results = DeliveryEngine(send=send, concurrency=4).deliver(jobs)
+
+    assert all(result.ok for result in results.values())
+    for chat_id in range(10):
+        assert [text for cid, text in sent if cid == chat_id] == ["photo", "details"]
+
+
+def test_delivery_engine_limits_concurrency():
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def send(message):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight -= 1
+        return _response()
+
+    jobs = [
+        DeliveryJob(key=i, chat_id=i, messages=[OutgoingMessage(chat_id=i, text="hi")])
+        for i in range(20)
+    ]
+
+    DeliveryEngine(send=send, concurrency=3).deliver(jobs)
+
+    assert peak <= 3
+
+
+def test_delivery_engine_reports_per_recipient_results():
+    def send(message):
+        if message.chat_id == 2:
+            raise ConnectionError("boom")
+        return _response(400 if message.chat_id == 3 else 200)
+
+    jobs = [
+        DeliveryJob(
+            key=f"job-{i}",
+            chat_id=i,
+            messages=[
+                OutgoingMessage(chat_id=i, text="first"),
+                OutgoingMessage(chat_id=i, text="second"),
+            ],
+        )
+        for i in (1, 2, 3)
+    ]
+
+    results = DeliveryEngine(send=send, concurrency=2).deliver(jobs)
+
+    assert results["job-1"].ok is True
+    assert len(results["job-1"].responses) == 2
+    assert results["job-2"].ok is False
+    assert results["job-2"].error == "boom"
+    assert results["job-3"].ok is False
+    assert results["job-3"].error == "HTTP 400"
+    assert len(results["job-3"].responses) == 1
@@ -0,0 +1,76 @@
+import pytest
+
+from subscription_service.digest import (
+    DIGEST,
+    PER_EVENT,
+    TELEGRAM_MESSAGE_LIMIT,
+    AdminEvent,
+    AdminNotifier,
+    chunk_lines,
+)
+from subscription_service.models import TelegramUser
+
+
+def _admins():
+    return [
+        TelegramUser(chat_id=1, telegram_username="admin1"),
+        TelegramUser(chat_id=2, telegram_username="admin2"),
+    ]
+
+
+def _notifier(mode, count):
+    notifier = AdminNotifier(title="Expired", mode=mode)
+    for i in range(count):
+        notifier.add(
+            AdminEvent(
+                key=i,
+                summary=f"@user{i} — 1 month, 100 USD, payment pi_{i:040d}",
+                render=lambda admin, i=i: f"Hi, {admin}! user{i} expired",
+            )
+        )
+    return notifier
+
+
+def test_chunk_lines_respects_message_limit():
+    lines = [f"line {i} " + "x" * 100 for i in range(500)]
+
+    chunks = chunk_lines(lines, header="Header\n\n")
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= TELEGRAM_MESSAGE_LIMIT for chunk in chunks)
+    assert all(chunk.startswith("Header\n\n") for chunk in chunks)
+    body = "\n".join(chunk[len("Header\n\n"):] for chunk in chunks)
+    assert body.split("\n") == lines
+
+
+def test_chunk_lines_splits_oversized_line():
+    chunks = chunk_lines(["y" * 10000])
+
+    assert len(chunks) == 3
+    assert "".join(chunks) == "y" * 10000
+
+
+def test_digest_sends_one_job_per_admin():
+    notifier = _notifier(DIGEST, 2000)
+
+    jobs = notifier.build_jobs(_admins())
+
+    assert [job.chat_id for job in jobs] == [1, 2]
+    assert 1 < len(jobs[0].messages) < 50
+    assert all(len(message.text) <= TELEGRAM_MESSAGE_LIMIT for message in jobs[0].messages)
+    assert jobs[0].messages[0].text.startswith("Hi, admin1!\n\nExpired (2000) (part 1/")
+
+
+def test_per_event_mode_sends_every_event_to_every_admin():
+    notifier = _notifier(PER_EVENT, 3)
+
+    jobs = notifier.build_jobs(_admins())
+
+    assert len(jobs) == 6
+    assert jobs[0].messages[0].text == "Hi, admin1! user0 expired"
+    assert {job.key for job in jobs} == {(i, chat_id) for i in range(3) for chat_id in (1, 2)}
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        AdminNotifier(title="Expired", mode="digets")
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+
+from subscription_service.models import Subscription, TelegramUser
+
+postgres_only = pytest.mark.skipif(
+    connection.vendor != "postgresql",
+    reason="query plans are only checked on PostgreSQL",
+)
+
+
+def _explain(queryset) -> str:
+    # The test tables are tiny, so the planner would pick a sequential scan
+    # anyway; disabling it shows whether a usable index exists at all.
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+    return queryset.explain()
+
+
+@postgres_only
+@pytest.mark.django_db
+def test_reminder_window_query_uses_end_date_index():
+    start = timezone.now() + timedelta(days=1)
+    queryset = Subscription.objects.filter(
+        end_date__gte=start, end_date__lt=start + timedelta(days=1)
+    )
+
+    assert "subscription_end_date_idx" in _explain(queryset)
+
+
+@postgres_only
+@pytest.mark.django_db
+def test_expiry_scan_uses_end_date_index():
+    queryset = Subscription.objects.expired(timezone.now()).order_by("end_date", "id")
+
+    assert "subscription_end_date_idx" in _explain(queryset)
+
+
+@postgres_only
+@pytest.mark.django_db
+def test_staff_lookup_uses_partial_index():
+    assert "telegramuser_staff_idx" in _explain(TelegramUser.objects.filter(is_staff=True))
@@ -1,10 +1,22 @@
+from datetime import timedelta
+from unittest.mock import patch
+
 import pytest
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from subscription_service.models import TelegramUser
+from subscription_service.managers import SubscriptionQuerySet
+from subscription_service.models import Plan, Subscription, TelegramUser
 
 UserModel = get_user_model()
 
+postgres_only = pytest.mark.skipif(
+    connection.vendor != "postgresql",
+    reason="INSERT ... ON CONFLICT is only used on PostgreSQL",
+)
+
 
 @pytest.mark.django_db
 class TestTelegramUserManager:
@@ -42,3 +54,145 @@ class TestTelegramUserManager:
                 at_private_group=False,
                 password="password123",
             )
+
+
+def _create_subscriptions(count, start_chat_id, days_ago):
+    plan, _ = Plan.objects.get_or_create(period="1 month", defaults={"price": 100})
+    for chat_id in range(start_chat_id, start_chat_id + count):
+        user = TelegramUser.objects.create(
+            chat_id=chat_id,
+            telegram_username=f"user{chat_id}",
+            at_private_group=True,
+        )
+        Subscription.objects.create(
+            customer=user,
+            plan=plan,
+            payment_id=f"pi_{chat_id}",
+            start_date=timezone.now() - timedelta(days=days_ago),
+        )
+
+
+@pytest.mark.django_db
+class TestSubscriptionQuerySet:
+
+    def test_expire_removes_only_expired_subscriptions(self):
+        _create_subscriptions(3, start_chat_id=100, days_ago=40)
+        _create_subscriptions(2, start_chat_id=200, days_ago=5)
+
+        expired = Subscription.objects.expired(timezone.now()).expire()
+
+        assert sorted(s.customer.telegram_username for s in expired) == [
+            "user100", "user101", "user102",
+        ]
+        assert Subscription.objects.count() == 2
+        assert set(
+            TelegramUser.objects.filter(at_private_group=True).values_list("chat_id", flat=True)
+        ) == {200, 201}
+
+    def test_expire_runs_constant_number_of_queries(self):
+        _create_subscriptions(2, start_chat_id=100, days_ago=40)
+        with CaptureQueriesContext(connection) as small_run:
+            Subscription.objects.expired(timezone.now()).expire()
+
+        _create_subscriptions(20, start_chat_id=300, days_ago=40)
+        with CaptureQueriesContext(connection) as large_run:
+            Subscription.objects.expired(timezone.now()).expire()
+
+        assert len(large_run) == len(small_run)
+        # SELECT ... FOR UPDATE, UPDATE customers, DELETE (plus the savepoint)
+        assert len([q for q in large_run if "SAVEPOINT" not in q["sql"]]) == 3
+        assert not Subscription.objects.exists()
+
+    def test_expire_sends_no_delete_signals(self):
+        _create_subscriptions(5, start_chat_id=100, days_ago=40)
+
+        with patch("subscription_service.signals.get_scheduler") as mock_get_scheduler:
+            Subscription.objects.expired(timezone.now()).expire()
+
+        mock_get_scheduler.assert_not_called()
+
+    def test_keyset_chunks_walks_all_rows_in_order(self):
+        _create_subscriptions(7, start_chat_id=100, days_ago=40)
+        # Same end_date for several rows, so the id tie-breaker matters
+        Subscription.objects.update(end_date=timezone.now())
+
+        chunks = list(Subscription.objects.all().keyset_chunks(chunk_size=3))
+
+        assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+        assert [s.pk for chunk in chunks for s in chunk] == list(
+            Subscription.objects.order_by("end_date", "id").values_list("pk", flat=True)
+        )
+
+    def test_keyset_chunks_resumes_after_key(self):
+        _create_subscriptions(5, start_chat_id=100, days_ago=40)
+        ordered = list(Subscription.objects.order_by("end_date", "id"))
+
+        chunks = list(
+            Subscription.objects.all().keyset_chunks(
+                chunk_size=10, after=(ordered[1].end_date, ordered[1].pk)
+            )
+        )
+
+        assert [s.pk for s in chunks[0]] == [s.pk for s in ordered[2:]]
+
+    def test_extend_or_create_creates_subscription(self):
+        plan = Plan.objects.create(period="3 months", price=250)
+        user = TelegramUser.objects.create(chat_id=100, telegram_username="user100")
+        now = timezone.now()
+
+        subscription, created = Subscription.objects.extend_or_create(user, plan, "pi_1", now=now)
+
+        assert created is True
+        assert subscription.end_date == now + timedelta(days=90)
+
+    def test_extend_or_create_adds_to_remaining_time(self):
+        _create_subscriptions(1, start_chat_id=100, days_ago=10)
+        subscription = Subscription.objects.get()
+        year = Plan.objects.create(period="1 year", price=900)
+
+        extended, created = Subscription.objects.extend_or_create(
+            subscription.customer, year, "pi_renewal"
+        )
+
+        assert created is False
+        assert extended.pk == subscription.pk
+        assert extended.plan == year
+        assert extended.payment_id == "pi_renewal"
+        assert extended.end_date == subscription.end_date + timedelta(days=365)
+        assert extended.duration == extended.end_date - extended.start_date
+
+    def test_extend_or_create_restarts_lapsed_subscription(self):
+        _create_subscriptions(1, start_chat_id=100, days_ago=40)
+        subscription = Subscription.objects.get()
+        now = timezone.now()
+
+        extended, _ = Subscription.objects.extend_or_create(
+            subscription.customer, subscription.plan, "pi_renewal", now=now
+        )
+
+        assert extended.end_date == now + timedelta(days=30)
+
+
+@postgres_only
+@pytest.mark.django_db
+def test_upsert_extends_existing_subscription_on_postgres():
+    _create_subscriptions(1, start_chat_id=100, days_ago=10)
+    subscription = Subscription.objects.get()
+    year = Plan.objects.create(period="1 year", price=900)
+    now = timezone.now()
+
+    # The fallback must not be what passes this test
+    with patch.object(SubscriptionQuerySet, "_update_or_insert") as fallback:
+        extended, created = Subscription.objects.extend_or_create(
+            subscription.customer, year, "pi_renewal", now=now
+        )
+        new_user = TelegramUser.objects.create(chat_id=200, telegram_username="user200")
+        fresh, fresh_created = Subscription.objects.extend_or_create(new_user, year, "pi_new", now=now)
+
+    fallback.assert_not_called()
+    assert created is False
+    assert extended.pk == subscription.pk
+    assert extended.end_date == subscription.end_date + timedelta(days=365)
+    assert extended.duration == extended.end_date - extended.start_date
+    assert fresh_created is True
+    assert fresh.end_date == now + timedelta(days=365)
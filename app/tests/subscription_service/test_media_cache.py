@@ -0,0 +1,81 @@
+from unittest.mock import MagicMock, patch
+
+from subscription_service.media_cache import TelegramFileIdCache
+from subscription_service.utils import TelegramMessageSender
+
+
+def _response(status_code=200, file_id=None, text=""):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = text
+    response.json.return_value = {
+        "ok": status_code == 200,
+        "result": {"photo": [{"file_id": "small"}, {"file_id": file_id}]},
+    }
+    return response
+
+
+@patch("subscription_service.utils.get_transport")
+def test_photo_is_uploaded_once_then_sent_by_file_id(mock_get_transport, tmp_path):
+    photo = tmp_path / "1-day.jpg"
+    photo.write_bytes(b"image-v1")
+    transport = mock_get_transport.return_value
+    transport.post.side_effect = [_response(file_id="FILE_1"), _response()]
+
+    TelegramMessageSender.send_message_with_photo_to_chat("hi", str(photo), 1)
+    TelegramMessageSender.send_message_with_photo_to_chat("hi", str(photo), 2)
+
+    first_call, second_call = transport.post.call_args_list
+    assert "files" in first_call.kwargs
+    assert second_call.kwargs["json"] == {"chat_id": 2, "caption": "hi", "photo": "FILE_1"}
+    assert TelegramFileIdCache.get(str(photo)) == "FILE_1"
+
+
+@patch("subscription_service.utils.get_transport")
+def test_changed_file_is_uploaded_again(mock_get_transport, tmp_path):
+    photo = tmp_path / "3-days.jpg"
+    photo.write_bytes(b"image-v1")
+    TelegramFileIdCache.set(str(photo), "OLD")
+
+    photo.write_bytes(b"image-v2-longer")
+    transport = mock_get_transport.return_value
+    transport.post.return_value = _response(file_id="NEW")
+
+    TelegramMessageSender.send_message_with_photo_to_chat("hi", str(photo), 1)
+
+    assert "files" in transport.post.call_args.kwargs
+    assert TelegramFileIdCache.get(str(photo)) == "NEW"
+
+
+@patch("subscription_service.utils.get_transport")
+def test_rejected_file_id_falls_back_to_upload(mock_get_transport, tmp_path):
+    photo = tmp_path / "7-days.jpg"
+    photo.write_bytes(b"image")
+    TelegramFileIdCache.set(str(photo), "STALE")
+    transport = mock_get_transport.return_value
+    transport.post.side_effect = [
+        _response(400, text='{"description": "Bad Request: wrong file identifier"}'),
+        _response(file_id="FRESH"),
+    ]
+
+    response = TelegramMessageSender.send_message_with_photo_to_chat("hi", str(photo), 1)
+
+    assert response.status_code == 200
+    assert transport.post.call_count == 2
+    assert TelegramFileIdCache.get(str(photo)) == "FRESH"
+
+
+@patch("subscription_service.media_cache.cache")
+@patch("subscription_service.utils.get_transport")
+def test_photo_is_uploaded_while_the_cache_is_down(mock_get_transport, mock_cache, tmp_path):
+    photo = tmp_path / "7-days.jpg"
+    photo.write_bytes(b"image-v1")
+    mock_cache.get.side_effect = ConnectionError("redis is down")
+    mock_cache.set.side_effect = ConnectionError("redis is down")
+    transport = mock_get_transport.return_value
+    transport.post.return_value = _response(file_id="FILE_7")
+
+    response = TelegramMessageSender.send_message_with_photo_to_chat("hi", str(photo), 1)
+
+    assert response.status_code == 200
+    assert "files" in transport.post.call_args.kwargs
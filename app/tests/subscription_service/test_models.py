@@ -191,3 +191,21 @@ def test_subscription_model_relationships():
 
     assert subscription.customer == user
     assert subscription.plan == plan
+
+
+@pytest.mark.django_db
+def test_save_keeps_extended_end_date():
+    user = TelegramUser.objects.create(chat_id=778, telegram_username="@extended_user")
+    plan = Plan.objects.create(period="1 month", price=100)
+    now = timezone.now()
+
+    Subscription.objects.extend_or_create(user, plan, "pi_first", now=now)
+    subscription, _ = Subscription.objects.extend_or_create(user, plan, "pi_second", now=now)
+    assert subscription.end_date == now + timedelta(days=60)
+
+    # e.g. an admin edit
+    subscription.save()
+    subscription.refresh_from_db()
+
+    assert subscription.end_date == now + timedelta(days=60)
+    assert subscription.duration == timedelta(days=60)
@@ -0,0 +1,112 @@
+import time
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django_redis import get_redis_connection
+
+from subscription_service.delivery import DeliveryEngine, DeliveryJob, OutgoingMessage
+from subscription_service.rate_limit import TelegramRateLimiter, get_retry_after
+from subscription_service.utils import TelegramMessageSender
+
+
+def _response(status_code=200, retry_after=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = {"ok": False, "parameters": {"retry_after": retry_after}}
+    return response
+
+
+@pytest.fixture
+def limiter():
+    redis = get_redis_connection("default")
+    redis.delete(*redis.keys("tg:rl:*") or ["tg:rl:none"])
+    # Start at the beginning of a one-second window so the budgets don't roll over mid-test.
+    time.sleep(1 - time.time() % 1 + 0.01)
+    return TelegramRateLimiter(redis=redis, global_rate=3, per_chat_rate=1)
+
+
+def test_per_chat_budget(limiter):
+    assert limiter.try_acquire("chat-a") == 0
+    assert limiter.try_acquire("chat-a") > 0
+    assert limiter.try_acquire("chat-b") == 0
+
+
+def test_global_budget(limiter):
+    assert [limiter.try_acquire(f"chat-{i}") for i in range(3)] == [0, 0, 0]
+    assert limiter.try_acquire("chat-3") > 0
+
+
+def test_pause_chat_after_429(limiter):
+    limiter.pause_chat("chat-a", 5)
+
+    assert 4 < limiter.try_acquire("chat-a") <= 5
+    assert limiter.try_acquire("chat-b") == 0
+
+
+def test_get_retry_after():
+    assert get_retry_after(_response(429, retry_after=7)) == 7
+    assert get_retry_after(_response(429)) == 1
+
+
+@patch("subscription_service.utils.get_transport")
+def test_sender_retries_after_429(mock_get_transport):
+    mock_get_transport.return_value.post.side_effect = [
+        _response(429, retry_after=0),
+        _response(200),
+    ]
+
+    response = TelegramMessageSender.send_message_to_chat("hi", chat_id=uuid.uuid4().hex)
+
+    assert response.status_code == 200
+    assert mock_get_transport.return_value.post.call_count == 2
+
+
+def test_engine_reschedules_rate_limited_messages():
+    rescheduled = []
+    messages = [
+        OutgoingMessage(chat_id=1, text="photo", photo_path="1-day.jpg"),
+        OutgoingMessage(chat_id=1, text="details"),
+    ]
+
+    engine = DeliveryEngine(
+        send=lambda message: _response(429, retry_after=3),
+        reschedule=lambda remaining, response: rescheduled.append(remaining),
+    )
+    results = engine.deliver([DeliveryJob(key=1, chat_id=1, messages=messages)])
+
+    assert results[1].ok is False
+    assert results[1].rescheduled is True
+    assert rescheduled == [messages]
+
+
+@patch("subscription_service.tasks.send_telegram_messages.apply_async")
+@patch("subscription_service.utils.get_transport")
+def test_interactive_send_is_rescheduled_after_retries(mock_get_transport, mock_apply_async, settings):
+    settings.TELEGRAM_MAX_RETRIES = 1
+    mock_get_transport.return_value.post.return_value = _response(429, retry_after=0)
+    chat_id = uuid.uuid4().hex
+
+    response = TelegramMessageSender.send_message_to_chat("hi", chat_id=chat_id)
+
+    assert response.status_code == 429
+    assert mock_get_transport.return_value.post.call_count == 2
+    mock_apply_async.assert_called_once_with(
+        args=[[{"chat_id": chat_id, "text": "hi", "photo_path": None, "reply_markup": None}]],
+        countdown=0,
+    )
+
+
+@patch("subscription_service.tasks.send_telegram_messages.apply_async")
+@patch("subscription_service.utils.get_transport")
+def test_batch_sends_leave_rescheduling_to_the_engine(mock_get_transport, mock_apply_async, settings):
+    settings.TELEGRAM_MAX_RETRIES = 0
+    mock_get_transport.return_value.post.return_value = _response(429, retry_after=0)
+    chat_id = uuid.uuid4().hex
+
+    results = TelegramMessageSender.send_batch(
+        [DeliveryJob(key=1, chat_id=chat_id, messages=[OutgoingMessage(chat_id=chat_id, text="hi")])]
+    )
+
+    assert results[1].rescheduled is True
+    mock_apply_async.assert_called_once()
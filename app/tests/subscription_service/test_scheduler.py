@@ -0,0 +1,191 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from subscription_service.delivery import DeliveryResult
+from subscription_service.models import Plan, Subscription, TelegramUser
+from subscription_service.scheduler import POPPED_REMINDERS_KEY, SCHEDULE_KEY, SubscriptionScheduler
+from subscription_service import tasks
+from subscription_service.tasks import process_due_subscription_events
+
+
+@pytest.fixture
+def scheduler():
+    redis = get_redis_connection("default")
+    redis.delete(SCHEDULE_KEY, POPPED_REMINDERS_KEY)
+    with patch("subscription_service.tasks.get_scheduler") as mock_get_scheduler:
+        mock_get_scheduler.return_value = SubscriptionScheduler(redis=redis, reminder_days=[7, 3, 1])
+        yield mock_get_scheduler.return_value
+    redis.delete(SCHEDULE_KEY, POPPED_REMINDERS_KEY)
+
+
+def _subscription(chat_id, start_date):
+    plan, _ = Plan.objects.get_or_create(period="1 month", defaults={"price": 100})
+    user = TelegramUser.objects.create(
+        chat_id=chat_id, telegram_username=f"user{chat_id}", at_private_group=True
+    )
+    return Subscription.objects.create(
+        customer=user, plan=plan, payment_id=f"pi_{chat_id}", start_date=start_date
+    )
+
+
+def _members(scheduler):
+    return {m.decode() for m in scheduler.redis.zrange(SCHEDULE_KEY, 0, -1)}
+
+
+def test_schedule_keeps_overdue_reminders_for_a_day(scheduler):
+    now = timezone.now()
+    # The 3-day reminder was due 23 hours ago, the 7-day one 4 days ago
+    scheduler.schedule(1, now + timedelta(days=2, hours=1), now=now)
+
+    assert _members(scheduler) == {"expire:1", "remind:3:1", "remind:1:1"}
+
+
+def test_schedule_does_not_add_popped_reminders_again(scheduler):
+    now = timezone.now()
+    end_date = now + timedelta(days=2, hours=1)
+    scheduler.schedule(1, end_date, now=now - timedelta(days=1))
+
+    assert scheduler.pop_due(now).remind == {3: [1]}
+
+    # A rebuild after the reminder went out leaves it alone...
+    scheduler.schedule(1, end_date, now=now)
+    assert _members(scheduler) == {"expire:1", "remind:1:1"}
+
+    # ...but a renewal moves it, so it is scheduled again
+    scheduler.schedule(1, end_date + timedelta(hours=1), now=now)
+    assert "remind:3:1" in _members(scheduler)
+
+
+def test_reschedule_replaces_old_events(scheduler):
+    now = timezone.now()
+    scheduler.schedule(1, now + timedelta(days=10), now=now)
+    scheduler.schedule(1, now + timedelta(days=40), now=now)
+
+    assert scheduler.redis.zscore(SCHEDULE_KEY, "expire:1") == pytest.approx(
+        (now + timedelta(days=40)).timestamp()
+    )
+    assert scheduler.redis.zcard(SCHEDULE_KEY) == 4
+
+
+def test_pop_due_returns_each_event_once(scheduler):
+    now = timezone.now()
+    scheduler.schedule(1, now - timedelta(minutes=1), now=now)
+    scheduler.schedule(2, now + timedelta(hours=1), now=now)
+
+    first = scheduler.pop_due(now)
+    second = scheduler.pop_due(now)
+
+    assert first.expire == [1]
+    assert len(second) == 0
+    assert scheduler.redis.zscore(SCHEDULE_KEY, "expire:2") is not None
+
+
+@pytest.mark.django_db
+def test_schedule_on_save_and_delete(django_capture_on_commit_callbacks):
+    redis = get_redis_connection("default")
+
+    with patch("subscription_service.signals.get_scheduler") as mock_get_scheduler:
+        mock_get_scheduler.return_value = SubscriptionScheduler(redis=redis, reminder_days=[1])
+        with django_capture_on_commit_callbacks(execute=True):
+            subscription = _subscription(50, timezone.now())
+        assert redis.zscore(SCHEDULE_KEY, f"expire:{subscription.pk}") == pytest.approx(
+            subscription.end_date.timestamp()
+        )
+
+        pk = subscription.pk
+        with django_capture_on_commit_callbacks(execute=True):
+            subscription.delete()
+        assert redis.zscore(SCHEDULE_KEY, f"expire:{pk}") is None
+        assert redis.zscore(SCHEDULE_KEY, f"remind:1:{pk}") is None
+
+
+@pytest.mark.django_db
+@patch("subscription_service.tasks.TelegramMessageSender")
+def test_tick_handles_due_expiry_and_reminder(mock_sender, scheduler):
+    now = timezone.now()
+    expired = _subscription(60, now - timedelta(days=30, minutes=1))
+    expiring = _subscription(61, now - timedelta(days=29, minutes=1))
+    not_due = _subscription(62, now)
+    for subscription in (expired, expiring, not_due):
+        scheduler.schedule(subscription.pk, subscription.end_date, now=now - timedelta(days=30))
+
+    sent_jobs = []
+
+    def send_batch(jobs):
+        sent_jobs.extend(jobs)
+        return {job.key: DeliveryResult(key=job.key, chat_id=job.chat_id, ok=True) for job in jobs}
+
+    mock_sender.send_batch.side_effect = send_batch
+
+    process_due_subscription_events()
+
+    assert not Subscription.objects.filter(pk=expired.pk).exists()
+    assert Subscription.objects.filter(pk=expiring.pk).exists()
+    reminder_jobs = [job for job in sent_jobs if job.chat_id == 61]
+    assert len(reminder_jobs) == 1
+    assert reminder_jobs[0].messages[0].photo_path.endswith("1-day.jpg")
+    assert scheduler.redis.zscore(SCHEDULE_KEY, f"expire:{not_due.pk}") is not None
+
+
+@pytest.mark.django_db
+@patch("subscription_service.tasks.TelegramMessageSender")
+def test_tick_puts_back_only_unhandled_events_on_failure(mock_sender, scheduler):
+    now = timezone.now()
+    expired = _subscription(70, now - timedelta(days=30, minutes=1))
+    one_day_left = _subscription(71, now - timedelta(days=29, minutes=1))
+    three_days_left = _subscription(72, now - timedelta(days=27, minutes=1))
+    for subscription in (expired, one_day_left, three_days_left):
+        scheduler.schedule(subscription.pk, subscription.end_date, now=now - timedelta(days=30))
+
+    mock_sender.send_batch.side_effect = lambda jobs: {
+        job.key: DeliveryResult(key=job.key, chat_id=job.chat_id, ok=True) for job in jobs
+    }
+    send_reminders = tasks._send_reminders
+    calls = []
+
+    def fail_second_bucket(due):
+        # Buckets of stale events come through empty
+        if due:
+            calls.append(due)
+        if len(calls) == 2:
+            raise RuntimeError("database went away")
+        return send_reminders(due)
+
+    with patch("subscription_service.tasks._send_reminders", side_effect=fail_second_bucket):
+        process_due_subscription_events()
+
+    (handled, handled_reminder), = calls[0]
+    (failed, failed_reminder), = calls[1]
+    assert {handled.pk, failed.pk} == {one_day_left.pk, three_days_left.pk}
+
+    members = {m.decode() for m in scheduler.redis.zrange(SCHEDULE_KEY, 0, -1)}
+    assert f"expire:{expired.pk}" not in members
+    assert f"remind:{handled_reminder['days']}:{handled.pk}" not in members
+    assert f"remind:{failed_reminder['days']}:{failed.pk}" in members
+
+
+@pytest.mark.django_db
+@patch("subscription_service.tasks.TelegramMessageSender")
+def test_tick_rebuilds_an_empty_schedule(mock_sender, scheduler):
+    now = timezone.now()
+    with patch("subscription_service.signals.get_scheduler"):
+        expired = _subscription(80, now - timedelta(days=30, minutes=1))
+        # Its 1-day reminder was due an hour ago, while Redis was empty
+        reminded = _subscription(81, now - timedelta(days=29, hours=1))
+        active = _subscription(82, now)
+
+    mock_sender.send_batch.side_effect = lambda jobs: {
+        job.key: DeliveryResult(key=job.key, chat_id=job.chat_id, ok=True) for job in jobs
+    }
+
+    process_due_subscription_events()
+
+    assert not Subscription.objects.filter(pk=expired.pk).exists()
+    (jobs,), _ = mock_sender.send_batch.call_args_list[0]
+    assert [job.chat_id for job in jobs] == [reminded.customer_id]
+    assert f"expire:{active.pk}" in _members(scheduler)
+    assert f"remind:1:{reminded.pk}" not in _members(scheduler)
@@ -0,0 +1,95 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+
+from subscription_service.models import Plan, Subscription, TelegramUser
+from subscription_service.status_cache import SubscriptionStatus, SubscriptionStatusCache
+from subscription_service.tasks import _expire_subscriptions
+from telegram_bot.handlers import handle_verify
+
+CHAT_ID = 9001
+
+
+@pytest.fixture(autouse=True)
+def clean_status():
+    cache.delete(SubscriptionStatusCache.cache_key(CHAT_ID))
+    yield
+    cache.delete(SubscriptionStatusCache.cache_key(CHAT_ID))
+
+
+def _user():
+    return TelegramUser.objects.create(chat_id=CHAT_ID, telegram_username="status_user")
+
+
+def _subscription(user, start_date=None):
+    plan, _ = Plan.objects.get_or_create(period="1 month", defaults={"price": 100})
+    return Subscription.objects.create(
+        customer=user, plan=plan, payment_id="pi_status", start_date=start_date or timezone.now()
+    )
+
+
+@pytest.mark.django_db
+def test_lookup_is_one_query(django_assert_num_queries):
+    with django_assert_num_queries(1):
+        assert SubscriptionStatusCache.lookup(CHAT_ID) == SubscriptionStatus(registered=False)
+
+    user = _user()
+    with django_assert_num_queries(1):
+        assert SubscriptionStatusCache.lookup(CHAT_ID) == SubscriptionStatus(registered=True)
+
+    subscription = _subscription(user)
+    with django_assert_num_queries(1):
+        status = SubscriptionStatusCache.lookup(CHAT_ID)
+
+    assert status == SubscriptionStatus(registered=True, plan="1 month", end_date=subscription.end_date)
+
+
+@pytest.mark.django_db
+@patch("telegram_bot.handlers.TelegramMessageSender.send_message_to_chat")
+def test_signals_write_status_through(mock_send_message, django_capture_on_commit_callbacks,
+                                      django_assert_num_queries):
+    with django_capture_on_commit_callbacks(execute=True):
+        subscription = _subscription(_user())
+
+    with django_assert_num_queries(0):
+        handle_verify(CHAT_ID)
+    assert "Subscription ACTIVE" in mock_send_message.call_args.kwargs["message"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        subscription.delete()
+
+    with django_assert_num_queries(0):
+        handle_verify(CHAT_ID)
+    assert mock_send_message.call_args.kwargs["message"] == "⚠️ No active subscription found."
+
+
+@pytest.mark.django_db
+def test_expiry_updates_cached_status():
+    user = _user()
+    _subscription(user, start_date=timezone.now() - timedelta(days=40))
+    SubscriptionStatusCache.get(CHAT_ID)
+
+    with patch("subscription_service.tasks.get_scheduler"):
+        _expire_subscriptions(timezone.now(), list(Subscription.objects.values_list("pk", flat=True)))
+
+    assert cache.get(SubscriptionStatusCache.cache_key(CHAT_ID)) == SubscriptionStatus(registered=True)
+
+
+@pytest.mark.django_db
+def test_miss_does_not_overwrite_newer_write_through():
+    active = SubscriptionStatus(registered=True, plan="1 month", end_date=timezone.now() + timedelta(days=30))
+    lookup = SubscriptionStatusCache.lookup
+
+    def lookup_then_pay(chat_id):
+        status = lookup(chat_id)
+        # Fulfillment commits and writes through while /verify is looking up
+        SubscriptionStatusCache.set(chat_id, active)
+        return status
+
+    with patch.object(SubscriptionStatusCache, "lookup", side_effect=lookup_then_pay):
+        assert SubscriptionStatusCache.get(CHAT_ID) == SubscriptionStatus(registered=False)
+
+    assert SubscriptionStatusCache.get(CHAT_ID) == active
@@ -0,0 +1,130 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from subscription_service.models import Plan, TelegramUser
+from subscription_service.stripe_service import CheckoutSessionCache, get_checkout_url
+from subscription_service.tasks import create_checkout_link
+from telegram_bot.handlers import handle_plan_selected
+
+CHAT_ID = 4242
+
+
+@pytest.fixture
+def plan(db):
+    plan = Plan.objects.create(period="1 month", price=100)
+    CheckoutSessionCache.forget(CHAT_ID, plan.id)
+    yield plan
+    CheckoutSessionCache.forget(CHAT_ID, plan.id)
+
+
+def _session(url, lifetime=60 * 60):
+    return SimpleNamespace(url=url, expires_at=int(time.time()) + lifetime)
+
+
+@patch("subscription_service.stripe_service.stripe.checkout.Session.create")
+def test_open_session_is_reused(mock_create, plan):
+    mock_create.return_value = _session("https://checkout.stripe.com/c/pay/cs_1")
+
+    assert get_checkout_url(plan, CHAT_ID) == "https://checkout.stripe.com/c/pay/cs_1"
+    assert get_checkout_url(plan, CHAT_ID) == "https://checkout.stripe.com/c/pay/cs_1"
+
+    mock_create.assert_called_once()
+    kwargs = mock_create.call_args.kwargs
+    assert kwargs["client_reference_id"] == str(CHAT_ID)
+    assert kwargs["metadata"] == {"chat_id": str(CHAT_ID), "plan_id": str(plan.id)}
+
+
+@patch("subscription_service.stripe_service.stripe.checkout.Session.create")
+def test_session_about_to_expire_is_not_reused(mock_create, plan):
+    mock_create.side_effect = [
+        _session("https://checkout.stripe.com/c/pay/cs_1", lifetime=60),
+        _session("https://checkout.stripe.com/c/pay/cs_2"),
+    ]
+
+    get_checkout_url(plan, CHAT_ID)
+
+    assert get_checkout_url(plan, CHAT_ID) == "https://checkout.stripe.com/c/pay/cs_2"
+    assert mock_create.call_count == 2
+
+
+@patch("subscription_service.stripe_service.stripe.checkout.Session.create")
+def test_payment_link_needs_no_stripe_call(mock_create, plan, settings):
+    settings.STRIPE_PAYMENT_LINKS = {"1 month": "https://buy.stripe.com/test_1month"}
+
+    url = get_checkout_url(plan, CHAT_ID)
+
+    assert url == f"https://buy.stripe.com/test_1month?client_reference_id={CHAT_ID}"
+    mock_create.assert_not_called()
+
+
+@patch("telegram_bot.handlers.create_checkout_link.delay")
+@patch("telegram_bot.handlers.TelegramMessageSender.send_message_to_chat")
+def test_plan_selection_offloads_session_creation(mock_send_message, mock_delay, plan):
+    CheckoutSessionCache.release_pending(CHAT_ID, plan.id)
+
+    handle_plan_selected(CHAT_ID, plan.id)
+    handle_plan_selected(CHAT_ID, plan.id)
+
+    mock_delay.assert_called_once_with(CHAT_ID, plan.id)
+    assert mock_send_message.call_args.kwargs["message"] == "⏳ Preparing your payment link..."
+
+    CheckoutSessionCache.release_pending(CHAT_ID, plan.id)
+
+
+@patch("telegram_bot.handlers.create_checkout_link.delay")
+@patch("telegram_bot.handlers.TelegramMessageSender.send_message_to_chat")
+def test_plan_selection_sends_placeholder_before_queueing(mock_send_message, mock_delay, plan):
+    CheckoutSessionCache.release_pending(CHAT_ID, plan.id)
+    calls = []
+    mock_send_message.side_effect = lambda **kwargs: calls.append("placeholder")
+    mock_delay.side_effect = lambda *args: calls.append("queued")
+
+    handle_plan_selected(CHAT_ID, plan.id)
+
+    assert calls == ["placeholder", "queued"]
+    CheckoutSessionCache.release_pending(CHAT_ID, plan.id)
+
+
+@patch("telegram_bot.handlers.create_checkout_link.delay")
+@patch("telegram_bot.handlers.TelegramMessageSender.send_message_to_chat")
+def test_plan_selection_answers_inline_with_open_session(mock_send_message, mock_delay, plan):
+    CheckoutSessionCache.set(CHAT_ID, plan.id, "https://checkout.stripe.com/c/pay/cs_1", int(time.time()) + 3600)
+
+    handle_plan_selected(CHAT_ID, plan.id)
+
+    mock_delay.assert_not_called()
+    assert "https://checkout.stripe.com/c/pay/cs_1" in mock_send_message.call_args.kwargs["message"]
+
+
+@patch("telegram_bot.handlers.create_checkout_link.delay")
+@patch("telegram_bot.handlers.TelegramMessageSender.send_message_to_chat")
+def test_plan_selection_remembers_the_username(mock_send_message, mock_delay, plan):
+    CheckoutSessionCache.release_pending(CHAT_ID, plan.id)
+
+    handle_plan_selected(CHAT_ID, plan.id)
+    assert TelegramUser.objects.get(chat_id=CHAT_ID).telegram_username == str(CHAT_ID)
+
+    handle_plan_selected(CHAT_ID, plan.id, "alice")
+    assert TelegramUser.objects.get(chat_id=CHAT_ID).telegram_username == "alice"
+
+    # Without a username the known one is kept
+    handle_plan_selected(CHAT_ID, plan.id)
+    assert TelegramUser.objects.get(chat_id=CHAT_ID).telegram_username == "alice"
+
+    CheckoutSessionCache.release_pending(CHAT_ID, plan.id)
+
+
+@patch("subscription_service.tasks.TelegramMessageSender.send_message_to_chat")
+@patch("subscription_service.stripe_service.stripe.checkout.Session.create")
+def test_checkout_task_sends_link(mock_create, mock_send_message, plan):
+    mock_create.return_value = _session("https://checkout.stripe.com/c/pay/cs_1")
+    CheckoutSessionCache.claim_pending(CHAT_ID, plan.id)
+
+    create_checkout_link(CHAT_ID, plan.id)
+
+    assert "https://checkout.stripe.com/c/pay/cs_1" in mock_send_message.call_args.kwargs["message"]
+    assert CheckoutSessionCache.claim_pending(CHAT_ID, plan.id) is True
+    CheckoutSessionCache.release_pending(CHAT_ID, plan.id)
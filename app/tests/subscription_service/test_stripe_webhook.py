@@ -0,0 +1,335 @@
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from subscription_service.dedupe import EventDeduplicator
+from subscription_service.delivery import DeliveryResult
+from subscription_service.models import Plan, StripeEvent, Subscription, TelegramUser
+from subscription_service.tasks import fulfill_stripe_event, requeue_unprocessed_stripe_events
+
+CHAT_ID = 777
+
+
+def _checkout_event(event_id, plan, payment_id="pi_1"):
+    return {
+        "id": event_id,
+        "type": "checkout.session.completed",
+        "data": {
+            "object": {
+                "id": f"cs_{event_id}",
+                "payment_status": "paid",
+                "payment_intent": payment_id,
+                "amount_total": plan.price * 100,
+                "client_reference_id": str(CHAT_ID),
+                "metadata": {"chat_id": str(CHAT_ID), "plan_id": str(plan.id)},
+            }
+        },
+    }
+
+
+def _post(client, event):
+    with patch("subscription_service.views.stripe.Webhook.construct_event", return_value=event):
+        return client.post(
+            reverse("stripe-webhook"),
+            data=json.dumps(event),
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE="t=1,v1=test",
+        )
+
+
+@pytest.fixture(autouse=True)
+def deduplicator():
+    redis = get_redis_connection("default")
+    deduplicator = EventDeduplicator(prefix="test:stripe:event", redis=redis)
+    for key in redis.scan_iter("test:stripe:event:*"):
+        redis.delete(key)
+
+    with patch("subscription_service.views.get_stripe_event_deduplicator", return_value=deduplicator):
+        yield deduplicator
+
+
+@pytest.fixture
+def plan(db):
+    return Plan.objects.create(period="1 month", price=100)
+
+
+@pytest.fixture
+def mock_sender():
+    with patch("subscription_service.tasks.TelegramMessageSender") as mock_sender:
+        mock_sender.send_batch.side_effect = lambda jobs: {
+            job.key: DeliveryResult(key=job.key, chat_id=job.chat_id, ok=True)
+            for job in jobs
+        }
+        yield mock_sender
+
+
+@patch("subscription_service.views.fulfill_stripe_event.delay")
+def test_webhook_stores_event_and_queues_fulfillment(
+    mock_delay,
+    client,
+    plan,
+    django_capture_on_commit_callbacks,
+):
+    event = _checkout_event("evt_1", plan)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert _post(client, event).status_code == 200
+    assert _post(client, event).status_code == 200
+
+    stripe_event = StripeEvent.objects.get(event_id="evt_1")
+    assert stripe_event.payload == event
+    mock_delay.assert_called_once_with(stripe_event.pk)
+
+
+@patch("subscription_service.views.fulfill_stripe_event.delay")
+def test_webhook_rejects_redelivered_events_before_the_database(
+    mock_delay,
+    client,
+    plan,
+    deduplicator,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    event = _checkout_event("evt_4", plan)
+    with django_capture_on_commit_callbacks(execute=True):
+        _post(client, event)
+
+    with django_assert_num_queries(0):
+        for _ in range(5):
+            assert _post(client, event).status_code == 200
+
+    assert deduplicator.stats() == {"hits": 5, "misses": 1}
+    assert StripeEvent.objects.filter(event_id="evt_4").count() == 1
+
+
+@patch("subscription_service.views.fulfill_stripe_event.delay")
+def test_database_catches_duplicates_redis_missed(
+    mock_delay,
+    client,
+    plan,
+    deduplicator,
+    django_capture_on_commit_callbacks,
+):
+    event = _checkout_event("evt_5", plan)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        _post(client, event)
+        StripeEvent.objects.filter(event_id="evt_5").update(processed_at=timezone.now())
+        deduplicator.redis.delete("test:stripe:event:evt_5")
+        assert _post(client, event).status_code == 200
+
+    mock_delay.assert_called_once()
+    assert deduplicator.stats()["hits"] == 1
+
+
+@patch("subscription_service.views.fulfill_stripe_event.delay")
+def test_concurrent_deliveries_are_stored_and_queued_once(
+    mock_delay,
+    client,
+    plan,
+    deduplicator,
+    django_capture_on_commit_callbacks,
+):
+    event = _checkout_event("evt_7", plan)
+
+    # The second delivery arrives before the first one has queued its task
+    with django_capture_on_commit_callbacks(execute=True):
+        assert _post(client, event).status_code == 200
+        assert _post(client, event).status_code == 200
+
+    mock_delay.assert_called_once_with(StripeEvent.objects.get(event_id="evt_7").pk)
+    assert deduplicator.stats() == {"hits": 1, "misses": 1}
+
+
+@patch("subscription_service.views.fulfill_stripe_event.delay")
+def test_claim_of_unqueued_event_is_short_lived(
+    mock_delay,
+    client,
+    plan,
+    deduplicator,
+    django_capture_on_commit_callbacks,
+):
+    event = _checkout_event("evt_8", plan)
+
+    # Stored, but the process died before the commit callback queued it
+    with django_capture_on_commit_callbacks(execute=False):
+        assert _post(client, event).status_code == 200
+    assert 0 < deduplicator.redis.ttl("test:stripe:event:evt_8") <= deduplicator.claim_ttl
+
+    # Once the claim expires, Stripe's retry queues it
+    deduplicator.redis.delete("test:stripe:event:evt_8")
+    assert _post(client, event).status_code == 200
+
+    mock_delay.assert_called_once_with(StripeEvent.objects.get(event_id="evt_8").pk)
+    assert deduplicator.redis.ttl("test:stripe:event:evt_8") > deduplicator.claim_ttl
+
+
+@patch("subscription_service.views.fulfill_stripe_event.delay", side_effect=ConnectionError("broker is down"))
+def test_claim_is_released_when_queueing_fails(
+    mock_delay,
+    client,
+    plan,
+    deduplicator,
+    django_capture_on_commit_callbacks,
+):
+    event = _checkout_event("evt_9", plan)
+
+    with pytest.raises(ConnectionError):
+        with django_capture_on_commit_callbacks(execute=True):
+            _post(client, event)
+
+    assert StripeEvent.objects.filter(event_id="evt_9", processed_at__isnull=True).exists()
+    assert not deduplicator.redis.exists("test:stripe:event:evt_9")
+
+
+@patch("subscription_service.views.fulfill_stripe_event.delay")
+def test_redelivery_requeues_unprocessed_event(mock_delay, client, plan, deduplicator):
+    event = _checkout_event("evt_6", plan)
+    # Stored, but the fulfillment task was never queued
+    stripe_event = StripeEvent.objects.create(event_id="evt_6", type=event["type"], payload=event)
+
+    assert _post(client, event).status_code == 200
+
+    mock_delay.assert_called_once_with(stripe_event.pk)
+
+
+@patch("subscription_service.tasks.fulfill_stripe_event.delay")
+def test_sweeper_requeues_stale_unprocessed_events(mock_delay, plan):
+    now = timezone.now()
+    stale, fresh, done, abandoned = [
+        StripeEvent.objects.create(
+            event_id=f"evt_sweep_{i}", type="checkout.session.completed", payload={},
+            received_at=now - age, processed_at=now if i == 2 else None,
+        )
+        for i, age in enumerate([
+            timedelta(hours=1), timedelta(minutes=1), timedelta(hours=1), timedelta(days=4),
+        ])
+    ]
+
+    requeue_unprocessed_stripe_events()
+
+    mock_delay.assert_called_once_with(stale.pk)
+
+
+def test_webhook_rejects_bad_signature(client, db):
+    response = client.post(
+        reverse("stripe-webhook"), data="{}", content_type="application/json",
+        HTTP_STRIPE_SIGNATURE="bad",
+    )
+
+    assert response.status_code == 400
+    assert not StripeEvent.objects.exists()
+
+
+def test_fulfillment_creates_subscription(plan, mock_sender):
+    admin = TelegramUser.objects.create(chat_id=1, telegram_username="admin", is_staff=True)
+    event = _checkout_event("evt_2", plan)
+    stripe_event = StripeEvent.objects.create(event_id="evt_2", type=event["type"], payload=event)
+
+    fulfill_stripe_event(stripe_event.pk)
+    fulfill_stripe_event(stripe_event.pk)
+
+    subscription = Subscription.objects.get(customer_id=CHAT_ID)
+    assert subscription.plan == plan
+    assert subscription.payment_id == "pi_1"
+    assert subscription.customer.at_private_group is True
+
+    stripe_event.refresh_from_db()
+    assert stripe_event.processed_at is not None
+
+    mock_sender.send_batch.assert_called_once()
+    assert [job.chat_id for job in mock_sender.send_batch.call_args.args[0]] == [admin.chat_id]
+
+
+def test_fulfillment_extends_active_subscription(plan, mock_sender):
+    customer = TelegramUser.objects.create(chat_id=CHAT_ID, telegram_username="customer")
+    subscription = Subscription.objects.create(
+        customer=customer, plan=plan, payment_id="pi_old",
+        start_date=timezone.now() - timedelta(days=20),
+    )
+    old_end_date = subscription.end_date
+
+    event = _checkout_event("evt_3", plan, payment_id="pi_new")
+    stripe_event = StripeEvent.objects.create(event_id="evt_3", type=event["type"], payload=event)
+
+    with patch("subscription_service.tasks.get_scheduler"):
+        fulfill_stripe_event(stripe_event.pk)
+
+    subscription.refresh_from_db()
+    assert subscription.end_date == old_end_date + timedelta(days=30)
+    assert subscription.payment_id == "pi_new"
+    assert subscription.duration == subscription.end_date - subscription.start_date
+
+
+def test_fulfillment_survives_redis_errors_after_commit(plan, mock_sender, django_capture_on_commit_callbacks):
+    TelegramUser.objects.create(chat_id=1, telegram_username="admin", is_staff=True)
+    event = _checkout_event("evt_redis_down", plan)
+    stripe_event = StripeEvent.objects.create(event_id="evt_redis_down", type=event["type"], payload=event)
+
+    with patch("subscription_service.tasks.get_scheduler") as mock_get_scheduler, \
+            patch("subscription_service.tasks.SubscriptionStatusCache.set") as mock_status_set:
+        mock_get_scheduler.return_value.schedule.side_effect = ConnectionError("redis is down")
+        with django_capture_on_commit_callbacks(execute=True):
+            fulfill_stripe_event(stripe_event.pk)
+
+    # The hooks after the failing one still ran, and the admins were told
+    chat_id, status = mock_status_set.call_args.args
+    assert (chat_id, status.plan) == (CHAT_ID, plan.period)
+    mock_sender.send_batch.assert_called_once()
+
+
+def test_fulfillment_forgets_paid_session_even_if_other_hooks_fail(
+    plan,
+    mock_sender,
+    django_capture_on_commit_callbacks,
+):
+    event = _checkout_event("evt_forget", plan)
+    stripe_event = StripeEvent.objects.create(event_id="evt_forget", type=event["type"], payload=event)
+
+    with patch("subscription_service.tasks.get_scheduler", side_effect=ConnectionError("redis is down")), \
+            patch("subscription_service.tasks.CheckoutSessionCache.forget") as mock_forget:
+        mock_forget.side_effect = ConnectionError("redis is down")
+        with django_capture_on_commit_callbacks(execute=True):
+            fulfill_stripe_event(stripe_event.pk)
+
+    mock_forget.assert_called_once_with(CHAT_ID, plan.id)
+    stripe_event.refresh_from_db()
+    assert stripe_event.processed_at is not None
+
+
+def test_fulfillment_resolves_payment_link_plan(plan, mock_sender, settings):
+    settings.STRIPE_PAYMENT_LINK_PLANS = {"plink_1month": "1 month"}
+    # A second plan at the same price must not matter
+    Plan.objects.create(period="3 months", price=plan.price)
+
+    event = _checkout_event("evt_link", plan)
+    session = event["data"]["object"]
+    session["metadata"] = {}
+    session["payment_link"] = "plink_1month"
+    session["amount_total"] = plan.price * 100 + 17  # tax
+    stripe_event = StripeEvent.objects.create(event_id="evt_link", type=event["type"], payload=event)
+
+    with patch("subscription_service.tasks.get_scheduler"):
+        fulfill_stripe_event(stripe_event.pk)
+
+    assert Subscription.objects.get(customer_id=CHAT_ID).plan == plan
+
+
+def test_unknown_payment_link_leaves_event_unprocessed(plan, mock_sender, settings):
+    settings.STRIPE_PAYMENT_LINK_PLANS = {}
+    event = _checkout_event("evt_unknown_link", plan)
+    event["data"]["object"]["metadata"] = {}
+    event["data"]["object"]["payment_link"] = "plink_unknown"
+    stripe_event = StripeEvent.objects.create(event_id="evt_unknown_link", type=event["type"], payload=event)
+
+    with pytest.raises(Exception):
+        fulfill_stripe_event(stripe_event.pk)
+
+    stripe_event.refresh_from_db()
+    assert stripe_event.processed_at is None
+    assert not Subscription.objects.exists()
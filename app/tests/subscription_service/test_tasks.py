@@ -2,17 +2,25 @@ from datetime import datetime, timedelta
 from unittest.mock import patch
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
+from celery_app import app
+from subscription_service.delivery import DeliveryResult
 from subscription_service.models import Plan, Subscription, TelegramUser
 from subscription_service.tasks import (
     delete_expired_subscriptions,
-    notify_about_expiring_subscriptions_1_day,
-    notify_about_expiring_subscriptions_3_days,
-    notify_about_expiring_subscriptions_7_days,
+    notify_about_expiring_subscriptions,
 )
 
 
+@pytest.fixture(autouse=True)
+def eager_celery(monkeypatch):
+    # Chunks and the final callback run in-process, one after another
+    monkeypatch.setattr(app.conf, "task_always_eager", True)
+
+
 @pytest.mark.django_db
 @patch("subscription_service.tasks.TelegramMessageSender")
 def test_delete_expired_subscriptions(mock_sender):
@@ -33,7 +41,10 @@ def test_delete_expired_subscriptions(mock_sender):
     )
 
     mock_sender.create_message_about_delete_user.return_value = "msg"
-    mock_sender.send_message_to_chat.return_value.status_code = 200
+    mock_sender.send_batch.side_effect = lambda jobs: {
+        job.key: DeliveryResult(key=job.key, chat_id=job.chat_id, ok=True)
+        for job in jobs
+    }
 
     delete_expired_subscriptions()
 
@@ -42,6 +53,133 @@ def test_delete_expired_subscriptions(mock_sender):
     assert admin.at_private_group is False
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize("mode, expected_jobs", [("digest", 2), ("per_event", 6)])
+@patch("subscription_service.tasks.TelegramMessageSender")
+def test_delete_expired_subscriptions_admin_notifications(mock_sender, settings, mode, expected_jobs):
+    settings.ADMIN_NOTIFICATION_MODE = mode
+
+    admins = [
+        TelegramUser.objects.create(chat_id=i, telegram_username=f"admin{i}", is_staff=True)
+        for i in (1, 2)
+    ]
+    plan = Plan.objects.create(period="1 month", price=100)
+    for i in (10, 11, 12):
+        user = TelegramUser.objects.create(
+            chat_id=i, telegram_username=f"user{i}", at_private_group=True
+        )
+        Subscription.objects.create(
+            customer=user,
+            plan=plan,
+            payment_id=f"pi_{i}",
+            start_date=timezone.now() - timedelta(days=40),
+        )
+
+    sent_jobs = []
+
+    def send_batch(jobs):
+        sent_jobs.extend(jobs)
+        return {
+            job.key: DeliveryResult(key=job.key, chat_id=job.chat_id, ok=True)
+            for job in jobs
+        }
+
+    mock_sender.create_message_about_delete_user.return_value = "msg"
+    mock_sender.send_batch.side_effect = send_batch
+
+    delete_expired_subscriptions()
+
+    assert len(sent_jobs) == expected_jobs
+    assert {job.chat_id for job in sent_jobs} == {admin.chat_id for admin in admins}
+    assert not Subscription.objects.exists()
+    assert not TelegramUser.objects.filter(at_private_group=True).exists()
+
+
+@pytest.mark.django_db
+@patch("subscription_service.tasks.TelegramMessageSender")
+def test_delete_expired_subscriptions_does_not_depend_on_admin_messages(mock_sender):
+    TelegramUser.objects.create(chat_id=1, telegram_username="admin", is_staff=True)
+    user = TelegramUser.objects.create(
+        chat_id=10, telegram_username="user", at_private_group=True
+    )
+    plan = Plan.objects.create(period="1 month", price=100)
+    Subscription.objects.create(
+        customer=user,
+        plan=plan,
+        payment_id="pi_unreachable_admin",
+        start_date=timezone.now() - timedelta(days=40),
+    )
+
+    mock_sender.send_batch.side_effect = lambda jobs: {
+        job.key: DeliveryResult(key=job.key, chat_id=job.chat_id, error="HTTP 403")
+        for job in jobs
+    }
+
+    delete_expired_subscriptions()
+
+    assert not Subscription.objects.exists()
+    user.refresh_from_db()
+    assert user.at_private_group is False
+
+
+def _expired_subscriptions(count):
+    plan = Plan.objects.create(period="1 month", price=100)
+    for chat_id in range(10, 10 + count):
+        user = TelegramUser.objects.create(chat_id=chat_id, telegram_username=f"user{chat_id}")
+        Subscription.objects.create(
+            customer=user,
+            plan=plan,
+            payment_id=f"pi_{chat_id}",
+            start_date=timezone.now() - timedelta(days=40, minutes=chat_id),
+        )
+
+
+@pytest.mark.django_db
+@patch("subscription_service.tasks.finish_expiry_run.run")
+@patch("subscription_service.tasks.TelegramMessageSender")
+def test_delete_expired_subscriptions_fans_out_in_chunks(mock_sender, mock_finish, settings):
+    settings.SUBSCRIPTION_SCAN_CHUNK_SIZE = 2
+    _expired_subscriptions(5)
+
+    delete_expired_subscriptions()
+
+    assert not Subscription.objects.exists()
+    results, _ = mock_finish.call_args.args
+    assert [result["total"] for result in results] == [2, 2, 1]
+    assert sorted(
+        values["telegram_username"] for result in results for values in result["events"]
+    ) == [f"user{chat_id}" for chat_id in range(10, 15)]
+
+
+@pytest.mark.django_db
+@patch("subscription_service.tasks.finish_expiry_run.run")
+@patch("subscription_service.tasks.TelegramMessageSender")
+def test_failed_chunk_does_not_stop_the_others(mock_sender, mock_finish, settings):
+    settings.SUBSCRIPTION_SCAN_CHUNK_SIZE = 2
+    _expired_subscriptions(5)
+    first_chunk = list(Subscription.objects.order_by("pk").values_list("pk", flat=True)[:2])
+
+    from subscription_service import tasks
+
+    expire = tasks._expire_subscriptions
+
+    def flaky_expire(now, pks):
+        if set(pks) == set(first_chunk):
+            raise RuntimeError("database went away")
+        return expire(now, pks)
+
+    with patch("subscription_service.tasks._expire_subscriptions", side_effect=flaky_expire) as mock_expire:
+        delete_expired_subscriptions()
+
+    # The failing chunk was tried once and retried three times
+    assert [set(call.args[1]) for call in mock_expire.call_args_list].count(set(first_chunk)) == 4
+    assert set(Subscription.objects.values_list("pk", flat=True)) == set(first_chunk)
+
+    results, _ = mock_finish.call_args.args
+    assert [result["total"] for result in results] == [0, 2, 1]
+    assert results[0]["failed"] == [None, first_chunk[-1]]
+
+
 @pytest.mark.django_db
 def test_notify_about_expiring_subscriptions_1_day():
     user = TelegramUser.objects.create(
@@ -59,7 +197,7 @@ def test_notify_about_expiring_subscriptions_1_day():
         start_date=timezone.now() - timedelta(days=29),
     )
 
-    notify_about_expiring_subscriptions_1_day()
+    notify_about_expiring_subscriptions()
 
     subscription = Subscription.objects.get(customer=user)
     assert subscription.customer.telegram_username == "expiring_user"
@@ -82,7 +220,7 @@ def test_notify_about_expiring_subscriptions_3_days():
         start_date=timezone.now() - timedelta(days=27),
     )
 
-    notify_about_expiring_subscriptions_3_days()
+    notify_about_expiring_subscriptions()
 
     subscription = Subscription.objects.get(customer=user)
     assert subscription.customer.telegram_username == "expiring_user_3"
@@ -105,7 +243,76 @@ def test_notify_about_expiring_subscriptions_7_days():
         start_date=timezone.now() - timedelta(days=23),
     )
 
-    notify_about_expiring_subscriptions_7_days()
+    notify_about_expiring_subscriptions()
 
     subscription = Subscription.objects.get(customer=user)
     assert subscription.customer.telegram_username == "expiring_user_7"
+
+
+@pytest.mark.django_db
+@patch("subscription_service.tasks.TelegramMessageSender")
+def test_notify_about_expiring_subscriptions_buckets_in_one_pass(mock_sender):
+    plan = Plan.objects.create(period="1 month", price=100)
+    # 29, 27 and 23 days into a 30-day plan: 1, 3 and 7 days left; 20 days in: no reminder
+    for chat_id, days_ago in ((100, 29), (101, 27), (102, 23), (103, 20)):
+        user = TelegramUser.objects.create(chat_id=chat_id, telegram_username=f"user{chat_id}")
+        Subscription.objects.create(
+            customer=user,
+            plan=plan,
+            payment_id=f"pi_{chat_id}",
+            start_date=timezone.now() - timedelta(days=days_ago) + timedelta(minutes=1),
+        )
+
+    sent_jobs = []
+
+    def send_batch(jobs):
+        sent_jobs.append(jobs)
+        return {
+            job.key: DeliveryResult(key=job.key, chat_id=job.chat_id, ok=True)
+            for job in jobs
+        }
+
+    mock_sender.send_batch.side_effect = send_batch
+
+    with CaptureQueriesContext(connection) as queries:
+        notify_about_expiring_subscriptions()
+
+    customer_jobs = sent_jobs[0]
+    images = {
+        job.chat_id: job.messages[0].photo_path.rsplit("/", 1)[-1]
+        for job in customer_jobs
+    }
+    assert images == {100: "1-day.jpg", 101: "3-days.jpg", 102: "7-days.jpg"}
+    assert all(len(job.messages) == 2 for job in customer_jobs)
+    # One query to split the run into chunks, one for the single chunk, one for the admins
+    assert len(queries) == 3
+
+
+@pytest.mark.parametrize("task_name, queue", [
+    ("subscription_service.tasks.create_checkout_link", "realtime"),
+    ("subscription_service.tasks.fulfill_stripe_event", "realtime"),
+    ("subscription_service.tasks.send_reminder_chunk", "bulk"),
+    ("subscription_service.tasks.process_due_subscription_events", "bulk"),
+    ("subscription_service.tasks.requeue_unprocessed_stripe_events", "bulk"),
+])
+def test_tasks_are_routed_by_latency(task_name, queue):
+    assert app.amqp.router.route({}, task_name)["queue"].name == queue
+
+
+def test_default_beat_schedule_runs_the_scheduler_tick():
+    # SUBSCRIPTION_EVENT_SCHEDULER is on by default; the nightly fan-out
+    # runs are only scheduled without it.
+    assert set(app.conf.beat_schedule) == {
+        "process_due_subscription_events",
+        "rebuild_subscription_schedule",
+        "requeue_unprocessed_stripe_events",
+    }
+
+
+@pytest.mark.parametrize("task_name", [
+    "subscription_service.tasks.expire_subscription_chunk",
+    "subscription_service.tasks.send_reminder_chunk",
+])
+def test_fan_out_chunks_are_acknowledged_when_done(task_name):
+    # A chunk lost with its worker is run again, so the chord still reports
+    assert app.tasks[task_name].acks_late is True
@@ -0,0 +1,54 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from subscription_service.transport import TelegramTransport
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b'{"ok": true, "result": {}}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def bot_api_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_transport_reuses_connections(bot_api_url):
+    transport = TelegramTransport(token="TOKEN", base_url=bot_api_url, pool_size=2)
+
+    for _ in range(5):
+        response = transport.post("sendMessage", json={"chat_id": 1, "text": "hi"})
+        assert response.status_code == 200
+
+    assert transport.stats.as_dict() == {
+        "requests": 5,
+        "connections_opened": 1,
+        "connections_reused": 4,
+    }
+    transport.close()
+
+
+def test_transport_builds_bot_api_urls():
+    transport = TelegramTransport(token="TOKEN", base_url="http://localhost:8081/")
+
+    assert transport.url("sendPhoto") == "http://localhost:8081/botTOKEN/sendPhoto"
+    transport.close()
@@ -0,0 +1,63 @@
+from unittest.mock import Mock
+
+import pytest
+from django.core.cache import cache
+
+from telegram_bot.checkpoints import (
+    DUPLICATE,
+    HANDLED,
+    IN_PROGRESS,
+    OffsetCheckpoint,
+    handle_once,
+    ledger,
+)
+
+OFFSET_KEY = "telegram:update_offset:test"
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    cache.delete_many([OFFSET_KEY] + [ledger.key(update_id) for update_id in range(1, 4)])
+
+
+def test_offset_is_saved_in_batches_and_resumed():
+    checkpoint = OffsetCheckpoint(key=OFFSET_KEY, every=10, interval=3600)
+    assert checkpoint.load() == 0
+
+    assert checkpoint.save(5) is False
+    assert checkpoint.save(10) is True
+    assert checkpoint.save(12) is False
+    assert checkpoint.save(12, force=True) is True
+
+    assert OffsetCheckpoint(key=OFFSET_KEY).load() == 12
+
+
+def test_update_is_handled_once():
+    handler = Mock()
+    update = {"update_id": 1}
+
+    assert handle_once(update, handler) == HANDLED
+    assert handle_once(update, handler) == DUPLICATE
+    handler.assert_called_once_with(update)
+
+
+def test_failed_update_can_be_handled_again():
+    handler = Mock(side_effect=[RuntimeError("boom"), None])
+    update = {"update_id": 2}
+
+    with pytest.raises(RuntimeError):
+        handle_once(update, handler)
+
+    assert handle_once(update, handler) == HANDLED
+    assert handler.call_count == 2
+
+
+def test_claimed_update_is_not_handled_twice_concurrently():
+    handler = Mock()
+    assert ledger.claim(3) is True
+
+    assert handle_once({"update_id": 3}, handler) == IN_PROGRESS
+    handler.assert_not_called()
+
+    ledger.release(3)
+    assert handle_once({"update_id": 3}, handler) == HANDLED
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from telegram_bot.dispatcher import UpdateDispatcher
+
+
+def _update(update_id, chat_id):
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": "/start"}}
+
+
+def _wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_updates_from_one_chat_keep_their_order():
+    handled = []
+    lock = threading.Lock()
+
+    def handler(update):
+        time.sleep(0.01 if update["update_id"] % 2 else 0)
+        with lock:
+            handled.append(update["update_id"])
+
+    dispatcher = UpdateDispatcher(handler, workers=4)
+    for update_id in range(1, 11):
+        dispatcher.submit(_update(update_id, chat_id=update_id % 2))
+
+    _wait_until(lambda: dispatcher.committed_offset == 11)
+    dispatcher.stop()
+
+    assert [i for i in handled if i % 2] == [1, 3, 5, 7, 9]
+    assert [i for i in handled if not i % 2] == [2, 4, 6, 8, 10]
+
+
+def test_slow_chat_does_not_block_others():
+    release = threading.Event()
+    handled = []
+
+    def handler(update):
+        if update["update_id"] == 1:
+            release.wait(2)
+        handled.append(update["update_id"])
+
+    dispatcher = UpdateDispatcher(handler, workers=2)
+    dispatcher.submit(_update(1, chat_id=100))
+    dispatcher.submit(_update(2, chat_id=200))
+
+    _wait_until(lambda: 2 in handled)
+    # Update 2 is done, but 1 is not, so the offset must not move yet
+    assert dispatcher.committed_offset == 0
+
+    release.set()
+    _wait_until(lambda: dispatcher.committed_offset == 3)
+    dispatcher.stop()
+
+
+def test_duplicates_are_skipped_and_full_queue_blocks():
+    release = threading.Event()
+    dispatcher = UpdateDispatcher(lambda update: release.wait(2), workers=1, max_pending=2)
+
+    assert dispatcher.submit(_update(1, chat_id=1)) is True
+    assert dispatcher.submit(_update(1, chat_id=1)) is False
+    assert dispatcher.submit(_update(2, chat_id=2)) is True
+
+    with pytest.raises(TimeoutError):
+        dispatcher.submit(_update(3, chat_id=3), timeout=0.05)
+
+    release.set()
+    _wait_until(lambda: dispatcher.committed_offset == 3)
+    assert dispatcher.submit(_update(2, chat_id=2)) is False
+
+    stats = dispatcher.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["handled"] == 2
+    dispatcher.stop()
+
+
+def test_failed_update_is_parked_and_retried():
+    attempts = []
+
+    def handler(update):
+        attempts.append(update["update_id"])
+        if update["update_id"] == 1 and attempts.count(1) == 1:
+            raise RuntimeError("boom")
+
+    dispatcher = UpdateDispatcher(handler, workers=2, offset=1, retry_delay=0.05)
+    dispatcher.submit(_update(1, chat_id=100))
+    dispatcher.submit(_update(2, chat_id=200))
+
+    _wait_until(lambda: 2 in attempts and dispatcher.stats()["parked"] == 1)
+    # Update 1 failed, so the offset stays in front of it
+    assert dispatcher.committed_offset == 1
+    # Redelivered before its retry delay, it stays parked
+    assert dispatcher.submit(_update(1, chat_id=100)) is False
+
+    time.sleep(0.06)
+    assert dispatcher.submit(_update(1, chat_id=100)) is True
+    _wait_until(lambda: dispatcher.committed_offset == 3)
+
+    assert attempts.count(1) == 2
+    assert dispatcher.stats()["failed"] == 1
+    dispatcher.stop()
@@ -0,0 +1,120 @@
+import time
+
+import pytest
+from django.test import override_settings
+
+from subscription_service.media_cache import TelegramFileIdCache
+from subscription_service.transport import TelegramTransport, reset_transport
+from subscription_service.utils import TelegramMessageSender
+from telegram_bot.fake_server import FakeBotConfig, FakeBotServer
+
+
+@pytest.fixture
+def fake_bot_api(request):
+    config = getattr(request, "param", FakeBotConfig(seed=1))
+    with FakeBotServer(config) as server:
+        transport = TelegramTransport(token="TOKEN", base_url=server.base_url)
+        yield server, transport
+        transport.close()
+
+
+def test_send_message_is_accepted(fake_bot_api):
+    server, transport = fake_bot_api
+
+    response = transport.post("sendMessage", json={"chat_id": 1, "text": "hi"})
+
+    assert response.status_code == 200
+    assert response.json()["result"]["chat"] == {"id": 1}
+    assert [message["text"] for message in server.api.messages] == ["hi"]
+
+
+def test_uploaded_photo_file_id_can_be_reused(fake_bot_api):
+    server, transport = fake_bot_api
+
+    upload = transport.post(
+        "sendPhoto", params={"chat_id": 1, "caption": "hi"}, files={"photo": ("1-day.jpg", b"image")}
+    )
+    file_id = upload.json()["result"]["photo"][-1]["file_id"]
+
+    reuse = transport.post("sendPhoto", json={"chat_id": 2, "caption": "hi", "photo": file_id})
+    unknown = transport.post("sendPhoto", json={"chat_id": 3, "caption": "hi", "photo": "nope"})
+
+    assert upload.status_code == 200
+    assert reuse.status_code == 200
+    assert unknown.status_code == 400
+    assert "file" in unknown.text
+
+
+@pytest.mark.parametrize("fake_bot_api", [FakeBotConfig(per_chat_rate=1, seed=1)], indirect=True)
+def test_per_chat_rate_limit_answers_429_with_retry_after(fake_bot_api):
+    server, transport = fake_bot_api
+
+    first = transport.post("sendMessage", json={"chat_id": 1, "text": "1"})
+    second = transport.post("sendMessage", json={"chat_id": 1, "text": "2"})
+    other_chat = transport.post("sendMessage", json={"chat_id": 2, "text": "1"})
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert second.json()["parameters"]["retry_after"] == 1
+    assert other_chat.status_code == 200
+
+    time.sleep(1.1)
+    assert transport.post("sendMessage", json={"chat_id": 1, "text": "3"}).status_code == 200
+
+
+@pytest.mark.parametrize("fake_bot_api", [FakeBotConfig(error_rate=1.0, seed=1)], indirect=True)
+def test_error_rate_answers_500(fake_bot_api):
+    server, transport = fake_bot_api
+
+    response = transport.post("sendMessage", json={"chat_id": 1, "text": "hi"})
+
+    assert response.status_code == 500
+    assert server.api.messages == []
+    assert server.api.stats()["calls"] == {"sendMessage 500": 1}
+
+
+def test_get_updates_returns_pushed_updates_until_confirmed(fake_bot_api):
+    server, transport = fake_bot_api
+    update = server.push_update({"message": {"chat": {"id": 1}, "text": "/start"}})
+
+    first = transport.get("getUpdates", params={"offset": 0, "timeout": 0}).json()["result"]
+    confirmed = transport.get(
+        "getUpdates", params={"offset": update["update_id"] + 1, "timeout": 0}
+    ).json()["result"]
+
+    assert first == [update]
+    assert confirmed == []
+
+
+def test_answer_callback_query(fake_bot_api):
+    server, transport = fake_bot_api
+
+    response = transport.post("answerCallbackQuery", json={"callback_query_id": "1"})
+
+    assert response.json() == {"ok": True, "result": True}
+
+
+@pytest.mark.parametrize("fake_bot_api", [FakeBotConfig(per_chat_rate=1, seed=1)], indirect=True)
+def test_sender_points_at_fake_server_through_base_url(fake_bot_api, tmp_path):
+    server, _ = fake_bot_api
+    photo = tmp_path / "1-day.jpg"
+    photo.write_bytes(b"image")
+    TelegramFileIdCache.invalidate(str(photo))
+
+    with override_settings(
+        TELEGRAM_API_BASE_URL=server.base_url,
+        TELEGRAM_BOT_TOKEN="TOKEN",
+        TELEGRAM_RATE_LIMIT_ENABLED=False,
+    ):
+        reset_transport()
+        try:
+            first = TelegramMessageSender.send_message_with_photo_to_chat("hi", str(photo), 1)
+            # Rate limited by the fake server, then retried after retry_after
+            second = TelegramMessageSender.send_message_to_chat("again", 1)
+        finally:
+            reset_transport()
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert TelegramFileIdCache.get(str(photo)) == first.json()["result"]["photo"][-1]["file_id"]
+    assert server.api.stats()["calls"] == {"sendMessage 200": 1, "sendMessage 429": 1, "sendPhoto 200": 1}
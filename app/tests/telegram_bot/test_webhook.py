@@ -0,0 +1,92 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+SECRET = "webhook-secret"
+
+UPDATE = {
+    "update_id": 1,
+    "message": {"message_id": 1, "chat": {"id": 42}, "text": "/verify"},
+}
+
+
+@pytest.fixture(autouse=True)
+def webhook_secret(settings):
+    settings.TELEGRAM_WEBHOOK_SECRET = SECRET
+
+
+@pytest.fixture(autouse=True)
+def clear_update_ledger():
+    cache.delete_many([f"telegram:update:{update_id}" for update_id in (1, 2)])
+
+
+def _post(client, body, token=SECRET):
+    return client.post(
+        reverse("telegram-webhook"),
+        data=body if isinstance(body, str) else json.dumps(body),
+        content_type="application/json",
+        HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN=token,
+    )
+
+
+@patch("telegram_bot.router.handle_verify")
+def test_webhook_dispatches_update(mock_handle_verify, client):
+    response = _post(client, UPDATE)
+
+    assert response.status_code == 200
+    mock_handle_verify.assert_called_once_with(42)
+
+
+@patch("telegram_bot.router.handle_plan_selected")
+def test_webhook_dispatches_callback_query(mock_handle_plan_selected, client):
+    update = {
+        "update_id": 2,
+        "callback_query": {
+            "from": {"id": 42, "username": "alice"},
+            "message": {"chat": {"id": 42}},
+            "data": "PLAN_3",
+        },
+    }
+
+    assert _post(client, update).status_code == 200
+    mock_handle_plan_selected.assert_called_once_with(42, 3, "alice")
+
+
+@patch("telegram_bot.router.handle_verify")
+def test_webhook_rejects_wrong_secret(mock_handle_verify, client):
+    response = _post(client, UPDATE, token="wrong")
+
+    assert response.status_code == 403
+    mock_handle_verify.assert_not_called()
+
+
+def test_webhook_rejects_invalid_json(client):
+    assert _post(client, "{not json").status_code == 400
+
+
+@patch("telegram_bot.router.handle_verify", side_effect=[RuntimeError("boom"), None])
+def test_webhook_asks_for_redelivery_when_handler_fails(mock_handle_verify, client):
+    assert _post(client, UPDATE).status_code == 500
+    # The redelivered update is handled, not skipped as a duplicate
+    assert _post(client, UPDATE).status_code == 200
+
+    assert mock_handle_verify.call_count == 2
+
+
+@patch("telegram_bot.router.handle_verify")
+def test_webhook_handles_redelivered_update_once(mock_handle_verify, client):
+    assert _post(client, UPDATE).status_code == 200
+    assert _post(client, UPDATE).status_code == 200
+
+    mock_handle_verify.assert_called_once_with(42)
+
+
+@patch("telegram_bot.router.handle_verify")
+def test_webhook_asks_for_retry_while_update_is_claimed(mock_handle_verify, client):
+    cache.add("telegram:update:1", "processing")
+
+    assert _post(client, UPDATE).status_code == 503
+    mock_handle_verify.assert_not_called()